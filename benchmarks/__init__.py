@@ -0,0 +1,63 @@
+""" Benchmarks run against synthetic data in SQLite databases.
+
+Run from the repository root as modules:
+
+    python -m benchmarks.run --scale 10k --output results.json
+    python -m benchmarks.compare base.json results.json
+    python -m benchmarks.triple_patterns
+    python -m benchmarks.quantity_ranges
+"""
+import os
+import tempfile
+
+
+def setup_django(db_path, admin=False, **extra_settings):
+    """ Configures Django to use SQLite database "db_path". With "admin",
+    contrib apps and URLs needed by admin views are included.
+    """
+    import django
+    from django.conf import settings
+
+    options = {
+        'INSTALLED_APPS': ['knowledgebase'],
+        'DATABASES': {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': db_path}},
+        'USE_TZ': True,
+    }
+    if admin:
+        options.update({
+            'INSTALLED_APPS': [
+                'django.contrib.admin',
+                'django.contrib.auth',
+                'django.contrib.contenttypes',
+                'django.contrib.sessions',
+                'django.contrib.messages',
+                'knowledgebase',
+            ],
+            'MIDDLEWARE': [
+                'django.contrib.sessions.middleware.SessionMiddleware',
+                'django.contrib.auth.middleware.AuthenticationMiddleware',
+                'django.contrib.messages.middleware.MessageMiddleware',
+            ],
+            'TEMPLATES': [{
+                'BACKEND': 'django.template.backends.django.DjangoTemplates',
+                'APP_DIRS': True,
+                'OPTIONS': {'context_processors': [
+                    'django.template.context_processors.request',
+                    'django.contrib.auth.context_processors.auth',
+                    'django.contrib.messages.context_processors.messages',
+                ]},
+            }],
+            'ROOT_URLCONF': 'benchmarks.urls',
+            'SECRET_KEY': 'benchmark',
+            'ALLOWED_HOSTS': ['testserver'],
+            'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+        })
+    options.update(extra_settings)
+    settings.configure(**options)
+    django.setup()
+
+
+def get_db_path(db_path, name='benchmark.sqlite3'):
+    """ Returns "db_path", or path in a new temporary directory if it is not given.
+    """
+    return db_path or os.path.join(tempfile.mkdtemp(), name)
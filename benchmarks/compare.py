@@ -0,0 +1,49 @@
+""" Compares median timings of two benchmarks.run result files.
+
+Usage: python -m benchmarks.compare base.json new.json [--threshold 1.2]
+
+Exits with status 1 if any operation got slower than "threshold" times
+the base median, or runs more queries than in the base.
+"""
+import argparse
+import json
+import sys
+
+
+def load_results(path):
+    with open(path) as f:
+        document = json.load(f)
+    return document, {(result['name'], result['scale']): result for result in document['results']}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=1.2)
+    args = parser.parse_args()
+
+    base_document, base = load_results(args.base)
+    new_document, new = load_results(args.new)
+    print('base {}, new {}'.format(base_document.get('commit'), new_document.get('commit')))
+    print('{:<20} {:>9} {:>12} {:>12} {:>7} {:>9}'.format('operation', 'scale', 'base ms', 'new ms', 'ratio', 'queries'))
+
+    regressions = 0
+    for key in sorted(set(base) & set(new)):
+        before, after = base[key], new[key]
+        ratio = after['median_ms'] / before['median_ms'] if before['median_ms'] else float('inf')
+        queries = '{}->{}'.format(before['queries'], after['queries'])
+        slower = ratio > args.threshold or (
+            before['queries'] is not None and after['queries'] is not None and after['queries'] > before['queries']
+        )
+        regressions += slower
+        print('{:<20} {:>9} {:>12.1f} {:>12.1f} {:>7.2f} {:>9}{}'.format(
+            key[0], key[1], before['median_ms'], after['median_ms'], ratio, queries, '  <- regression' if slower else '',
+        ))
+    for key in sorted(set(base) ^ set(new)):
+        print('{:<20} {:>9} only in {}'.format(key[0], key[1], 'base' if key in base else 'new'))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
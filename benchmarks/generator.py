@@ -0,0 +1,207 @@
+""" Synthetic knowledge graph.
+
+A graph of scale N has N top-level Statements about N / 5 Concepts.
+Value types rotate over Concept, string, quantity, time and coordinate
+values. Every fourth Statement has a time qualifier, and half of the
+Statements cite one or two References from a shared pool of N / 20.
+Concepts have English labels, most also Finnish ones with grammatical
+cases and some Swedish ones. IDs below FIRST_CONCEPT are predicates,
+units and the globe.
+"""
+import datetime
+import random
+from decimal import Decimal
+
+PREDS = list(range(1, 51))
+METRE = 51
+KILOMETRE = 52
+EARTH = 53
+FIRST_CONCEPT = 101
+
+UNIT_CONVERSIONS = {
+    KILOMETRE: (METRE, 1000),
+}
+
+VALUE_TYPES = ['concept', 'string', 'quantity', 'time', 'coordinate']
+
+FINNISH_CASES = ['genitive', 'partitive']
+
+
+def parse_scale(scale):
+    """ Parses "10k", "1m" or "1000" to int.
+    """
+    scale = scale.strip().lower()
+    multiplier = 1
+    if scale.endswith('k'):
+        multiplier, scale = 1000, scale[:-1]
+    elif scale.endswith('m'):
+        multiplier, scale = 1000000, scale[:-1]
+    return int(scale) * multiplier
+
+
+def get_concept_count(scale):
+    return max(scale // 5, 200)
+
+
+def get_reference_count(scale):
+    return max(scale // 20, 10)
+
+
+def reference_url(reference_id):
+    return 'https://example.com/source/{}'.format(reference_id)
+
+
+def _translations(concept_id, rng):
+    from knowledgebase.models import Translation
+
+    label = 'concept {}'.format(concept_id)
+    translations = [Translation(concept_id=concept_id, lang='en', translation=label)]
+    if rng.random() < 0.7:
+        translations.append(Translation(concept_id=concept_id, lang='fi', translation='käsite {}'.format(concept_id)))
+        for case in FINNISH_CASES:
+            translations.append(Translation(
+                concept_id=concept_id, lang='fi', case=case, translation='käsite {} ({})'.format(concept_id, case),
+            ))
+    if rng.random() < 0.3:
+        translations.append(Translation(concept_id=concept_id, lang='sv', translation='begrepp {}'.format(concept_id)))
+    return translations
+
+
+def _time_value(statement_id, rng):
+    from knowledgebase import timekeys
+    from knowledgebase.models import TimeValue
+    from django.utils import timezone
+
+    value = datetime.datetime(rng.randint(1800, 2020), rng.randint(1, 12), rng.randint(1, 28), tzinfo=timezone.utc)
+    precision = rng.choice([9, 10, 11])
+    earliest, latest = timekeys.interval(value, None, precision)
+    return TimeValue(statement_id=statement_id, value=value, precision=precision, earliest=earliest, latest=latest)
+
+
+def _typed_value(statement, value_type, rng, concept_count):
+    """ Sets Concept value of "statement" or returns its typed value.
+    """
+    from knowledgebase import geo, units
+    from knowledgebase.models import StringValue, QuantityValue, CoordinateValue
+
+    if value_type == 'concept':
+        statement.value_id = rng.randint(FIRST_CONCEPT, FIRST_CONCEPT + concept_count - 1)
+        return None
+    if value_type == 'string':
+        return StringValue(statement_id=statement.id, value='string {}'.format(statement.id))
+    if value_type == 'quantity':
+        value = Decimal(rng.randint(0, 10 ** 6))
+        quantity = QuantityValue(
+            statement_id=statement.id, value=value, lower_bound=value - 1, upper_bound=value + 1,
+            unit_id=rng.choice([METRE, KILOMETRE]),
+        )
+        units.normalize_quantity(quantity)
+        return quantity
+    if value_type == 'time':
+        return _time_value(statement.id, rng)
+    latitude = rng.uniform(-90, 90)
+    longitude = rng.uniform(-180, 180)
+    return CoordinateValue(
+        statement_id=statement.id, latitude=latitude, longitude=longitude, precision_m=10,
+        globe_id=EARTH, cell=geo.encode(latitude, longitude),
+    )
+
+
+def generate(scale, seed=0, batch_size=5000):
+    """ Writes a graph of "scale" top-level Statements to an empty database.
+    Computed columns are set here, because bulk_create() bypasses save()
+    and signals. Precomputed labels and search index are rebuilt at the end.
+    """
+    from django.db import transaction
+    from knowledgebase import labels, search
+    from knowledgebase.models import Concept, Translation, Statement, Reference
+
+    rng = random.Random(seed)
+    concept_count = get_concept_count(scale)
+    reference_count = get_reference_count(scale)
+
+    with transaction.atomic():
+        Concept.objects.bulk_create([Concept(id=i) for i in range(1, FIRST_CONCEPT + concept_count)])
+        translations = [Translation(concept_id=pred_id, lang='en', translation='predicate {}'.format(pred_id)) for pred_id in PREDS]
+        translations += [
+            Translation(concept_id=METRE, lang='en', translation='metre'),
+            Translation(concept_id=KILOMETRE, lang='en', translation='kilometre'),
+            Translation(concept_id=EARTH, lang='en', translation='Earth'),
+        ]
+        for concept_id in range(FIRST_CONCEPT, FIRST_CONCEPT + concept_count):
+            translations += _translations(concept_id, rng)
+            if len(translations) >= batch_size:
+                Translation.objects.bulk_create(translations)
+                translations = []
+        Translation.objects.bulk_create(translations)
+
+        Reference.objects.bulk_create([
+            Reference(id=i, url=reference_url(i), description='Source {}'.format(i))
+            for i in range(1, reference_count + 1)
+        ])
+
+        statement_id = 0
+        for start in range(0, scale, batch_size):
+            statements = []
+            value_models = {}
+            links = []
+            for index in range(start, min(start + batch_size, scale)):
+                statement_id += 1
+                statement = Statement(
+                    id=statement_id,
+                    concept_id=rng.randint(FIRST_CONCEPT, FIRST_CONCEPT + concept_count - 1),
+                    pred_id=rng.choice(PREDS),
+                )
+                value = _typed_value(statement, VALUE_TYPES[index % len(VALUE_TYPES)], rng, concept_count)
+                statements.append(statement)
+                if value is not None:
+                    value_models.setdefault(type(value), []).append(value)
+                if rng.random() < 0.5:
+                    for reference_id in rng.sample(range(1, reference_count + 1), rng.randint(1, 2)):
+                        links.append(Reference.statements.through(reference_id=reference_id, statement_id=statement_id))
+                if index % 4 == 0:
+                    statement_id += 1
+                    statements.append(Statement(id=statement_id, statement_id=statement.id, pred_id=rng.choice(PREDS)))
+                    qualifier_value = _time_value(statement_id, rng)
+                    value_models.setdefault(type(qualifier_value), []).append(qualifier_value)
+
+            Statement.objects.bulk_create(statements)
+            for model, values in value_models.items():
+                model.objects.bulk_create(values)
+            Reference.statements.through.objects.bulk_create(links)
+
+        labels.rebuild_concept_labels()
+        search.rebuild()
+
+
+def generate_records(count, scale, seed=1, new_references=True):
+    """ Yields (line number, record) pairs in the format of
+    knowledgebase.importer.import_statements(), referring to Concepts
+    of a graph of "scale" by ID. References are new or from the shared pool.
+    """
+    rng = random.Random(seed)
+    concept_count = get_concept_count(scale)
+    reference_count = get_reference_count(scale)
+    for line_number in range(1, count + 1):
+        value_type = VALUE_TYPES[line_number % len(VALUE_TYPES)]
+        if value_type == 'concept':
+            value = {'type': 'concept', 'value': rng.randint(FIRST_CONCEPT, FIRST_CONCEPT + concept_count - 1)}
+        elif value_type == 'string':
+            value = {'type': 'string', 'value': 'imported {}'.format(line_number)}
+        elif value_type == 'quantity':
+            value = {'type': 'quantity', 'value': str(rng.randint(0, 10 ** 6)), 'unit': rng.choice([METRE, KILOMETRE])}
+        elif value_type == 'time':
+            value = {'type': 'time', 'value': '{}-01-01'.format(rng.randint(1800, 2020)), 'precision': 9}
+        else:
+            value = {'type': 'coordinate', 'latitude': rng.uniform(-90, 90), 'longitude': rng.uniform(-180, 180), 'globe': EARTH}
+        if new_references:
+            url = 'https://example.com/imported/{}'.format(line_number)
+        else:
+            url = reference_url(rng.randint(1, reference_count))
+        yield line_number, {
+            'concept': rng.randint(FIRST_CONCEPT, FIRST_CONCEPT + concept_count - 1),
+            'pred': rng.choice(PREDS),
+            'value': value,
+            'qualifiers': [{'pred': rng.choice(PREDS), 'value': {'type': 'time', 'value': '2000-01-01', 'precision': 9}}],
+            'references': [{'url': url}],
+        }
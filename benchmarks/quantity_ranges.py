@@ -0,0 +1,89 @@
+""" Shows query plans and timings of quantity range scans on synthetic data.
+
+Usage: python -m benchmarks.quantity_ranges [--quantities 1000000] [--db path]
+
+Quantities are lengths in metres, kilometres and millimetres, converted to
+metres by KNOWLEDGEBASE_UNIT_CONVERSIONS.
+"""
+import argparse
+import os
+import random
+import time
+from decimal import Decimal
+
+from benchmarks import get_db_path, setup_django
+
+METRE = 1
+KILOMETRE = 2
+MILLIMETRE = 3
+PRED = 4
+
+UNIT_CONVERSIONS = {
+    KILOMETRE: (METRE, 1000),
+    MILLIMETRE: (METRE, '0.001'),
+}
+
+
+def generate(quantities_count, batch_size=10000):
+    from django.db import transaction
+    from knowledgebase import units
+    from knowledgebase.models import Concept, Statement, QuantityValue
+
+    random.seed(0)
+    with transaction.atomic():
+        Concept.objects.bulk_create([Concept(id=i) for i in range(1, 101)])
+        for start in range(1, quantities_count + 1, batch_size):
+            statements = []
+            quantities = []
+            for statement_id in range(start, min(start + batch_size, quantities_count + 1)):
+                statements.append(Statement(id=statement_id, concept_id=random.randint(5, 100), pred_id=PRED))
+                unit_id = random.choice([METRE, KILOMETRE, MILLIMETRE])
+                value = Decimal(random.randint(0, 10 ** 6))
+                quantity = QuantityValue(
+                    statement_id=statement_id, value=value, unit_id=unit_id,
+                    lower_bound=value - 10, upper_bound=value + 10,
+                )
+                units.normalize_quantity(quantity)
+                quantities.append(quantity)
+            Statement.objects.bulk_create(statements)
+            QuantityValue.objects.bulk_create(quantities)
+
+
+def run_queries(repeat=20):
+    from knowledgebase.models import QuantityValue
+
+    queries = [
+        ('value between 2 and 3 km', QuantityValue.objects.in_range(2, 3, unit=KILOMETRE)),
+        ('value over 900 km', QuantityValue.objects.in_range(low=900, unit=KILOMETRE)),
+        ('bounds overlap 500-501 m', QuantityValue.objects.overlaps(500, 501, unit=METRE)),
+    ]
+    for name, queryset in queries:
+        started = time.perf_counter()
+        for i in range(repeat):
+            count = len(queryset.values_list('id', flat=True))
+        elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+        print('{}: {} rows, {:.3f} ms'.format(name, count, elapsed_ms))
+        print('    ' + queryset.explain().replace('\n', '\n    '))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quantities', type=int, default=1000000)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+
+    db_path = get_db_path(args.db)
+    exists = os.path.exists(db_path)
+    setup_django(db_path, KNOWLEDGEBASE_UNIT_CONVERSIONS=UNIT_CONVERSIONS)
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    if not exists:
+        started = time.perf_counter()
+        generate(args.quantities)
+        print('Generated {} quantities in {:.1f} s'.format(args.quantities, time.perf_counter() - started))
+    run_queries()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+""" Times core operations on a synthetic graph and writes results as JSON.
+
+Usage: python -m benchmarks.run [--scale 10k,100k,1m] [--db-dir path] [--output results.json]
+
+Each scale uses its own SQLite database. Databases are kept if --db-dir
+is given, so that later runs can skip the generation. Operations that
+write are rolled back, so the database stays the same between runs.
+Results of two runs can be compared with benchmarks.compare.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import django
+
+from benchmarks import generator, setup_django
+
+SAMPLE_SIZE = 100
+
+
+def rolled_back(func):
+    """ Runs func in a transaction that is rolled back.
+    """
+    from django.db import transaction
+
+    with transaction.atomic():
+        func()
+        transaction.set_rollback(True)
+
+
+def get_operations(scale):
+    """ Returns list of (name, setup, operation). Setup is run before every
+    repetition without timing, and its result is passed to the operation.
+    """
+    from django.contrib.auth.models import User
+    from django.db.models import Count
+    from django.test import Client
+    from knowledgebase import documents, importer, labels
+    from knowledgebase.models import Concept, Statement
+
+    rng = random.Random(2)
+    concept_count = generator.get_concept_count(scale)
+    concept_ids = rng.sample(range(generator.FIRST_CONCEPT, generator.FIRST_CONCEPT + concept_count), SAMPLE_SIZE)
+    busiest_id = Statement.objects.filter(concept_id__in=concept_ids).values('concept_id').annotate(
+        count=Count('id'),
+    ).order_by('-count', 'concept_id').values_list('concept_id', flat=True).first()
+
+    user = User.objects.filter(username='benchmark').first()
+    if user is None:
+        user = User.objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+    client = Client()
+    client.force_login(user)
+
+    def cold_labels():
+        labels.invalidate()
+
+    def resolve_labels(_):
+        labels.get_translations(concept_ids, 'fi', 'genitive')
+
+    def render_concepts(_):
+        for concept in Concept.objects.filter(id__in=concept_ids):
+            str(concept)
+
+    def render_labeled_concepts(_):
+        for concept in Concept.objects.filter(id__in=concept_ids).with_labels():
+            str(concept)
+
+    def sort_by_label(_):
+        list(Concept.objects.order_by_label('fi')[:SAMPLE_SIZE])
+
+    def render_statements(_):
+        for statement in Statement.objects.filter(concept_id__in=concept_ids[:10]).with_values():
+            str(statement)
+
+    def build_document(_):
+        documents.build_concept_document(busiest_id, 'fi')
+
+    def admin_change_view(_):
+        response = client.get('/admin/knowledgebase/concept/{}/change/'.format(busiest_id))
+        assert response.status_code == 200, response.status_code
+
+    def admin_changelist(_):
+        for model_name in ('statement', 'translation', 'quantityvalue', 'coordinatevalue', 'reference'):
+            response = client.get('/admin/knowledgebase/{}/'.format(model_name))
+            assert response.status_code == 200, response.status_code
+
+    def bulk_insert(_):
+        rolled_back(lambda: importer.import_statements(generator.generate_records(1000, scale)))
+
+    def reference_dedup(_):
+        rolled_back(lambda: importer.import_statements(generator.generate_records(1000, scale, new_references=False)))
+
+    def delete_cascade(_):
+        rolled_back(lambda: Concept.objects.filter(id__in=concept_ids[:10]).delete())
+
+    def bulk_delete(_):
+        rolled_back(lambda: Concept.objects.filter(id__in=concept_ids[:10]).bulk_delete())
+
+    return [
+        ('label_resolution', cold_labels, resolve_labels),
+        ('concept_str', cold_labels, render_concepts),
+        ('concept_str_with_labels', cold_labels, render_labeled_concepts),
+        ('concept_sort_by_label', cold_labels, sort_by_label),
+        ('statement_str', cold_labels, render_statements),
+        ('concept_document', cold_labels, build_document),
+        ('admin_change_view', cold_labels, admin_change_view),
+        ('admin_changelist', cold_labels, admin_changelist),
+        ('bulk_insert', cold_labels, bulk_insert),
+        ('reference_dedup', cold_labels, reference_dedup),
+        ('delete_cascade', cold_labels, delete_cascade),
+        ('bulk_delete', cold_labels, bulk_delete),
+    ]
+
+
+class QueryCounter(object):
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+
+def run_operations(scale, repeat, only=None):
+    from django.db import connection
+
+    results = []
+    for name, setup, operation in get_operations(scale):
+        if only and name not in only:
+            continue
+        timings = []
+        db_timings = []
+        for i in range(repeat):
+            state = setup()
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                operation(state)
+                timings.append((time.perf_counter() - started) * 1000)
+            db_timings.append(counter.db_time * 1000)
+        results.append({
+            'name': name,
+            'scale': scale,
+            'repeat': repeat,
+            'queries': counter.queries,
+            'min_ms': min(timings),
+            'median_ms': statistics.median(timings),
+            'mean_ms': statistics.mean(timings),
+            'median_db_ms': statistics.median(db_timings),
+        })
+        print('{} @ {}: median {:.1f} ms, {} queries'.format(name, scale, results[-1]['median_ms'], counter.queries), file=sys.stderr)
+    return results
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL,
+        ).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scale(scale, db_dir, repeat, only):
+    """ Runs operations in this process for a single scale and returns results.
+    """
+    db_path = os.path.join(db_dir, 'benchmark-{}.sqlite3'.format(scale))
+    exists = os.path.exists(db_path)
+    setup_django(db_path, admin=True, KNOWLEDGEBASE_UNIT_CONVERSIONS=generator.UNIT_CONVERSIONS)
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    generated_s = None
+    if not exists:
+        started = time.perf_counter()
+        generator.generate(scale)
+        generated_s = time.perf_counter() - started
+        print('Generated scale {} in {:.1f} s'.format(scale, generated_s), file=sys.stderr)
+    results = run_operations(scale, repeat, only)
+    if generated_s is not None:
+        results.append({'name': 'generate', 'scale': scale, 'repeat': 1, 'queries': None,
+                        'min_ms': generated_s * 1000, 'median_ms': generated_s * 1000, 'mean_ms': generated_s * 1000,
+                        'median_db_ms': None})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', default='10k', help='Comma separated scales, for example 10k,100k,1m.')
+    parser.add_argument('--db-dir', default=None)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', default=None, help='Comma separated operation names.')
+    parser.add_argument('--output', default='-')
+    args = parser.parse_args()
+
+    scales = [generator.parse_scale(scale) for scale in args.scale.split(',')]
+    db_dir = args.db_dir or tempfile.mkdtemp()
+    if not os.path.exists(db_dir):
+        os.makedirs(db_dir)
+    only = args.only.split(',') if args.only else None
+
+    if len(scales) == 1:
+        results = run_scale(scales[0], db_dir, args.repeat, only)
+    else:
+        # Django can be configured only once per process, so each scale runs in its own process
+        results = []
+        for scale in scales:
+            command = [sys.executable, '-m', 'benchmarks.run', '--scale', str(scale), '--db-dir', db_dir,
+                       '--repeat', str(args.repeat)]
+            if args.only:
+                command += ['--only', args.only]
+            output = subprocess.check_output(command, cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+            results += json.loads(output.decode('utf-8'))['results']
+
+    document = {
+        'commit': get_commit(),
+        'created_at': datetime.datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': 'sqlite',
+        'results': results,
+    }
+    output = json.dumps(document, indent=2, sort_keys=True)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
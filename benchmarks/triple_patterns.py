@@ -0,0 +1,88 @@
+""" Shows query plans and timings of triple pattern lookups on a synthetic graph.
+
+Usage: python -m benchmarks.triple_patterns [--statements 1000000] [--db path]
+
+Data is generated to a new SQLite database, which is kept if --db is given,
+so that later runs can skip the generation.
+"""
+import argparse
+import os
+import random
+import time
+from decimal import Decimal
+
+from benchmarks import get_db_path, setup_django
+
+
+def generate(statements_count, batch_size=10000):
+    from django.db import transaction
+    from knowledgebase.models import Concept, Statement, QuantityValue
+
+    random.seed(0)
+    concepts_count = max(statements_count // 10, 100)
+    preds_count = 50
+
+    with transaction.atomic():
+        Concept.objects.bulk_create([Concept(id=i) for i in range(1, concepts_count + 1)])
+        for start in range(1, statements_count + 1, batch_size):
+            statements = []
+            quantities = []
+            for statement_id in range(start, min(start + batch_size, statements_count + 1)):
+                pred_id = random.randint(1, preds_count)
+                if pred_id % 5 == 0:
+                    statements.append(Statement(id=statement_id, concept_id=random.randint(1, concepts_count), pred_id=pred_id))
+                    quantities.append(QuantityValue(statement_id=statement_id, value=Decimal(random.randint(0, 10 ** 7))))
+                else:
+                    statements.append(Statement(
+                        id=statement_id,
+                        concept_id=random.randint(1, concepts_count),
+                        pred_id=pred_id,
+                        value_id=random.randint(1, concepts_count),
+                    ))
+            Statement.objects.bulk_create(statements)
+            QuantityValue.objects.bulk_create(quantities)
+
+
+def run_patterns(repeat=20):
+    from knowledgebase.models import Statement
+
+    patterns = [
+        ('(subject, ?, ?)', Statement.objects.match(subject=123)),
+        ('(subject, pred, ?)', Statement.objects.match(subject=123, pred=7)),
+        ('(?, pred, value)', Statement.objects.match(pred=7, value=456)),
+        ('(?, ?, value)', Statement.objects.match(value=456)),
+        ('(subject, ?, value)', Statement.objects.match(subject=123, value=456)),
+        ('(?, pred, quantity range)', Statement.objects.match(pred=10).filter(
+            quantity_value__value__gte=Decimal(1000), quantity_value__value__lt=Decimal(2000)
+        )),
+    ]
+    for name, queryset in patterns:
+        started = time.perf_counter()
+        for i in range(repeat):
+            list(queryset.values_list('id', flat=True))
+        elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+        print('{}: {:.3f} ms'.format(name, elapsed_ms))
+        print('    ' + queryset.explain().replace('\n', '\n    '))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--statements', type=int, default=1000000)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+
+    db_path = get_db_path(args.db)
+    exists = os.path.exists(db_path)
+    setup_django(db_path)
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    if not exists:
+        started = time.perf_counter()
+        generate(args.statements)
+        print('Generated {} statements in {:.1f} s'.format(args.statements, time.perf_counter() - started))
+    run_patterns()
+
+
+if __name__ == '__main__':
+    main()
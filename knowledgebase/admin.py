@@ -2,23 +2,104 @@
 from __future__ import unicode_literals
 
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.db.models import Prefetch
 from django.utils.html import format_html
+from django.utils.translation import ugettext_lazy as _
 
+from knowledgebase import instrumentation, labels, references, search
 from knowledgebase.models import Concept, Translation, Statement, StringValue, QuantityValue, TimeValue, CoordinateValue, Reference
+from knowledgebase.pagination import EstimatedCountPaginator
+
+
+class LabelChangeList(ChangeList):
+    """ Loads labels of the Concepts shown on a page with one query.
+    """
+
+    def get_results(self, request):
+        super(LabelChangeList, self).get_results(request)
+        labels.prefetch(
+            getattr(obj, '{}_id'.format(field))
+            for obj in self.result_list
+            for field in self.model_admin.label_fields
+        )
+
+
+class KnowledgebaseAdmin(admin.ModelAdmin):
+    """ Changelist that stays fast on large tables. Pages are counted with
+    EstimatedCountPaginator, labels of "label_fields" are loaded with one
+    query per page and search uses only indexed lookups: numeric terms
+    match "search_id_field" and other terms are passed to search_text().
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    label_fields = []
+    search_id_field = 'id'
+    # Enables the search box. Searching is done by get_search_results().
+    search_fields = ['=id']
+
+    def get_changelist(self, request, **kwargs):
+        return LabelChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if search_term.isdigit():
+            return queryset.filter(**{self.search_id_field: int(search_term)}), False
+        return self.search_text(queryset, search_term), False
+
+    def search_text(self, queryset, text):
+        return queryset.none()
+
+    def search_concepts(self, queryset, text, field, include_descriptions=True):
+        """ Filters rows whose Concept "field" matches words of "text" in the search index.
+        """
+        condition = search.prefix_filter(text, field, include_descriptions=include_descriptions)
+        if condition is None:
+            return queryset.none()
+        return queryset.filter(condition)
+
+
+class LanguageListFilter(admin.SimpleListFilter):
+    """ Languages of KNOWLEDGEBASE_LABEL_LANGUAGES, without a query for distinct values.
+    """
+    title = _('language')
+    parameter_name = 'lang'
+
+    def lookups(self, request, model_admin):
+        return [(lang, lang) for lang in labels.get_label_languages()]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(lang=self.value())
+        return queryset
 
 
 @admin.register(Concept)
-class ConceptAdmin(admin.ModelAdmin):
+class ConceptAdmin(KnowledgebaseAdmin):
 
     readonly_fields = ['show_statements', 'show_translations']
 
+    def get_queryset(self, request):
+        # Autocomplete lists Concepts by label. Changelist uses its own ordering.
+        return super(ConceptAdmin, self).get_queryset(request).order_by_label()
+
+    def search_text(self, queryset, text):
+        return self.search_concepts(queryset, text, 'id')
+
+    @instrumentation.instrumented('ConceptAdmin.show_statements')
     def show_statements(self, instance):
+        statements = Statement.objects.filter(concept=instance).with_values().prefetch_related(
+            Prefetch('qualifiers', queryset=Statement.objects.with_values())
+        )
         html = format_html('<ul>')
-        for statement in instance.statements.all():
+        for statement in statements:
             html += format_html('<li>{}: {}', statement.pred, statement.get_value_as_string())
-            if statement.qualifiers.exists():
+            qualifiers = statement.qualifiers.all()
+            if qualifiers:
                 html += format_html('<ul>')
-                for qualifier in statement.qualifiers.all():
+                for qualifier in qualifiers:
                     html += format_html('<li>{}: {}</li>', qualifier.pred, qualifier.get_value_as_string())
                 html += format_html('</ul>')
             html += format_html('</li>')
@@ -26,6 +107,7 @@ class ConceptAdmin(admin.ModelAdmin):
         return html
     show_statements.short_description = 'Statements'
 
+    @instrumentation.instrumented('ConceptAdmin.show_translations')
     def show_translations(self, instance):
         html = format_html('<ul>')
         for translation in instance.translations.all():
@@ -39,35 +121,89 @@ class ConceptAdmin(admin.ModelAdmin):
 
 
 @admin.register(Translation)
-class TranslationAdmin(admin.ModelAdmin):
-    pass
+class TranslationAdmin(KnowledgebaseAdmin):
+    list_display = ['translation', 'lang', 'case', 'concept']
+    list_select_related = ['concept']
+    list_filter = [LanguageListFilter]
+    autocomplete_fields = ['concept']
+    label_fields = ['concept']
+
+    def search_text(self, queryset, text):
+        condition = search.prefix_filter(text, 'id', token_field='translation_id', include_descriptions=False)
+        if condition is None:
+            return queryset.none()
+        return queryset.filter(condition)
 
 
 @admin.register(Statement)
-class StatementAdmin(admin.ModelAdmin):
-    pass
+class StatementAdmin(KnowledgebaseAdmin):
+    list_display = ['id', 'concept', 'statement_id', 'pred', 'show_value']
+    list_select_related = ['concept', 'pred', 'value']
+    autocomplete_fields = ['concept', 'pred', 'value']
+    raw_id_fields = ['statement']
+
+    def get_queryset(self, request):
+        # Values and labels of all Concepts on a page are loaded in a fixed number of queries
+        return super(StatementAdmin, self).get_queryset(request).with_values()
+
+    def search_text(self, queryset, text):
+        return self.search_concepts(queryset, text, 'concept')
+
+    def show_value(self, instance):
+        return instance.get_value_as_string()
+    show_value.short_description = 'Value'
 
 
 @admin.register(StringValue)
-class StringValueAdmin(admin.ModelAdmin):
-    pass
+class StringValueAdmin(KnowledgebaseAdmin):
+    list_display = ['statement_id', '__str__']
+    raw_id_fields = ['statement']
+    search_id_field = 'statement_id'
 
 
 @admin.register(QuantityValue)
-class QuantityValueAdmin(admin.ModelAdmin):
-    pass
+class QuantityValueAdmin(KnowledgebaseAdmin):
+    list_display = ['statement_id', '__str__']
+    list_select_related = ['unit']
+    autocomplete_fields = ['unit']
+    raw_id_fields = ['statement']
+    label_fields = ['unit']
+    search_id_field = 'statement_id'
 
 
 @admin.register(TimeValue)
-class TimeValueAdmin(admin.ModelAdmin):
-    pass
+class TimeValueAdmin(KnowledgebaseAdmin):
+    list_display = ['statement_id', '__str__', 'precision']
+    list_filter = ['precision']
+    raw_id_fields = ['statement']
+    search_id_field = 'statement_id'
 
 
 @admin.register(CoordinateValue)
-class CoordinateValueAdmin(admin.ModelAdmin):
-    pass
+class CoordinateValueAdmin(KnowledgebaseAdmin):
+    list_display = ['statement_id', '__str__']
+    list_select_related = ['globe']
+    autocomplete_fields = ['globe']
+    raw_id_fields = ['statement']
+    label_fields = ['globe']
+    search_id_field = 'statement_id'
 
 
 @admin.register(Reference)
-class ReferenceAdmin(admin.ModelAdmin):
-    pass
+class ReferenceAdmin(KnowledgebaseAdmin):
+    list_display = ['id', 'url', 'description']
+    raw_id_fields = ['statements']
+
+    def search_text(self, queryset, text):
+        # Ranges over the indexes of normalized URLs and descriptions.
+        # Terms without scheme match both http and https URLs.
+        condition = search.prefix_range('description', text)
+        urls = [text] if '://' in text else ['http://' + text, 'https://' + text]
+        for url in urls:
+            try:
+                url = references.normalize_url(url).rstrip('/')
+            except ValueError:
+                # Not parseable as URL, for example "[foo"
+                continue
+            condition |= search.prefix_range('url', url)
+        return queryset.filter(condition)
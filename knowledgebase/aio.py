@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+""" Running database queries from asyncio code.
+
+Django ORM is synchronous, so queries are run in a thread pool of
+KNOWLEDGEBASE_ASYNC_THREADS threads (4 by default), and independent
+queries can be awaited concurrently with asyncio.gather(). Every thread
+uses its own database connection, so queries do not see uncommitted
+changes made by the calling thread.
+
+Worker threads keep their connections open between calls, even with the
+default CONN_MAX_AGE of 0, so that each call does not have to connect.
+Connections with errors are closed after the call, and a positive
+CONN_MAX_AGE limits their age as in request threads. The database must
+allow KNOWLEDGEBASE_ASYNC_THREADS connections per process in addition
+to those of request threads.
+"""
+from __future__ import unicode_literals
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'KNOWLEDGEBASE_ASYNC_THREADS', 4),
+                thread_name_prefix='knowledgebase',
+            )
+        return _executor
+
+
+def _close_unusable_connections():
+    """ Does the cleanup of close_old_connections(), except that connections
+    of CONN_MAX_AGE 0 are not closed just because a call ended.
+    """
+    for connection in connections.all():
+        if connection.settings_dict['CONN_MAX_AGE'] == 0:
+            connection.close_at = None
+        connection.close_if_unusable_or_obsolete()
+
+
+def _call(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _close_unusable_connections()
+
+
+async def run(func, *args, **kwargs):
+    """ Runs func in the thread pool and returns its result.
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(_call, func, args, kwargs))
+
+
+def chunks(items, chunk_size):
+    items = list(items)
+    return [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+""" Transitive closure of Statements with chosen predicates.
+
+Predicates listed (as Concept IDs) in KNOWLEDGEBASE_TRANSITIVE_PREDICATES
+setting are treated as transitive. For them, ConceptClosure holds every
+(descendant, ancestor) pair reachable through Statements where the
+descendant is the subject and the ancestor is the value, together with the
+length of the shortest path between them. Rows are maintained when
+Statements are saved or deleted. Bulk operations that bypass signals must
+be followed by rebuild().
+"""
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import transaction
+
+
+# Keeps "__in" lists below the bound variable limit of SQLite
+BATCH_SIZE = 500
+
+
+def get_transitive_predicates():
+    return set(getattr(settings, 'KNOWLEDGEBASE_TRANSITIVE_PREDICATES', []))
+
+
+def is_transitive(pred_id):
+    return pred_id in get_transitive_predicates()
+
+
+def get_edge(statement):
+    """ Returns (pred ID, descendant ID, ancestor ID) of a Statement,
+    or None if Statement does not belong to any closure.
+    """
+    if statement.concept_id is None or statement.value_id is None:
+        return None
+    if not is_transitive(statement.pred_id):
+        return None
+    return statement.pred_id, statement.concept_id, statement.value_id
+
+
+def _batches(ids):
+    """ Splits IDs into sorted lists of at most BATCH_SIZE IDs.
+    """
+    ids = sorted(ids)
+    return [ids[start:start + BATCH_SIZE] for start in range(0, len(ids), BATCH_SIZE)]
+
+
+def _get_ancestors(pred_id, concept_id):
+    from knowledgebase.models import ConceptClosure
+
+    ancestors = {concept_id: 0}
+    ancestors.update(ConceptClosure.objects.filter(pred_id=pred_id, descendant_id=concept_id).values_list('ancestor_id', 'depth'))
+    return ancestors
+
+
+def _get_descendants(pred_id, concept_id):
+    from knowledgebase.models import ConceptClosure
+
+    descendants = {concept_id: 0}
+    descendants.update(ConceptClosure.objects.filter(pred_id=pred_id, ancestor_id=concept_id).values_list('descendant_id', 'depth'))
+    return descendants
+
+
+def add_edge(pred_id, descendant_id, ancestor_id):
+    """ Adds pairs that become reachable through a new edge.
+    """
+    from knowledgebase.models import ConceptClosure
+
+    if descendant_id == ancestor_id:
+        return
+    ancestors = _get_ancestors(pred_id, ancestor_id)
+    descendants = _get_descendants(pred_id, descendant_id)
+
+    pairs = {}
+    for descendant, descendant_depth in descendants.items():
+        for ancestor, ancestor_depth in ancestors.items():
+            if descendant != ancestor:
+                pairs[(descendant, ancestor)] = descendant_depth + 1 + ancestor_depth
+
+    with transaction.atomic():
+        for descendant_ids in _batches(descendants):
+            for ancestor_ids in _batches(ancestors):
+                existing = ConceptClosure.objects.filter(
+                    pred_id=pred_id, descendant_id__in=descendant_ids, ancestor_id__in=ancestor_ids
+                ).values_list('id', 'descendant_id', 'ancestor_id', 'depth')
+                for closure_id, descendant, ancestor, depth in existing:
+                    new_depth = pairs.pop((descendant, ancestor), None)
+                    if new_depth is not None and new_depth < depth:
+                        ConceptClosure.objects.filter(id=closure_id).update(depth=new_depth)
+        ConceptClosure.objects.bulk_create([
+            ConceptClosure(pred_id=pred_id, descendant_id=descendant, ancestor_id=ancestor, depth=depth)
+            for (descendant, ancestor), depth in pairs.items()
+        ])
+
+
+def remove_edge(pred_id, descendant_id, ancestor_id):
+    """ Recomputes ancestors of everything below a removed edge. Other
+    paths may still connect them, so pairs can not be just deleted.
+    """
+    if descendant_id == ancestor_id:
+        return
+    _recompute(pred_id, _get_descendants(pred_id, descendant_id).keys())
+
+
+def rebuild(pred_id):
+    """ Recomputes the whole closure of a predicate.
+    """
+    from knowledgebase.models import Statement
+
+    concept_ids = Statement.objects.filter(
+        pred_id=pred_id, concept__isnull=False, value__isnull=False
+    ).values_list('concept_id', flat=True).distinct()
+    _recompute(pred_id, set(concept_ids), delete_all=True)
+
+
+def recompute(pred_id, concept_ids):
+    """ Recomputes ancestors of given Concepts, for example after
+    bulk changes to Statements that bypassed signals.
+    """
+    _recompute(pred_id, concept_ids)
+
+
+def _load_parents(pred_id, concept_ids):
+    """ Returns dict of Concept ID -> set of direct ancestor IDs, for
+    given Concepts and everything above them. Uses one query per level
+    and batch.
+    """
+    from knowledgebase.models import Statement
+
+    parents = {}
+    frontier = set(concept_ids)
+    while frontier:
+        for concept_id in frontier:
+            parents[concept_id] = set()
+        next_frontier = set()
+        for batch in _batches(frontier):
+            edges = Statement.objects.filter(
+                pred_id=pred_id, concept_id__in=batch, value__isnull=False
+            ).values_list('concept_id', 'value_id')
+            for concept_id, value_id in edges:
+                parents[concept_id].add(value_id)
+                if value_id not in parents:
+                    next_frontier.add(value_id)
+        frontier = next_frontier
+    return parents
+
+
+def _recompute(pred_id, concept_ids, delete_all=False):
+    from knowledgebase.models import ConceptClosure
+
+    concept_ids = set(concept_ids)
+    parents = _load_parents(pred_id, concept_ids)
+
+    with transaction.atomic():
+        rows = ConceptClosure.objects.filter(pred_id=pred_id)
+        if delete_all:
+            rows.delete()
+        else:
+            for batch in _batches(concept_ids):
+                rows.filter(descendant_id__in=batch).delete()
+
+        new_rows = []
+        for concept_id in concept_ids:
+            depths = {concept_id: 0}
+            frontier = [concept_id]
+            depth = 0
+            while frontier:
+                depth += 1
+                next_frontier = []
+                for node in frontier:
+                    for parent in parents.get(node, ()):
+                        if parent not in depths:
+                            depths[parent] = depth
+                            next_frontier.append(parent)
+                frontier = next_frontier
+            del depths[concept_id]
+            new_rows.extend(
+                ConceptClosure(pred_id=pred_id, descendant_id=concept_id, ancestor_id=ancestor, depth=depth)
+                for ancestor, depth in depths.items()
+            )
+            if len(new_rows) >= 1000:
+                ConceptClosure.objects.bulk_create(new_rows)
+                new_rows = []
+        ConceptClosure.objects.bulk_create(new_rows)
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+""" Merging and deleting heavily used Concepts.
+
+Django deletes with a collector that loads every related row to memory
+and sends signals one row at a time. These functions change related rows
+with UPDATE and DELETE statements of at most "batch_size" rows instead,
+and update label cache, search index, closure, statement views and
+documents explicitly. Everything runs in one transaction.
+"""
+from __future__ import unicode_literals
+
+from django.db import transaction
+from django.db.models import ProtectedError, Q
+from django.utils import timezone
+
+from knowledgebase import closure, documents, labels, readmodel, search, units
+
+
+def _batches(queryset, batch_size):
+    """ Yields lists of at most "batch_size" primary keys of queryset in
+    increasing order. Rows may be changed or deleted between batches.
+    """
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def _raw_delete(queryset):
+    """ Deletes rows without the collector and signals. Returns number of rows.
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def _concepts_q(prefix, concept_ids):
+    """ Matches Statements that have any of given Concepts as subject, predicate or value.
+    """
+    return (
+        Q(**{'{}concept_id__in'.format(prefix): concept_ids}) |
+        Q(**{'{}pred_id__in'.format(prefix): concept_ids}) |
+        Q(**{'{}value_id__in'.format(prefix): concept_ids})
+    )
+
+
+def _closure_below(concept_ids):
+    """ Returns dict of transitive predicate ID -> IDs of Concepts whose
+    ancestors may change when given Concepts change.
+    """
+    from knowledgebase.models import ConceptClosure
+
+    result = {}
+    for pred_id in closure.get_transitive_predicates():
+        below = set(concept_ids)
+        below.update(ConceptClosure.objects.filter(pred_id=pred_id, ancestor_id__in=concept_ids).values_list('descendant_id', flat=True))
+        result[pred_id] = below
+    return result
+
+
+def _update_closure(below, removed_ids):
+    from knowledgebase.models import ConceptClosure
+
+    ConceptClosure.objects.filter(
+        Q(pred_id__in=removed_ids) | Q(descendant_id__in=removed_ids) | Q(ancestor_id__in=removed_ids)
+    ).delete()
+    for pred_id, concept_ids in below.items():
+        if pred_id not in removed_ids:
+            closure.recompute(pred_id, concept_ids - set(removed_ids))
+
+
+def _touch_statements(statement_ids):
+    """ Marks Statements changed when only their typed values were updated.
+    """
+    from knowledgebase.models import Statement
+
+    Statement.objects.filter(id__in=statement_ids).update(updated_at=timezone.now())
+
+
+def _statements_changed(statement_ids):
+    from knowledgebase.models import _get_root_concept_ids
+
+    documents.invalidate_on_commit(_get_root_concept_ids(statement_ids))
+    readmodel.refresh(statement_ids)
+
+
+def _with_qualifiers(statement_ids):
+    from knowledgebase.models import Statement
+
+    result = set(statement_ids)
+    frontier = result
+    while frontier:
+        frontier = set(Statement.objects.filter(statement_id__in=frontier).values_list('id', flat=True)) - result
+        result |= frontier
+    return sorted(result)
+
+
+def _delete_statements(statement_ids, report):
+    """ Deletes Statements with their qualifiers, values and links.
+    """
+    from knowledgebase.models import (
+        _get_root_concept_ids, Statement, StatementView, StringValue, QuantityValue, TimeValue, CoordinateValue, Reference,
+    )
+
+    statement_ids = _with_qualifiers(statement_ids)
+    documents.invalidate_on_commit(_get_root_concept_ids(statement_ids))
+    report['reference_links'] += _raw_delete(Reference.statements.through.objects.filter(statement_id__in=statement_ids))
+    for model in (StringValue, QuantityValue, TimeValue, CoordinateValue):
+        report['values'] += _raw_delete(model.objects.filter(statement_id__in=statement_ids))
+    _raw_delete(StatementView.objects.filter(Q(statement_id__in=statement_ids) | Q(parent_id__in=statement_ids)))
+    report['statements'] += _raw_delete(Statement.objects.filter(id__in=statement_ids))
+
+
+def _check_protected(concept_ids, exclude_deleted):
+    """ Raises ProtectedError if quantity units or coordinate globes refer to given Concepts.
+    With "exclude_deleted", values of Statements that are going to be deleted are ignored.
+    """
+    from knowledgebase.models import QuantityValue, CoordinateValue
+
+    quantities = QuantityValue.objects.filter(Q(unit_id__in=concept_ids) | Q(normalized_unit_id__in=concept_ids))
+    coordinates = CoordinateValue.objects.filter(globe_id__in=concept_ids)
+    if exclude_deleted:
+        quantities = quantities.exclude(_concepts_q('statement__', concept_ids)).exclude(_concepts_q('statement__statement__', concept_ids))
+        coordinates = coordinates.exclude(_concepts_q('statement__', concept_ids)).exclude(_concepts_q('statement__statement__', concept_ids))
+    for queryset, field in [(quantities, 'units'), (coordinates, 'globes')]:
+        if queryset.exists():
+            raise ProtectedError(
+                'Cannot delete Concepts that are used as {} of remaining values'.format(field),
+                queryset[:10],
+            )
+
+
+def bulk_delete_concepts(concept_ids, batch_size=1000):
+    """ Deletes Concepts with their Translations and every Statement that
+    refers to them. Raises ProtectedError if remaining quantities or
+    coordinates use them as unit or globe. Returns dict of deleted row counts.
+    """
+    from knowledgebase.models import Concept, ConceptLabel, Translation, Statement, SearchToken
+
+    report = {'concepts': 0, 'translations': 0, 'statements': 0, 'values': 0, 'reference_links': 0}
+    concept_ids = sorted(set(getattr(concept, 'id', concept) for concept in concept_ids))
+    with transaction.atomic():
+        for start in range(0, len(concept_ids), batch_size):
+            chunk = concept_ids[start:start + batch_size]
+            _check_protected(chunk, exclude_deleted=True)
+            below = _closure_below(chunk)
+
+            for statement_ids in _batches(Statement.objects.filter(_concepts_q('', chunk)), batch_size):
+                _delete_statements(statement_ids, report)
+            # Qualifiers nested deeper than the exclusion above covers are checked only now
+            _check_protected(chunk, exclude_deleted=False)
+
+            _raw_delete(SearchToken.objects.filter(concept_id__in=chunk))
+            _raw_delete(ConceptLabel.objects.filter(concept_id__in=chunk))
+            for translation_ids in _batches(Translation.objects.filter(concept_id__in=chunk), batch_size):
+                report['translations'] += _raw_delete(Translation.objects.filter(id__in=translation_ids))
+            _update_closure(below, set(chunk))
+            report['concepts'] += _raw_delete(Concept.objects.filter(id__in=chunk))
+            labels.invalidate(chunk)
+            documents.invalidate_on_commit(chunk)
+    return report
+
+
+def merge_concepts(src, dst, batch_size=1000):
+    """ Repoints everything that refers to Concept "src" to Concept "dst"
+    and deletes "src". Translations of "src" are moved unless "dst" has
+    one in the same language and case, and description is copied if "dst"
+    has none. KNOWLEDGEBASE_* settings that list "src" must be updated
+    separately. Returns dict of changed row counts.
+    """
+    from knowledgebase.models import Concept, ConceptLabel, Translation, Statement, QuantityValue, CoordinateValue, SearchToken
+
+    src_id = getattr(src, 'id', src)
+    dst_id = getattr(dst, 'id', dst)
+    if src_id == dst_id:
+        raise ValueError('Cannot merge a Concept to itself')
+
+    report = {
+        'translations_moved': 0, 'translations_deleted': 0,
+        'statements_concept': 0, 'statements_pred': 0, 'statements_value': 0,
+        'quantity_units': 0, 'coordinate_globes': 0,
+    }
+    with transaction.atomic():
+        src_concept = Concept.objects.select_for_update().get(id=src_id)
+        dst_concept = Concept.objects.select_for_update().get(id=dst_id)
+        below = _closure_below([src_id, dst_id])
+
+        existing = set(Translation.objects.filter(concept_id=dst_id).values_list('lang', 'case'))
+        moved = []
+        deleted = []
+        for translation_id, lang, case in Translation.objects.filter(concept_id=src_id).order_by('id').values_list('id', 'lang', 'case'):
+            if (lang, case) in existing:
+                deleted.append(translation_id)
+            else:
+                moved.append(translation_id)
+                existing.add((lang, case))
+        _raw_delete(SearchToken.objects.filter(concept_id=src_id))
+        report['translations_deleted'] = _raw_delete(Translation.objects.filter(id__in=deleted))
+        report['translations_moved'] = Translation.objects.filter(id__in=moved).update(concept_id=dst_id)
+        for translation in Translation.objects.filter(id__in=moved):
+            search.index_translation(translation)
+        if not dst_concept.description and src_concept.description:
+            Concept.objects.filter(id=dst_id).update(description=src_concept.description)
+            dst_concept.description = src_concept.description
+            search.index_description(dst_concept)
+        labels.invalidate([src_id, dst_id])
+
+        for field in ('concept', 'pred', 'value'):
+            for statement_ids in _batches(Statement.objects.filter(**{field: src_id}), batch_size):
+                Statement.objects.filter(id__in=statement_ids).update(**{field: dst_id, 'updated_at': timezone.now()})
+                _statements_changed(statement_ids)
+                report['statements_' + field] += len(statement_ids)
+
+        for quantity_ids in _batches(QuantityValue.objects.filter(unit_id=src_id), batch_size):
+            quantities = list(QuantityValue.objects.filter(id__in=quantity_ids))
+            for quantity in quantities:
+                quantity.unit_id = dst_id
+                units.normalize_quantity(quantity)
+            QuantityValue.objects.bulk_update(quantities, [
+                'unit', 'normalized_unit', 'normalized_value', 'normalized_lower_bound', 'normalized_upper_bound',
+            ])
+            statement_ids = [quantity.statement_id for quantity in quantities]
+            _touch_statements(statement_ids)
+            _statements_changed(statement_ids)
+            report['quantity_units'] += len(quantities)
+        # Values converted to "src" are the same in "dst"
+        for quantity_ids in _batches(QuantityValue.objects.filter(normalized_unit_id=src_id), batch_size):
+            QuantityValue.objects.filter(id__in=quantity_ids).update(normalized_unit_id=dst_id)
+
+        for coordinate_ids in _batches(CoordinateValue.objects.filter(globe_id=src_id), batch_size):
+            CoordinateValue.objects.filter(id__in=coordinate_ids).update(globe_id=dst_id)
+            statement_ids = list(CoordinateValue.objects.filter(id__in=coordinate_ids).values_list('statement_id', flat=True))
+            _touch_statements(statement_ids)
+            _statements_changed(statement_ids)
+            report['coordinate_globes'] += len(coordinate_ids)
+
+        if report['statements_pred'] and closure.is_transitive(dst_id):
+            closure.rebuild(dst_id)
+        _update_closure(below, {src_id})
+
+        _raw_delete(ConceptLabel.objects.filter(concept_id=src_id))
+        _raw_delete(Concept.objects.filter(id=src_id))
+        labels.update_concept_labels([dst_id])
+        readmodel.update_labels(dst_id)
+        documents.invalidate_on_commit([src_id, dst_id])
+    return report
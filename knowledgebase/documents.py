@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+""" Cached concept documents.
+
+A concept document is a nested dict of a Concept, its translations and
+statements with qualifiers, values and references, stored in Django cache
+(KNOWLEDGEBASE_CACHE alias, "default" if not set). Every document records
+the Concepts it depends on, together with their versions at build time.
+When a model instance changes, versions of the affected Concepts are
+replaced once the transaction commits, and documents depending on them
+are rebuilt on next access.
+"""
+from __future__ import unicode_literals
+
+import asyncio
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from knowledgebase import aio, labels
+
+
+KEY_PREFIX = 'knowledgebase:'
+
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _get_cache():
+    return caches[getattr(settings, 'KNOWLEDGEBASE_CACHE', 'default')]
+
+
+def _get_timeout():
+    return getattr(settings, 'KNOWLEDGEBASE_DOCUMENT_TIMEOUT', 3600)
+
+
+def _document_key(concept_id, lang):
+    return '{}document:{}:{}'.format(KEY_PREFIX, concept_id, lang)
+
+
+def _version_key(concept_id):
+    return '{}version:{}'.format(KEY_PREFIX, concept_id)
+
+
+def _get_versions(concept_ids):
+    """ Returns dict of Concept ID -> version. Missing versions are created,
+    so that a version evicted from cache never matches an earlier one.
+    Versions are None only if the cache does not keep them at all.
+    """
+    cache = _get_cache()
+    keys = {concept_id: _version_key(concept_id) for concept_id in concept_ids}
+    versions = cache.get_many(keys.values())
+    missing = [key for key in keys.values() if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        versions.update(cache.get_many(missing))
+    return {concept_id: versions.get(key) for concept_id, key in keys.items()}
+
+
+def get_versions(concept_ids):
+    """ Returns dict of Concept ID -> current version. Versions change
+    when the Concept or its Translations change.
+    """
+    return _get_versions(set(concept_ids))
+
+
+def get_stats():
+    """ Returns hit and miss counts of this process.
+    """
+    return dict(_stats)
+
+
+def reset_stats():
+    _stats['hits'] = 0
+    _stats['misses'] = 0
+
+
+def invalidate(concept_ids):
+    """ Marks documents that depend on given Concepts outdated immediately.
+    """
+    concept_ids = set(concept_id for concept_id in concept_ids if concept_id is not None)
+    if concept_ids:
+        _get_cache().set_many({_version_key(concept_id): uuid.uuid4().hex for concept_id in concept_ids}, None)
+
+
+def invalidate_on_commit(concept_ids):
+    """ Calls invalidate() when the current transaction commits. Documents
+    rebuilt before that read the old rows and keep the old versions, so
+    they are not mistaken for fresh ones.
+    """
+    concept_ids = set(concept_id for concept_id in concept_ids if concept_id is not None)
+    if concept_ids:
+        transaction.on_commit(lambda: invalidate(concept_ids))
+
+
+def _get_dependency_ids(concept, statements, qualifiers):
+    """ Returns IDs of Concepts whose labels are shown in a document.
+    """
+    concept_ids = {concept.id}
+    for statement in statements + qualifiers:
+        concept_ids.update((statement.pred_id, statement.value_id))
+        value = statement.get_value()
+        concept_ids.add(getattr(value, 'unit_id', None))
+        concept_ids.add(getattr(value, 'globe_id', None))
+    concept_ids.discard(None)
+    return concept_ids
+
+
+def _create_document(concept, statements, qualifiers, references, lang):
+    """ Returns (document, dependencies) of loaded Concept, its Statements,
+    their qualifiers and dict of Statement ID -> list of References.
+    Labels must be in label cache.
+    """
+    from knowledgebase.exporter import value_to_dict
+
+    dependencies = {concept.id}
+
+    def concept_dict(other_id):
+        dependencies.add(other_id)
+        return {'id': other_id, 'label': labels.get_translations([other_id], lang)[other_id]}
+
+    def statement_dict(statement):
+        value = value_to_dict(statement)
+        if value is not None:
+            if value['type'] == 'concept':
+                dependencies.add(value['value'])
+            elif value['type'] == 'quantity':
+                dependencies.add(value['unit'])
+            elif value['type'] == 'coordinate':
+                dependencies.add(value['globe'])
+            value['label'] = statement.get_value_as_string(lang)
+        return {
+            'id': statement.id,
+            'pred': concept_dict(statement.pred_id),
+            'value': value,
+        }
+
+    qualifiers_by_statement = {}
+    for qualifier in qualifiers:
+        qualifiers_by_statement.setdefault(qualifier.statement_id, []).append(qualifier)
+
+    document = {
+        'id': concept.id,
+        'label': concept.get_label(lang),
+        'description': concept.description,
+        'translations': [
+            {'lang': translation.lang, 'case': translation.case, 'translation': translation.translation}
+            for translation in sorted(concept.translations.all(), key=lambda translation: translation.id)
+        ],
+        'statements': [],
+    }
+    for statement in statements:
+        statement_document = statement_dict(statement)
+        statement_document['qualifiers'] = [
+            statement_dict(qualifier) for qualifier in qualifiers_by_statement.get(statement.id, [])
+        ]
+        statement_document['references'] = [
+            {'url': reference.url, 'description': reference.description}
+            for reference in references.get(statement.id, [])
+        ]
+        document['statements'].append(statement_document)
+    dependencies.discard(None)
+    return document, dependencies
+
+
+def _load_concept(concept_id):
+    from knowledgebase.models import Concept
+
+    return Concept.objects.filter(id=concept_id).prefetch_related('translations').first()
+
+
+def _load_statements(concept_id):
+    from knowledgebase.models import Statement
+
+    return list(Statement.objects.filter(concept_id=concept_id)._select_values().order_by('id'))
+
+
+def _load_qualifiers(concept_id):
+    from knowledgebase.models import Statement
+
+    return list(Statement.objects.filter(statement__concept_id=concept_id)._select_values().order_by('id'))
+
+
+def _load_references(concept_id):
+    """ Returns dict of Statement ID -> list of References.
+    """
+    from knowledgebase.models import Reference
+
+    links = Reference.statements.through.objects.filter(
+        statement__concept_id=concept_id,
+    ).select_related('reference').order_by('reference_id')
+    references = {}
+    for link in links:
+        references.setdefault(link.statement_id, []).append(link.reference)
+    return references
+
+
+def build_concept_document(concept_id, lang=settings.LANGUAGE_CODE):
+    """ Returns (document, IDs of Concepts it depends on), or (None, None)
+    if the Concept does not exist.
+    """
+    concept = _load_concept(concept_id)
+    if concept is None:
+        return None, None
+    statements = _load_statements(concept_id)
+    qualifiers = _load_qualifiers(concept_id)
+    references = _load_references(concept_id)
+
+    # Label cache is per process, so labels are reloaded to
+    # avoid sharing labels that other processes have changed.
+    concept_ids = _get_dependency_ids(concept, statements, qualifiers)
+    labels.invalidate(concept_ids)
+    labels.prefetch(concept_ids)
+    return _create_document(concept, statements, qualifiers, references, lang)
+
+
+async def abuild_concept_document(concept_id, lang=settings.LANGUAGE_CODE):
+    """ Async version of build_concept_document(). The Concept, its
+    Statements, qualifiers and References are loaded concurrently.
+    """
+    concept, statements, qualifiers, references = await asyncio.gather(
+        aio.run(_load_concept, concept_id),
+        aio.run(_load_statements, concept_id),
+        aio.run(_load_qualifiers, concept_id),
+        aio.run(_load_references, concept_id),
+    )
+    if concept is None:
+        return None, None
+    concept_ids = _get_dependency_ids(concept, statements, qualifiers)
+    labels.invalidate(concept_ids)
+    await labels.aget_translations(concept_ids)
+    return _create_document(concept, statements, qualifiers, references, lang)
+
+
+def _get_cached(concept_id, lang):
+    """ Returns (document or None, versions to store with rebuilt
+    document or None if the document is up to date).
+    """
+    cache = _get_cache()
+    cached = cache.get(_document_key(concept_id, lang))
+    if cached is not None:
+        document, versions = cached
+        if _get_versions(versions.keys()) == versions:
+            _stats['hits'] += 1
+            return document, None
+    _stats['misses'] += 1
+
+    # Versions are read before building, so that changes during the build
+    # make the stored document outdated. Dependencies are not known before
+    # the build, so those of the previous document are used as a guess.
+    expected = {concept_id}
+    if cached is not None:
+        expected.update(cached[1].keys())
+    return None, _get_versions(expected)
+
+
+def _set_cached(concept_id, lang, document, dependencies, versions):
+    versions = {dependency: versions[dependency] for dependency in dependencies if dependency in versions}
+    versions.update(_get_versions(dependencies - set(versions)))
+    if None in versions.values():
+        return
+    _get_cache().set(_document_key(concept_id, lang), (document, versions), _get_timeout())
+
+
+def get_concept_document(concept_id, lang=settings.LANGUAGE_CODE):
+    """ Returns cached document of a Concept, or None if it does not exist.
+    """
+    document, versions = _get_cached(concept_id, lang)
+    if versions is None:
+        return document
+    document, dependencies = build_concept_document(concept_id, lang)
+    if document is not None:
+        _set_cached(concept_id, lang, document, dependencies, versions)
+    return document
+
+
+async def aget_concept_document(concept_id, lang=settings.LANGUAGE_CODE):
+    """ Async version of get_concept_document().
+    """
+    document, versions = await aio.run(_get_cached, concept_id, lang)
+    if versions is None:
+        return document
+    document, dependencies = await abuild_concept_document(concept_id, lang)
+    if document is not None:
+        await aio.run(_set_cached, concept_id, lang, document, dependencies, versions)
+    return document
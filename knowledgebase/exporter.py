@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+""" Streaming export of the knowledge graph.
+
+Rows are read in primary key order, one chunk at a time, so memory usage
+does not depend on the size of the graph. JSON lines output has one object
+per line with "type" being "concept" or "statement". Statement values use
+the same format as the importer, with Concepts referred by their IDs.
+"""
+from __future__ import unicode_literals
+
+import json
+
+from knowledgebase.models import Concept, Translation, Statement, StatementQuerySet, StringValue, QuantityValue, TimeValue, CoordinateValue, Reference
+
+
+RDF = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+RDFS = 'http://www.w3.org/2000/01/rdf-schema#'
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+DCTERMS = 'http://purl.org/dc/terms/'
+SCHEMA = 'http://schema.org/'
+GEO = 'http://www.opengis.net/ont/geosparql#'
+
+# Characters that are not allowed in IRIREF of N-Triples, besides controls
+IRI_ILLEGAL = set('<>"{}|^`\\')
+
+
+def _iter_chunks(queryset, chunk_size):
+    """ Yields lists of objects using keyset pagination on primary key.
+    """
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id).order_by('id')[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1].id
+
+
+def iter_concepts(chunk_size=1000):
+    """ Yields (Concept, list of Translations) pairs.
+    """
+    for chunk in _iter_chunks(Concept.objects.all(), chunk_size):
+        translations = {}
+        for translation in Translation.objects.filter(concept_id__in=[concept.id for concept in chunk]).order_by('id'):
+            translations.setdefault(translation.concept_id, []).append(translation)
+        for concept in chunk:
+            yield concept, translations.get(concept.id, [])
+
+
+def iter_statements(since=None, chunk_size=1000):
+    """ Yields (Statement, list of References) pairs. Typed values are loaded
+    with the Statements. If "since" is given, then only Statements updated
+    at or after it are included.
+    """
+    statements = Statement.objects.select_related(*StatementQuerySet.VALUE_RELATIONS)
+    if since is not None:
+        statements = statements.filter(updated_at__gte=since)
+    Through = Reference.statements.through
+    for chunk in _iter_chunks(statements, chunk_size):
+        references = {}
+        links = Through.objects.filter(
+            statement_id__in=[statement.id for statement in chunk]
+        ).select_related('reference').order_by('reference_id')
+        for link in links:
+            references.setdefault(link.statement_id, []).append(link.reference)
+        for statement in chunk:
+            yield statement, references.get(statement.id, [])
+
+
+def value_to_dict(statement):
+    if statement.value_id is not None:
+        return {'type': 'concept', 'value': statement.value_id}
+    value = statement.get_value()
+    if value is None:
+        return None
+    if isinstance(value, StringValue):
+        return {'type': 'string', 'value': value.value}
+    if isinstance(value, QuantityValue):
+        return {
+            'type': 'quantity',
+            'value': str(value.value),
+            'lower_bound': None if value.lower_bound is None else str(value.lower_bound),
+            'upper_bound': None if value.upper_bound is None else str(value.upper_bound),
+            'unit': value.unit_id,
+        }
+    if isinstance(value, TimeValue):
+        return {
+            'type': 'time',
+            'value': None if value.value is None else value.value.isoformat(),
+            'year': value.year,
+            'precision': value.precision,
+            'before': value.before,
+            'after': value.after,
+        }
+    if isinstance(value, CoordinateValue):
+        return {
+            'type': 'coordinate',
+            'latitude': value.latitude,
+            'longitude': value.longitude,
+            'precision_m': value.precision_m,
+            'height_m': value.height_m,
+            'globe': value.globe_id,
+        }
+    raise ValueError('Unknown value {!r}'.format(value))
+
+
+def export_json_lines(out, since=None, chunk_size=1000):
+    """ Writes graph to text stream "out". If "since" is given, then only
+    Statements updated after it are written and Concepts are left out.
+    """
+    if since is None:
+        for concept, translations in iter_concepts(chunk_size):
+            out.write(json.dumps({
+                'type': 'concept',
+                'id': concept.id,
+                'description': concept.description,
+                'translations': [
+                    {'lang': translation.lang, 'case': translation.case, 'translation': translation.translation}
+                    for translation in translations
+                ],
+            }) + '\n')
+    for statement, references in iter_statements(since, chunk_size):
+        out.write(json.dumps({
+            'type': 'statement',
+            'id': statement.id,
+            'concept': statement.concept_id,
+            'statement': statement.statement_id,
+            'pred': statement.pred_id,
+            'value': value_to_dict(statement),
+            'references': [
+                {'id': reference.id, 'url': reference.url, 'description': reference.description}
+                for reference in references
+            ],
+            'updated_at': statement.updated_at.isoformat(),
+        }) + '\n')
+
+
+def _literal(value, datatype=None, lang=None):
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+    if lang:
+        return '"{}"@{}'.format(escaped, lang)
+    if datatype:
+        return '"{}"^^<{}>'.format(escaped, datatype)
+    return '"{}"'.format(escaped)
+
+
+def _iri(url):
+    """ Returns "url" as IRIREF, with illegal characters percent-encoded.
+    """
+    escaped = ''.join(
+        ''.join('%{:02X}'.format(byte) for byte in char.encode('utf-8'))
+        if char in IRI_ILLEGAL or ord(char) <= 0x20 else char
+        for char in url
+    )
+    return '<{}>'.format(escaped)
+
+
+class NTriplesWriter(object):
+    """ Writes graph as N-Triples. Every Statement becomes a direct triple and
+    also a reified statement node, so that qualifiers and references
+    can be attached to it.
+    """
+
+    def __init__(self, out, base_uri):
+        self.out = out
+        self.base_uri = base_uri.rstrip('/') + '/'
+
+    def concept_uri(self, concept_id):
+        return '<{}concept/{}>'.format(self.base_uri, concept_id)
+
+    def statement_uri(self, statement_id):
+        return '<{}statement/{}>'.format(self.base_uri, statement_id)
+
+    def triple(self, subject, pred, obj):
+        self.out.write('{} {} {} .\n'.format(subject, pred, obj))
+
+    def value(self, statement):
+        if statement.value_id is not None:
+            return self.concept_uri(statement.value_id)
+        value = statement.get_value()
+        if value is None:
+            return None
+        if isinstance(value, StringValue):
+            return _literal(value.value)
+        if isinstance(value, QuantityValue):
+            return _literal(str(value.value), XSD + 'decimal')
+        if isinstance(value, TimeValue):
+            if value.value is None:
+                return _literal('{}{:04d}'.format('-' if value.year < 0 else '', abs(value.year)), XSD + 'gYear')
+            return _literal(value.value.isoformat(), XSD + 'dateTime')
+        if isinstance(value, CoordinateValue):
+            return _literal('<{}> Point({} {})'.format(
+                self.concept_uri(value.globe_id)[1:-1], value.longitude, value.latitude
+            ), GEO + 'wktLiteral')
+        raise ValueError('Unknown value {!r}'.format(value))
+
+    def write(self, since=None, chunk_size=1000):
+        if since is None:
+            for concept, translations in iter_concepts(chunk_size):
+                subject = self.concept_uri(concept.id)
+                for translation in translations:
+                    self.triple(subject, '<{}label>'.format(RDFS), _literal(translation.translation, lang=translation.lang))
+                if concept.description:
+                    self.triple(subject, '<{}description>'.format(SCHEMA), _literal(concept.description))
+
+        for statement, references in iter_statements(since, chunk_size):
+            node = self.statement_uri(statement.id)
+            pred = self.concept_uri(statement.pred_id)
+            obj = self.value(statement)
+            if statement.concept_id is not None:
+                subject = self.concept_uri(statement.concept_id)
+            else:
+                subject = self.statement_uri(statement.statement_id)
+            if obj is not None:
+                self.triple(subject, pred, obj)
+                self.triple(node, '<{}object>'.format(RDF), obj)
+            self.triple(node, '<{}subject>'.format(RDF), subject)
+            self.triple(node, '<{}predicate>'.format(RDF), pred)
+            for reference in references:
+                if reference.url:
+                    self.triple(node, '<{}source>'.format(DCTERMS), _iri(reference.url))
+                elif reference.description:
+                    self.triple(node, '<{}source>'.format(DCTERMS), _literal(reference.description))
+
+
+def export_ntriples(out, base_uri, since=None, chunk_size=1000):
+    NTriplesWriter(out, base_uri).write(since, chunk_size)
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+""" Geohash based spatial lookups for CoordinateValues.
+
+Every CoordinateValue stores geohash of its position in "cell". Queries
+compute geohash prefixes that cover the searched area, fetch candidates
+with indexed (globe, cell) range lookups, or cell range lookups if globe
+is not given, and then check exact distances. Positions with precision
+match if their uncertainty circle reaches the searched area. Precision is capped to KNOWLEDGEBASE_MAX_PRECISION_M
+(1000 m by default), because the prefilter is widened by the cap.
+"""
+from __future__ import unicode_literals
+
+import math
+
+from django.conf import settings
+from django.db.models import Q
+
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+CELL_LENGTH = 12
+
+# Mean radius of Earth
+DEFAULT_GLOBE_RADIUS_M = 6371008.8
+
+# Maximum amount of geohash prefixes in one bounding box query
+MAX_BBOX_PREFIXES = 32
+
+
+
+def get_globe_radius(globe_id):
+    radiuses = getattr(settings, 'KNOWLEDGEBASE_GLOBE_RADIUS_M', {})
+    return radiuses.get(globe_id, DEFAULT_GLOBE_RADIUS_M)
+
+
+def _get_smallest_globe_radius(globe_id):
+    """ Radius of the globe, or of the smallest globe if not given, so
+    that distances in degrees are not underestimated.
+    """
+    if globe_id is not None:
+        return get_globe_radius(globe_id)
+    radiuses = getattr(settings, 'KNOWLEDGEBASE_GLOBE_RADIUS_M', {})
+    return min([DEFAULT_GLOBE_RADIUS_M] + list(radiuses.values()))
+
+
+def get_max_precision():
+    return getattr(settings, 'KNOWLEDGEBASE_MAX_PRECISION_M', 1000.0)
+
+
+def _get_precision(coordinate):
+    return min(coordinate.precision_m or 0.0, get_max_precision())
+
+
+def encode(latitude, longitude, length=CELL_LENGTH):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    result = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(result) < length:
+        value, value_range = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            result.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(result)
+
+
+def cell_size(length):
+    """ Returns (height, width) of geohash cell in degrees.
+    """
+    lat_bits = length * 5 // 2
+    lon_bits = length * 5 - lat_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def distance(lat1, lon1, lat2, lon2, radius=DEFAULT_GLOBE_RADIUS_M):
+    """ Great circle distance in meters.
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * radius * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _wrap_longitude(longitude):
+    return (longitude + 180.0) % 360.0 - 180.0
+
+
+def _prefix_end(prefix):
+    """ Returns the first geohash after all cells starting with "prefix",
+    or None if there is none. Unlike a sentinel character, this bounds the
+    range correctly in every collation that sorts digits before letters.
+    """
+    while prefix:
+        index = BASE32.index(prefix[-1])
+        if index + 1 < len(BASE32):
+            return prefix[:-1] + BASE32[index + 1]
+        prefix = prefix[:-1]
+    return None
+
+
+def _prefix_filter(prefixes):
+    condition = Q()
+    for prefix in prefixes:
+        end = _prefix_end(prefix)
+        if end is None:
+            condition |= Q(cell__gte=prefix)
+        else:
+            condition |= Q(cell__gte=prefix, cell__lt=end)
+    return condition
+
+
+def near_prefixes(latitude, longitude, radius_m, globe_radius=DEFAULT_GLOBE_RADIUS_M):
+    """ Returns geohash prefixes whose cells cover circle around given point,
+    or None if the circle reaches a pole and all cells must be checked.
+    """
+    radius_deg = math.degrees(radius_m / globe_radius)
+    if abs(latitude) + radius_deg >= 90.0:
+        return None
+    lon_scale = math.cos(math.radians(abs(latitude) + radius_deg))
+    length = CELL_LENGTH
+    while length > 1:
+        height, width = cell_size(length)
+        if height >= radius_deg and width * lon_scale >= radius_deg:
+            break
+        length -= 1
+    height, width = cell_size(length)
+    if height < radius_deg or width * lon_scale < radius_deg:
+        return None
+
+    prefixes = set()
+    for lat_step in (-1, 0, 1):
+        neighbour_lat = max(-90.0, min(90.0, latitude + lat_step * height))
+        for lon_step in (-1, 0, 1):
+            prefixes.add(encode(neighbour_lat, _wrap_longitude(longitude + lon_step * width), length))
+    return sorted(prefixes)
+
+
+def bbox_prefixes(south, west, north, east):
+    """ Returns geohash prefixes whose cells cover given bounding box, or
+    None if the box is too big to be covered by a few prefixes. Box may
+    cross antimeridian, in which case "west" is greater than "east".
+    """
+    if west > east:
+        west_part = bbox_prefixes(south, west, north, 180.0)
+        east_part = bbox_prefixes(south, -180.0, north, east)
+        if west_part is None or east_part is None:
+            return None
+        return sorted(set(west_part) | set(east_part))
+
+    for length in range(CELL_LENGTH, 0, -1):
+        height, width = cell_size(length)
+        first_row = int(math.floor((south + 90.0) / height))
+        last_row = min(int(math.floor((north + 90.0) / height)), int(round(180.0 / height)) - 1)
+        first_column = int(math.floor((west + 180.0) / width))
+        last_column = min(int(math.floor((east + 180.0) / width)), int(round(360.0 / width)) - 1)
+        if (last_row - first_row + 1) * (last_column - first_column + 1) <= MAX_BBOX_PREFIXES:
+            break
+    else:
+        return None
+
+    prefixes = []
+    for row in range(first_row, last_row + 1):
+        for column in range(first_column, last_column + 1):
+            prefixes.append(encode((row + 0.5) * height - 90.0, (column + 0.5) * width - 180.0, length))
+    return prefixes
+
+
+def near(queryset, latitude, longitude, radius_m, globe=None):
+    """ Returns list of CoordinateValues within "radius_m" meters of given
+    point, nearest first. Each gets "distance_m" attribute. Positions with
+    precision are included if their uncertainty circle reaches the searched
+    circle. Precisions over KNOWLEDGEBASE_MAX_PRECISION_M (1000 m by
+    default) are counted as that maximum.
+    """
+    globe_id = getattr(globe, 'id', globe)
+    if globe_id is not None:
+        queryset = queryset.filter(globe_id=globe_id)
+    prefixes = near_prefixes(latitude, longitude, radius_m + get_max_precision(), _get_smallest_globe_radius(globe_id))
+    if prefixes is not None:
+        queryset = queryset.filter(_prefix_filter(prefixes))
+
+    result = []
+    for coordinate in queryset:
+        coordinate.distance_m = distance(
+            latitude, longitude, coordinate.latitude, coordinate.longitude,
+            get_globe_radius(coordinate.globe_id),
+        )
+        if coordinate.distance_m - _get_precision(coordinate) <= radius_m:
+            result.append(coordinate)
+    result.sort(key=lambda coordinate: coordinate.distance_m)
+    return result
+
+
+def _widened_bbox_prefixes(south, west, north, east, globe_id):
+    """ Returns bbox_prefixes() of the box widened by the maximum precision.
+    """
+    margin_deg = math.degrees(get_max_precision() / _get_smallest_globe_radius(globe_id))
+    south = south - margin_deg
+    north = north + margin_deg
+    if south <= -90.0 or north >= 90.0:
+        return None
+    lon_margin_deg = margin_deg / math.cos(math.radians(max(abs(south), abs(north))))
+    span = east - west if west <= east else east - west + 360.0
+    if span + 2 * lon_margin_deg >= 360.0:
+        return None
+    west = west - lon_margin_deg
+    if west < -180.0:
+        west += 360.0
+    east = east + lon_margin_deg
+    if east > 180.0:
+        east -= 360.0
+    return bbox_prefixes(south, west, north, east)
+
+
+def within_bbox(queryset, south, west, north, east, globe=None):
+    """ Returns list of CoordinateValues inside given bounding box. Box crosses
+    antimeridian if "west" is greater than "east". Positions with precision
+    are included if their uncertainty reaches the box. Precisions are capped
+    as in near().
+    """
+    globe_id = getattr(globe, 'id', globe)
+    if globe_id is not None:
+        queryset = queryset.filter(globe_id=globe_id)
+    prefixes = _widened_bbox_prefixes(south, west, north, east, globe_id)
+    if prefixes is not None:
+        queryset = queryset.filter(_prefix_filter(prefixes))
+
+    result = []
+    for coordinate in queryset:
+        margin_deg = math.degrees(_get_precision(coordinate) / get_globe_radius(coordinate.globe_id))
+        lon_margin_deg = margin_deg / max(math.cos(math.radians(coordinate.latitude)), 1e-9)
+        if coordinate.latitude < south - margin_deg or coordinate.latitude > north + margin_deg:
+            continue
+        if west <= east:
+            inside = west - lon_margin_deg <= coordinate.longitude <= east + lon_margin_deg
+        else:
+            inside = coordinate.longitude >= west - lon_margin_deg or coordinate.longitude <= east + lon_margin_deg
+        if inside:
+            result.append(coordinate)
+    return result
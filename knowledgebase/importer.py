@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+""" Streaming bulk import of Statements.
+
+Input is a stream of records, one Statement per record. In JSON lines
+format a record looks like this:
+
+    {
+        "concept": "Helsinki",
+        "pred": "population",
+        "value": {"type": "quantity", "value": "650000"},
+        "qualifiers": [{"pred": "point in time", "value": {"type": "time", "value": "2018-01-01", "precision": 9}}],
+        "references": [{"url": "https://example.com/", "description": "Example"}]
+    }
+
+Concepts are referred either by their ID (integer) or by their
+translation (string) in the import language. Value is either a
+Concept reference or an object with "type" being one of "concept",
+"string", "quantity", "time" or "coordinate" and the fields of the
+matching value model. Coordinate globe and quantity unit are Concept
+references. Times
+that do not fit to a datetime are given with "year" instead of "value".
+
+CSV files have columns "concept", "pred", "type", "value" and optionally
+"lower_bound", "upper_bound", "unit", "year", "precision", "before", "after", "latitude",
+"longitude", "precision_m", "height_m", "globe", "reference_url" and
+"reference_description". CSV rows cannot have qualifiers.
+"""
+from __future__ import unicode_literals
+
+import csv
+import json
+from decimal import Decimal
+
+from dateutil import parser as dateparser
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from knowledgebase import closure, documents, geo, readmodel, references, timekeys, units
+from knowledgebase.models import Concept, Translation, Statement, StringValue, QuantityValue, TimeValue, CoordinateValue, Reference
+
+
+VALUE_FIELDS = {
+    'quantity': ['lower_bound', 'upper_bound', 'unit'],
+    'time': ['year', 'precision', 'before', 'after'],
+    'coordinate': ['latitude', 'longitude', 'precision_m', 'height_m', 'globe'],
+}
+
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportResult(object):
+
+    def __init__(self):
+        self.lines = 0
+        self.statements = 0
+        self.qualifiers = 0
+        self.references = 0
+        self.concepts = 0
+        self.skipped = 0
+        self.errors = []
+
+    def skip(self, line_number, reason):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_number, reason))
+
+
+def read_json_lines(stream):
+    """ Yields (line number, record) pairs from JSON lines stream.
+    """
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as err:
+            raise ValueError('Invalid JSON on line {}: {}'.format(line_number, err))
+
+
+def read_csv(stream):
+    """ Yields (line number, record) pairs from CSV stream with a header row.
+    """
+    for line_number, row in enumerate(csv.DictReader(stream), 2):
+        row = {key: value for key, value in row.items() if value not in (None, '')}
+        value_type = row.get('type', 'concept')
+        value = {'type': value_type}
+        if 'value' in row:
+            value['value'] = row['value']
+        for field in VALUE_FIELDS.get(value_type, []):
+            if field in row:
+                value[field] = row[field]
+        record = {
+            'concept': row.get('concept'),
+            'pred': row.get('pred'),
+            'value': value,
+        }
+        if row.get('reference_url') or row.get('reference_description'):
+            record['references'] = [{
+                'url': row.get('reference_url'),
+                'description': row.get('reference_description'),
+            }]
+        yield line_number, record
+
+
+def _parse_concept_ref(ref):
+    """ Concept IDs may arrive as strings from CSV files.
+    """
+    if isinstance(ref, str) and ref.isdigit():
+        return int(ref)
+    if ref is not None and (isinstance(ref, bool) or not isinstance(ref, (int, str))):
+        raise TypeError('Concept must be an ID or a translation, not {!r}'.format(ref))
+    return ref
+
+
+def _parse_value(value):
+    if value is None:
+        return None
+    if not isinstance(value, dict):
+        return {'type': 'concept', 'value': _parse_concept_ref(value)}
+    value = dict(value)
+    value.setdefault('type', 'concept')
+    if value['type'] == 'concept':
+        value['value'] = _parse_concept_ref(value.get('value'))
+    elif value['type'] == 'coordinate':
+        value['globe'] = _parse_concept_ref(value.get('globe'))
+    elif value['type'] == 'quantity':
+        value['unit'] = _parse_concept_ref(value.get('unit'))
+    elif value['type'] not in ('string', 'time'):
+        raise ValueError('Unknown value type "{}"'.format(value['type']))
+    return value
+
+
+def _parse_reference(reference):
+    """ Returns reference as dict with normalized "url" and "description".
+    """
+    if isinstance(reference, dict):
+        url, description = reference.get('url'), reference.get('description')
+    else:
+        url, description = reference, None
+    for field, value in [('url', url), ('description', description)]:
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            raise TypeError('Reference {} must be a string, not {!r}'.format(field, value))
+        if len(value) > Reference._meta.get_field(field).max_length:
+            raise ValueError('Reference {} is too long'.format(field))
+    return {'url': references.normalize_url(url), 'description': description or None}
+
+
+def _parse_list(record, field):
+    items = record.get(field) or []
+    if not isinstance(items, list):
+        raise TypeError('"{}" must be a list'.format(field))
+    return items
+
+
+def _parse_record(record):
+    parsed = {
+        'concept': _parse_concept_ref(record.get('concept')),
+        'pred': _parse_concept_ref(record.get('pred')),
+        'value': _parse_value(record.get('value')),
+        'qualifiers': [],
+        'references': [_parse_reference(reference) for reference in _parse_list(record, 'references')],
+    }
+    if parsed['concept'] is None or parsed['pred'] is None:
+        raise ValueError('Both "concept" and "pred" are required')
+    for qualifier in _parse_list(record, 'qualifiers'):
+        if qualifier.get('pred') is None:
+            raise ValueError('Qualifier "pred" is required')
+        parsed['qualifiers'].append({
+            'pred': _parse_concept_ref(qualifier['pred']),
+            'value': _parse_value(qualifier.get('value')),
+        })
+    return parsed
+
+
+def _concept_refs(record):
+    refs = [record['concept'], record['pred']]
+    for item in [record] + record['qualifiers']:
+        if item is not record:
+            refs.append(item['pred'])
+        value = item['value']
+        if value is None:
+            continue
+        if value['type'] == 'concept':
+            refs.append(value['value'])
+        elif value['type'] == 'coordinate':
+            refs.append(value['globe'])
+        elif value['type'] == 'quantity' and value['unit'] is not None:
+            refs.append(value['unit'])
+    return refs
+
+
+class ConceptResolver(object):
+    """ Resolves Concept references to IDs in bulk. Resolved references
+    are cached, but the cache is cleared when it grows too big.
+    """
+
+    def __init__(self, lang=settings.LANGUAGE_CODE, create_missing=False, cache_size=100000):
+        self.lang = lang
+        self.create_missing = create_missing
+        self.cache_size = cache_size
+        self.created = 0
+        self._cache = {}
+
+    def resolve(self, refs):
+        """ Returns dict of reference -> Concept ID. Unknown references
+        are left out unless missing Concepts are created.
+        """
+        refs = set(ref for ref in refs if ref is not None)
+        result = {ref: self._cache[ref] for ref in refs if ref in self._cache}
+        ids = set(ref for ref in refs if isinstance(ref, int) and ref not in result)
+        labels = set(ref for ref in refs if not isinstance(ref, int) and ref not in result)
+
+        if ids:
+            for concept_id in Concept.objects.filter(id__in=ids).values_list('id', flat=True):
+                result[concept_id] = concept_id
+        if labels:
+            translations = Translation.objects.filter(lang=self.lang, translation__in=labels)
+            for label, concept_id in translations.order_by('-concept_id').values_list('translation', 'concept_id'):
+                result[label] = concept_id
+            if self.create_missing:
+                for label in labels:
+                    if label not in result:
+                        result[label] = self._create(label)
+
+        if len(self._cache) + len(result) > self.cache_size:
+            self._cache.clear()
+        self._cache.update(result)
+        return result
+
+    def _create(self, label):
+        concept = Concept.objects.create()
+        Translation.objects.create(concept=concept, lang=self.lang, translation=label)
+        self.created += 1
+        return concept.id
+
+
+def _can_return_ids():
+    return getattr(connection.features, 'can_return_ids_from_bulk_insert', False)
+
+
+def _create_statements(statements):
+    """ Inserts Statements so that their primary keys become known.
+    """
+    if _can_return_ids():
+        Statement.objects.bulk_create(statements)
+    else:
+        for statement in statements:
+            statement.save(force_insert=True)
+
+
+def _statements_created(statements):
+    """ Does what Statement signals would have done, if bulk_create() was used.
+    Must be called in the import transaction.
+    """
+    if not _can_return_ids():
+        return
+    for statement in statements:
+        edge = closure.get_edge(statement)
+        if edge:
+            closure.add_edge(*edge)
+    documents.invalidate_on_commit(statement.concept_id for statement in statements)
+    if readmodel.is_enabled():
+        statement_ids = [statement.id for statement in statements]
+        transaction.on_commit(lambda: readmodel.refresh(statement_ids))
+
+
+def _build_statement(data, ids, concept_id=None):
+    statement = Statement(concept_id=concept_id, pred_id=ids[data['pred']])
+    value = data['value']
+    typed_value = None
+    if value is None:
+        pass
+    elif value['type'] == 'concept':
+        statement.value_id = ids[value['value']]
+    elif value['type'] == 'string':
+        if not isinstance(value.get('value'), str):
+            raise TypeError('String value must be a string, not {!r}'.format(value.get('value')))
+        typed_value = StringValue(value=value['value'])
+    elif value['type'] == 'quantity':
+        typed_value = QuantityValue(
+            value=_decimal(value.get('value')),
+            lower_bound=_decimal_or_none(value.get('lower_bound')),
+            upper_bound=_decimal_or_none(value.get('upper_bound')),
+            unit_id=ids.get(value['unit']),
+        )
+        # bulk_create() does not call save(), which would normalize the value
+        units.normalize_quantity(typed_value)
+    elif value['type'] == 'time':
+        typed_value = TimeValue(
+            value=_parse_datetime(value['value']) if value.get('value') is not None else None,
+            year=_int_or_none(value.get('year')),
+            precision=_int(value.get('precision', 11)),
+            before=_int_or_none(value.get('before')),
+            after=_int_or_none(value.get('after')),
+        )
+        if typed_value.precision not in dict(TimeValue.PRECISION_CHOICES):
+            raise ValueError('Unknown precision {}'.format(typed_value.precision))
+        # bulk_create() does not call save(), which would set the interval
+        typed_value.earliest, typed_value.latest = timekeys.interval(
+            typed_value.value, typed_value.year, typed_value.precision, typed_value.before, typed_value.after
+        )
+        if not -2 ** 63 <= typed_value.earliest <= typed_value.latest < 2 ** 63:
+            raise ValueError('Time out of range')
+    elif value['type'] == 'coordinate':
+        typed_value = CoordinateValue(
+            latitude=float(value['latitude']),
+            longitude=float(value['longitude']),
+            precision_m=float(value.get('precision_m') or 0),
+            height_m=_float_or_none(value.get('height_m')),
+            globe_id=ids[value['globe']],
+        )
+        if not (-90 <= typed_value.latitude <= 90 and -180 <= typed_value.longitude <= 180):
+            raise ValueError('Coordinate out of range')
+        # bulk_create() does not call save(), which would set the cell
+        typed_value.cell = geo.encode(typed_value.latitude, typed_value.longitude)
+    return statement, typed_value
+
+
+def _decimal(value):
+    """ Returns number or numeric string as Decimal that fits to
+    QuantityValue fields. Extra decimal places are rounded on save.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise TypeError('Number expected, not {!r}'.format(value))
+    result = Decimal(str(value))
+    field = QuantityValue._meta.get_field('value')
+    if not result.is_finite() or abs(result) >= Decimal(10) ** (field.max_digits - field.decimal_places):
+        raise ValueError('Number out of range: {}'.format(value))
+    return result
+
+
+def _decimal_or_none(value):
+    return None if value is None else _decimal(value)
+
+
+def _int(value):
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise TypeError('Integer expected, not {!r}'.format(value))
+    return int(value)
+
+
+def _int_or_none(value):
+    return None if value is None else _int(value)
+
+
+def _float_or_none(value):
+    return None if value is None else float(value)
+
+
+def _parse_datetime(value):
+    if not isinstance(value, str):
+        raise TypeError('Time must be a string, not {!r}'.format(value))
+    result = dateparser.parse(value)
+    if settings.USE_TZ and timezone.is_naive(result):
+        result = timezone.make_aware(result, timezone.utc)
+    return result
+
+
+def _attach_typed_values(pairs):
+    """ Bulk creates typed values of (Statement, value) pairs. Statements must be saved.
+    """
+    values_by_model = {}
+    for statement, typed_value in pairs:
+        if typed_value is not None:
+            typed_value.statement = statement
+            values_by_model.setdefault(type(typed_value), []).append(typed_value)
+    for model, values in values_by_model.items():
+        model.objects.bulk_create(values)
+
+
+def _attach_references(statements_references):
+    """ Creates missing References and links them to Statements. References
+    are matched by normalized URL, or by description if they have no URL.
+    """
+    return Reference.objects.attach(
+        (statement, reference) for statement, references in statements_references for reference in references
+    )
+
+
+def _import_chunk(chunk, resolver, result):
+    refs = set()
+    for line_number, record in chunk:
+        refs.update(_concept_refs(record))
+    ids = resolver.resolve(refs)
+
+    accepted = []
+    for line_number, record in chunk:
+        missing = [ref for ref in _concept_refs(record) if ref not in ids]
+        if missing:
+            result.skip(line_number, 'Unknown concepts: {}'.format(', '.join(str(ref) for ref in missing)))
+            continue
+        try:
+            statement, typed_value = _build_statement(record, ids, concept_id=ids[record['concept']])
+            # Parents of qualifiers are set once Statements have IDs
+            qualifiers = [_build_statement(qualifier, ids) for qualifier in record['qualifiers']]
+        except (KeyError, TypeError, ValueError, ArithmeticError) as err:
+            result.skip(line_number, 'Invalid value: {}'.format(err))
+            continue
+        accepted.append((record, statement, typed_value, qualifiers))
+
+    with transaction.atomic():
+        _create_statements([statement for record, statement, typed_value, qualifiers in accepted])
+
+        main_values = [(statement, typed_value) for record, statement, typed_value, qualifiers in accepted]
+        qualifier_values = []
+        for record, statement, typed_value, qualifiers in accepted:
+            for qualifier, qualifier_value in qualifiers:
+                qualifier.statement = statement
+                qualifier_values.append((qualifier, qualifier_value))
+        _create_statements([qualifier for qualifier, typed_value in qualifier_values])
+        _attach_typed_values(main_values + qualifier_values)
+
+        result.references += _attach_references(
+            [(statement, record['references']) for record, statement, typed_value, qualifiers in accepted]
+        )
+        _statements_created([statement for statement, typed_value in main_values + qualifier_values])
+
+    result.statements += len(accepted)
+    result.qualifiers += len(qualifier_values)
+
+
+def import_statements(records, lang=settings.LANGUAGE_CODE, chunk_size=1000, start_line=0,
+                      create_missing=False, on_chunk=None):
+    """ Imports (line number, record) pairs, for example from read_json_lines().
+
+    Records are written in chunks, each in its own transaction. Records on lines
+    up to "start_line" are skipped, so an interrupted import can be resumed
+    by passing line number that was given to "on_chunk" callback after the last
+    committed chunk. Returns ImportResult.
+    """
+    result = ImportResult()
+    resolver = ConceptResolver(lang=lang, create_missing=create_missing)
+
+    chunk = []
+    last_line = start_line
+
+    def flush():
+        _import_chunk(chunk, resolver, result)
+        result.concepts = resolver.created
+        del chunk[:]
+        if on_chunk:
+            on_chunk(last_line, result)
+
+    for line_number, record in records:
+        if line_number <= start_line:
+            continue
+        result.lines += 1
+        last_line = line_number
+        try:
+            chunk.append((line_number, _parse_record(record)))
+        except (AttributeError, TypeError, ValueError) as err:
+            result.skip(line_number, str(err))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    elif on_chunk and last_line != start_line:
+        on_chunk(last_line, result)
+
+    return result
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+""" Query counts and timings of rendering code.
+
+Functions decorated with instrumented() record calls, database queries,
+database time and wall time per call site when KNOWLEDGEBASE_INSTRUMENTATION
+setting is true, or inside collecting() block. Nested call sites are
+included in the numbers of the outer ones.
+
+KNOWLEDGEBASE_INSTRUMENTATION_HOOKS setting lists dotted paths of
+callables that are called after each call as hook(name, queries,
+db_time, wall_time). Times are in seconds. log_hook and statsd_hook
+are provided.
+"""
+from __future__ import unicode_literals
+
+import contextlib
+import functools
+import logging
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+# Call site name -> dict of calls, queries, db_time and wall_time
+_stats = {}
+_stats_lock = threading.Lock()
+
+_collecting = [0]
+
+
+def is_enabled():
+    return _collecting[0] > 0 or getattr(settings, 'KNOWLEDGEBASE_INSTRUMENTATION', False)
+
+
+@contextlib.contextmanager
+def collecting():
+    """ Enables instrumentation inside the block regardless of settings.
+    """
+    with _stats_lock:
+        _collecting[0] += 1
+    try:
+        yield
+    finally:
+        with _stats_lock:
+            _collecting[0] -= 1
+
+
+def get_stats():
+    """ Returns dict of call site name -> dict of calls, queries,
+    db_time and wall_time recorded in this process.
+    """
+    with _stats_lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _get_hooks():
+    return [import_string(path) for path in getattr(settings, 'KNOWLEDGEBASE_INSTRUMENTATION_HOOKS', [])]
+
+
+def _record(name, queries, db_time, wall_time):
+    with _stats_lock:
+        stats = _stats.setdefault(name, {'calls': 0, 'queries': 0, 'db_time': 0.0, 'wall_time': 0.0})
+        stats['calls'] += 1
+        stats['queries'] += queries
+        stats['db_time'] += db_time
+        stats['wall_time'] += wall_time
+    for hook in _get_hooks():
+        try:
+            hook(name, queries, db_time, wall_time)
+        except Exception:
+            logger.exception('Instrumentation hook %r failed', hook)
+
+
+class _QueryCounter(object):
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+
+def instrumented(name):
+    """ Decorator that records calls of a function as call site "name".
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return func(*args, **kwargs)
+            counter = _QueryCounter()
+            started = time.perf_counter()
+            try:
+                with contextlib.ExitStack() as stack:
+                    for connection in connections.all():
+                        stack.enter_context(connection.execute_wrapper(counter))
+                    return func(*args, **kwargs)
+            finally:
+                _record(name, counter.queries, counter.db_time, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def format_report(stats=None):
+    """ Returns recorded stats as text table, most database time first.
+    """
+    if stats is None:
+        stats = get_stats()
+    lines = ['{:<40} {:>8} {:>8} {:>10} {:>10} {:>10}'.format('call site', 'calls', 'queries', 'queries/c', 'db ms', 'wall ms')]
+    for name, item in sorted(stats.items(), key=lambda item: -item[1]['db_time']):
+        lines.append('{:<40} {:>8} {:>8} {:>10.2f} {:>10.1f} {:>10.1f}'.format(
+            name, item['calls'], item['queries'], item['queries'] / float(item['calls']),
+            item['db_time'] * 1000, item['wall_time'] * 1000,
+        ))
+    return '\n'.join(lines)
+
+
+def log_hook(name, queries, db_time, wall_time):
+    """ Logs every call to "knowledgebase.instrumentation" logger at debug level.
+    """
+    logger.debug('%s: %d queries, %.1f ms database, %.1f ms total', name, queries, db_time * 1000, wall_time * 1000)
+
+
+_statsd_socket = None
+
+
+def statsd_hook(name, queries, db_time, wall_time):
+    """ Sends counters and timers to statsd over UDP. Address and metric
+    prefix are read from KNOWLEDGEBASE_STATSD_ADDRESS (host, port) and
+    KNOWLEDGEBASE_STATSD_PREFIX settings.
+    """
+    global _statsd_socket
+    if _statsd_socket is None:
+        _statsd_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    prefix = '{}.{}'.format(getattr(settings, 'KNOWLEDGEBASE_STATSD_PREFIX', 'knowledgebase'), name.replace('__', ''))
+    metrics = [
+        '{}.calls:1|c'.format(prefix),
+        '{}.queries:{}|c'.format(prefix, queries),
+        '{}.db_time:{:.3f}|ms'.format(prefix, db_time * 1000),
+        '{}.wall_time:{:.3f}|ms'.format(prefix, wall_time * 1000),
+    ]
+    address = tuple(getattr(settings, 'KNOWLEDGEBASE_STATSD_ADDRESS', ('localhost', 8125)))
+    try:
+        _statsd_socket.sendto('\n'.join(metrics).encode('utf-8'), address)
+    except OSError:
+        pass
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+""" Concept labels.
+
+Translations are cached in process memory per Concept for
+KNOWLEDGEBASE_LABEL_CACHE_TTL seconds, because changes clear the cache
+only in the process that made them. In addition, the best label of every
+Concept in KNOWLEDGEBASE_LABEL_LANGUAGES is stored as ConceptLabel row,
+so that querysets can load and sort by labels with one join. ConceptLabels are updated when Translations change. Bulk operations
+that bypass signals must be followed by rebuild_concept_labels().
+"""
+from __future__ import unicode_literals
+
+import asyncio
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from knowledgebase import aio, closure
+
+
+# Concept ID -> (expiry time, list of (lang, case, translation) tuples in primary key order).
+_translations_cache = {}
+_translations_cache_lock = threading.Lock()
+
+# Uncached Concepts are loaded concurrently in chunks of this size by aget_translations()
+ASYNC_CHUNK_SIZE = 500
+
+
+def _get_cache_size():
+    return getattr(settings, 'KNOWLEDGEBASE_LABEL_CACHE_SIZE', 10000)
+
+
+def _get_cache_ttl():
+    """ Seconds a cached Concept is used. Translation changes clear the cache
+    only in the process that made them, so other processes see them after this.
+    """
+    return getattr(settings, 'KNOWLEDGEBASE_LABEL_CACHE_TTL', 60)
+
+
+def _get_cached(concept_id):
+    """ Returns cached translation tuples of a Concept, or None if missing or expired.
+    """
+    cached = _translations_cache.get(concept_id)
+    if cached is None or cached[0] < time.monotonic():
+        return None
+    return cached[1]
+
+
+def _load_translations(concept_ids):
+    """ Returns translation tuples of given Concepts. Cached Concepts are
+    served from memory, others are loaded with one query per batch of
+    closure.BATCH_SIZE Concepts.
+    """
+    from knowledgebase.models import Translation
+
+    result = {}
+    missing = set()
+    for concept_id in concept_ids:
+        translations = _get_cached(concept_id)
+        if translations is None:
+            missing.add(concept_id)
+        else:
+            result[concept_id] = translations
+
+    if missing:
+        loaded = {concept_id: [] for concept_id in missing}
+        for batch in aio.chunks(sorted(missing), closure.BATCH_SIZE):
+            translations_qs = Translation.objects.filter(concept_id__in=batch).order_by('id')
+            for concept_id, lang, case, translation in translations_qs.values_list('concept_id', 'lang', 'case', 'translation'):
+                loaded[concept_id].append((lang, case, translation))
+        result.update(loaded)
+
+        cache_size = _get_cache_size()
+        cache_ttl = _get_cache_ttl()
+        if cache_size > 0 and cache_ttl > 0:
+            expires_at = time.monotonic() + cache_ttl
+            with _translations_cache_lock:
+                if len(_translations_cache) + len(loaded) > cache_size:
+                    _translations_cache.clear()
+                _translations_cache.update((concept_id, (expires_at, translations)) for concept_id, translations in loaded.items())
+
+    return result
+
+
+def _resolve(translations, lang, case, strict_case):
+    """ Picks best translation using the same fallback
+    chain as Concept.get_translation().
+    """
+    for t_lang, t_case, translation in translations:
+        if t_lang == lang and t_case == case:
+            return translation
+    if strict_case:
+        return None
+    for t_lang, t_case, translation in translations:
+        if t_lang == lang:
+            return translation
+    if translations:
+        return translations[0][2]
+    return ''
+
+
+def get_translations(concept_ids, lang=settings.LANGUAGE_CODE, case=None, strict_case=False):
+    """ Returns dict of Concept ID -> translation for multiple Concepts
+    using one query per batch of uncached Concepts. Fallback rules are same as in
+    Concept.get_translation().
+    """
+    concept_ids = set(concept_id for concept_id in concept_ids if concept_id is not None)
+    translations = _load_translations(concept_ids)
+    return {
+        concept_id: _resolve(translations[concept_id], lang, case, strict_case)
+        for concept_id in concept_ids
+    }
+
+
+async def aget_translations(concept_ids, lang=settings.LANGUAGE_CODE, case=None, strict_case=False):
+    """ Async version of get_translations(). Uncached Concepts are
+    loaded with concurrent queries of ASYNC_CHUNK_SIZE Concepts.
+    """
+    concept_ids = set(concept_id for concept_id in concept_ids if concept_id is not None)
+    translations = {}
+    missing = set()
+    for concept_id in concept_ids:
+        cached = _get_cached(concept_id)
+        if cached is None:
+            missing.add(concept_id)
+        else:
+            translations[concept_id] = cached
+    loaded = await asyncio.gather(*[
+        aio.run(_load_translations, chunk) for chunk in aio.chunks(sorted(missing), ASYNC_CHUNK_SIZE)
+    ])
+    for chunk_translations in loaded:
+        translations.update(chunk_translations)
+    return {
+        concept_id: _resolve(translations[concept_id], lang, case, strict_case)
+        for concept_id in concept_ids
+    }
+
+
+def prefetch(concept_ids):
+    """ Loads translations of given Concepts to cache using one query
+    per batch, so that their labels can be resolved later without queries.
+    """
+    _load_translations(set(concept_id for concept_id in concept_ids if concept_id is not None))
+
+
+def invalidate(concept_ids=None):
+    """ Removes given Concepts from translation cache. If no
+    Concepts are given, then the whole cache is cleared.
+    """
+    with _translations_cache_lock:
+        if concept_ids is None:
+            _translations_cache.clear()
+            return
+        for concept_id in concept_ids:
+            _translations_cache.pop(concept_id, None)
+
+
+def get_label_languages():
+    """ Languages of precomputed ConceptLabels, KNOWLEDGEBASE_LABEL_LANGUAGES
+    setting or just LANGUAGE_CODE.
+    """
+    return list(getattr(settings, 'KNOWLEDGEBASE_LABEL_LANGUAGES', [settings.LANGUAGE_CODE]))
+
+
+def get_label_annotation(lang):
+    """ Returns name of the annotation added by ConceptQuerySet.with_labels().
+    """
+    return 'label_{}'.format(re.sub(r'\W', '_', lang))
+
+
+def update_concept_labels(concept_ids):
+    """ Recomputes ConceptLabels of given Concepts from their Translations.
+    Deleted Concepts are skipped.
+    """
+    from knowledgebase.models import Concept, ConceptLabel, Translation
+
+    concept_ids = set(Concept.objects.filter(id__in=concept_ids).values_list('id', flat=True))
+    if not concept_ids:
+        return
+    translations = {concept_id: [] for concept_id in concept_ids}
+    translations_qs = Translation.objects.filter(concept_id__in=concept_ids).order_by('id')
+    for concept_id, lang, case, translation in translations_qs.values_list('concept_id', 'lang', 'case', 'translation'):
+        translations[concept_id].append((lang, case, translation))
+
+    concept_labels = []
+    for concept_id, concept_translations in translations.items():
+        for lang in get_label_languages():
+            label = _resolve(concept_translations, lang, None, False)
+            # Concepts without Translations have no rows, so they sort last
+            if label:
+                concept_labels.append(ConceptLabel(concept_id=concept_id, lang=lang, label=label))
+    with transaction.atomic():
+        ConceptLabel.objects.filter(concept_id__in=concept_ids).delete()
+        ConceptLabel.objects.bulk_create(concept_labels)
+
+
+def rebuild_concept_labels(chunk_size=1000):
+    """ Recreates all ConceptLabels.
+    """
+    from knowledgebase.models import Concept, ConceptLabel
+
+    ConceptLabel.objects.all().delete()
+    last_id = 0
+    while True:
+        concept_ids = list(Concept.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not concept_ids:
+            return
+        update_concept_labels(concept_ids)
+        last_id = concept_ids[-1]
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from knowledgebase import references
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Normalizes Reference URLs and merges References with the same URL, '
+        'or with the same description and no URL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='References per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would change.')
+
+    def handle(self, *args, **options):
+        result = references.deduplicate(chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+        self.stdout.write('{} {} URLs, {} {} References, {} links'.format(
+            'Would normalize' if options['dry_run'] else 'Normalized', result['normalized'],
+            'would merge' if options['dry_run'] else 'merged', result['merged'],
+            result['links'],
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import ProtectedError
+
+from knowledgebase.concepts import bulk_delete_concepts
+
+
+class Command(BaseCommand):
+
+    help = 'Deletes Concepts and every Statement that refers to them in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('concept', nargs='+', type=int, help='Concept IDs.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            report = bulk_delete_concepts(options['concept'], batch_size=options['batch_size'])
+        except ProtectedError as err:
+            raise CommandError(err.args[0])
+        for name, count in sorted(report.items()):
+            self.stdout.write('{}: {}'.format(name, count))
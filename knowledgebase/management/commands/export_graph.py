@@ -0,0 +1,52 @@
+import gzip
+import io
+import sys
+
+from dateutil import parser as dateparser
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from knowledgebase.exporter import export_json_lines, export_ntriples
+
+
+class Command(BaseCommand):
+
+    help = 'Exports the knowledge graph as JSON lines or N-Triples. Files ending with ".gz" are compressed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Output file, or "-" for standard output.')
+        parser.add_argument('--format', choices=['jsonl', 'nt'], default=None, help='Defaults to file extension.')
+        parser.add_argument('--since', default=None, help='Export only Statements updated after this timestamp.')
+        parser.add_argument('--base-uri', default='http://example.org/knowledgebase/', help='Base URI of N-Triples resources.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        name = path[:-3] if path.endswith('.gz') else path
+        file_format = options['format'] or ('nt' if name.endswith('.nt') else 'jsonl')
+
+        since = None
+        if options['since']:
+            try:
+                since = dateparser.parse(options['since'])
+            except ValueError as err:
+                raise CommandError('Invalid --since: {}'.format(err))
+            if settings.USE_TZ and timezone.is_naive(since):
+                since = timezone.make_aware(since, timezone.utc)
+
+        if path == '-':
+            out = sys.stdout
+        elif path.endswith('.gz'):
+            out = io.TextIOWrapper(gzip.open(path, 'wb'), encoding='utf-8')
+        else:
+            out = io.open(path, 'w', encoding='utf-8')
+        try:
+            if file_format == 'nt':
+                export_ntriples(out, options['base_uri'], since=since, chunk_size=options['chunk_size'])
+            else:
+                export_json_lines(out, since=since, chunk_size=options['chunk_size'])
+        finally:
+            if out is not sys.stdout:
+                out.close()
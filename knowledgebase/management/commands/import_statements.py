@@ -0,0 +1,67 @@
+import gzip
+import io
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from knowledgebase.importer import import_statements, read_csv, read_json_lines
+
+
+class Command(BaseCommand):
+
+    help = 'Imports Statements from JSON lines or CSV dump. Files ending with ".gz" are decompressed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['jsonl', 'csv'], default=None, help='Defaults to file extension.')
+        parser.add_argument('--lang', default=settings.LANGUAGE_CODE, help='Language of Concept labels.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--create-concepts', action='store_true', help='Create Concepts for unknown labels.')
+        parser.add_argument('--checkpoint', default=None, help='File to store progress in. Existing file resumes the import.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        name = path[:-3] if path.endswith('.gz') else path
+        file_format = options['format'] or ('csv' if name.endswith('.csv') else 'jsonl')
+
+        checkpoint = options['checkpoint']
+        start_line = 0
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as checkpoint_file:
+                start_line = int(checkpoint_file.read().strip() or 0)
+            self.stdout.write('Resuming after line {}'.format(start_line))
+
+        def on_chunk(line_number, result):
+            if checkpoint:
+                with open(checkpoint, 'w') as checkpoint_file:
+                    checkpoint_file.write(str(line_number))
+            if options['verbosity'] >= 2:
+                self.stdout.write('Line {}: {} statements imported'.format(line_number, result.statements))
+
+        if path.endswith('.gz'):
+            stream = io.TextIOWrapper(gzip.open(path), encoding='utf-8', newline='')
+        else:
+            stream = io.open(path, encoding='utf-8', newline='')
+        with stream:
+            reader = read_csv if file_format == 'csv' else read_json_lines
+            try:
+                result = import_statements(
+                    reader(stream),
+                    lang=options['lang'],
+                    chunk_size=options['chunk_size'],
+                    start_line=start_line,
+                    create_missing=options['create_concepts'],
+                    on_chunk=on_chunk,
+                )
+            except ValueError as err:
+                raise CommandError(str(err))
+
+        for line_number, reason in result.errors:
+            self.stderr.write('Line {}: {}'.format(line_number, reason))
+        self.stdout.write(
+            'Imported {} statements, {} qualifiers and {} reference links. '
+            'Created {} concepts, skipped {} lines.'.format(
+                result.statements, result.qualifiers, result.references, result.concepts, result.skipped
+            )
+        )
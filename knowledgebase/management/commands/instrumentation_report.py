@@ -0,0 +1,51 @@
+import json
+
+from django.contrib import admin
+from django.core.management.base import BaseCommand
+
+from knowledgebase import instrumentation, labels
+from knowledgebase.models import Concept, Statement
+
+
+class Command(BaseCommand):
+
+    help = (
+        'Renders Concepts, their Statements and admin fields with cold label cache, '
+        'and reports query counts and timings per call site.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('concept', nargs='*', type=int, help='Concept IDs. Defaults to first Concepts by ID.')
+        parser.add_argument('--limit', type=int, default=100, help='Number of Concepts when no IDs are given.')
+        parser.add_argument('--lang', default=None, help='Language of labels.')
+        parser.add_argument('--format', choices=['text', 'json'], default='text')
+
+    def handle(self, *args, **options):
+        concepts = Concept.objects.order_by('id')
+        if options['concept']:
+            concepts = concepts.filter(id__in=options['concept'])
+        else:
+            concepts = concepts[:options['limit']]
+        lang = options['lang']
+        concept_admin = admin.site._registry.get(Concept)
+
+        labels.invalidate()
+        instrumentation.reset_stats()
+        with instrumentation.collecting():
+            for concept in concepts:
+                if lang:
+                    concept.get_translation(lang)
+                str(concept)
+                for statement in Statement.objects.filter(concept=concept):
+                    str(statement)
+                    if lang:
+                        statement.get_value_as_string(lang)
+                if concept_admin is not None:
+                    concept_admin.show_statements(concept)
+                    concept_admin.show_translations(concept)
+
+        stats = instrumentation.get_stats()
+        if options['format'] == 'json':
+            self.stdout.write(json.dumps(stats, indent=2, sort_keys=True))
+        else:
+            self.stdout.write(instrumentation.format_report(stats))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from knowledgebase.concepts import merge_concepts
+from knowledgebase.models import Concept
+
+
+class Command(BaseCommand):
+
+    help = 'Moves Translations and Statements of a Concept to another Concept and deletes it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('src', type=int, help='ID of the Concept to merge and delete.')
+        parser.add_argument('dst', type=int, help='ID of the Concept to keep.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for concept_id in (options['src'], options['dst']):
+            if not Concept.objects.filter(id=concept_id).exists():
+                raise CommandError('Concept {} does not exist'.format(concept_id))
+        try:
+            report = merge_concepts(options['src'], options['dst'], batch_size=options['batch_size'])
+        except ValueError as err:
+            raise CommandError(str(err))
+        for name, count in sorted(report.items()):
+            self.stdout.write('{}: {}'.format(name, count))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from knowledgebase import closure
+
+
+class Command(BaseCommand):
+
+    help = 'Rebuilds transitive closure of predicates listed in KNOWLEDGEBASE_TRANSITIVE_PREDICATES.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('pred', nargs='*', type=int, help='Predicate IDs. Defaults to all transitive predicates.')
+
+    def handle(self, *args, **options):
+        preds = options['pred'] or sorted(closure.get_transitive_predicates())
+        for pred_id in preds:
+            if not closure.is_transitive(pred_id):
+                raise CommandError('Predicate {} is not in KNOWLEDGEBASE_TRANSITIVE_PREDICATES'.format(pred_id))
+            closure.rebuild(pred_id)
+            self.stdout.write('Rebuilt closure of predicate {}'.format(pred_id))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from knowledgebase import labels
+
+
+class Command(BaseCommand):
+
+    help = 'Recreates precomputed labels of all Concepts in KNOWLEDGEBASE_LABEL_LANGUAGES.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        labels.rebuild_concept_labels(chunk_size=options['chunk_size'])
+        self.stdout.write('Rebuilt labels in {}'.format(', '.join(labels.get_label_languages())))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from knowledgebase import search
+
+
+class Command(BaseCommand):
+
+    help = 'Rebuilds search index of Translations and Concept descriptions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        search.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write('Search index rebuilt')
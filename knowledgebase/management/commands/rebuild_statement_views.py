@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from knowledgebase import readmodel
+
+
+class Command(BaseCommand):
+
+    help = 'Rebuilds flattened StatementView rows in languages of KNOWLEDGEBASE_STATEMENT_VIEW_LANGUAGES.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not readmodel.is_enabled():
+            raise CommandError('KNOWLEDGEBASE_STATEMENT_VIEW_LANGUAGES is not set')
+        readmodel.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write('Statement views rebuilt')
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-17 13:09
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledgebase', '0005_m2m_references'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='translation',
+            unique_together={('concept', 'lang', 'case')},
+        ),
+    ]
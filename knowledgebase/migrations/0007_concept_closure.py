@@ -0,0 +1,28 @@
+# Generated by Django 2.2.28 on 2026-10-17 13:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledgebase', '0006_translation_unique_per_concept'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConceptClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closure_descendants', to='knowledgebase.Concept')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closure_ancestors', to='knowledgebase.Concept')),
+                ('pred', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='knowledgebase.Concept')),
+            ],
+            options={
+                'unique_together': {('pred', 'descendant', 'ancestor')},
+                'index_together': {('pred', 'ancestor', 'depth')},
+            },
+        ),
+    ]
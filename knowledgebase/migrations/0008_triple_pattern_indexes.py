@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-17 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledgebase', '0007_concept_closure'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='quantityvalue',
+            name='value',
+            field=models.DecimalField(db_index=True, decimal_places=12, max_digits=30),
+        ),
+        migrations.AlterField(
+            model_name='timevalue',
+            name='value',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='statement',
+            index_together={('concept', 'pred', 'value'), ('value', 'concept', 'pred'), ('pred', 'value', 'concept')},
+        ),
+    ]
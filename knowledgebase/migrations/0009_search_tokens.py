@@ -0,0 +1,79 @@
+# Generated by Django 2.2.28 on 2026-10-17 13:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from knowledgebase import search
+
+
+def fill_tokens(apps, schema_editor):
+    Concept = apps.get_model('knowledgebase', 'Concept')
+    Translation = apps.get_model('knowledgebase', 'Translation')
+    SearchToken = apps.get_model('knowledgebase', 'SearchToken')
+
+    def create_tokens(concept_id, text, lang, source, translation_id=None):
+        text = text[:250]
+        return [
+            SearchToken(
+                concept_id=concept_id, translation_id=translation_id, lang=lang,
+                source=source, token=token[:250], text=text, length=len(text),
+            )
+            for token in set(search.tokenize(text))
+        ]
+
+    last_id = 0
+    while True:
+        translations = list(Translation.objects.filter(id__gt=last_id).order_by('id')[:1000])
+        if not translations:
+            break
+        tokens = []
+        for translation in translations:
+            tokens += create_tokens(
+                translation.concept_id, translation.translation, translation.lang,
+                search.SOURCE_TRANSLATION, translation.id,
+            )
+        SearchToken.objects.bulk_create(tokens)
+        last_id = translations[-1].id
+
+    last_id = 0
+    while True:
+        concepts = list(Concept.objects.filter(id__gt=last_id, description__isnull=False).order_by('id')[:1000])
+        if not concepts:
+            break
+        tokens = []
+        for concept in concepts:
+            if concept.description:
+                tokens += create_tokens(concept.id, concept.description, None, search.SOURCE_DESCRIPTION)
+        SearchToken.objects.bulk_create(tokens)
+        last_id = concepts[-1].id
+
+
+def do_nothing(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledgebase', '0008_triple_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('t', 'translation'), ('d', 'description')], max_length=1)),
+                ('lang', models.CharField(blank=True, max_length=15, null=True)),
+                ('token', models.CharField(db_index=True, max_length=250)),
+                ('text', models.CharField(max_length=250)),
+                ('length', models.PositiveSmallIntegerField()),
+                ('concept', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='knowledgebase.Concept')),
+                ('translation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='knowledgebase.Translation')),
+            ],
+        ),
+        migrations.RunPython(
+            fill_tokens,
+            do_nothing,
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 2.2.28 on 2026-10-17 13:14
+
+from django.db import migrations, models
+
+from knowledgebase import geo
+
+
+def fill_cells(apps, schema_editor):
+    CoordinateValue = apps.get_model('knowledgebase', 'CoordinateValue')
+
+    last_id = 0
+    while True:
+        coordinates = list(CoordinateValue.objects.filter(id__gt=last_id).order_by('id')[:1000])
+        if not coordinates:
+            break
+        for coordinate in coordinates:
+            coordinate.cell = geo.encode(coordinate.latitude, coordinate.longitude)
+        CoordinateValue.objects.bulk_update(coordinates, ['cell'])
+        last_id = coordinates[-1].id
+
+
+def do_nothing(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledgebase', '0009_search_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coordinatevalue',
+            name='cell',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(
+            fill_cells,
+            do_nothing,
+        ),
+        migrations.AlterIndexTogether(
+            name='coordinatevalue',
+            index_together={('globe', 'cell')},
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 2.2.28 on 2026-10-17 13:15
+
+from django.db import migrations, models
+
+from knowledgebase import timekeys
+
+
+def fill_intervals(apps, schema_editor):
+    TimeValue = apps.get_model('knowledgebase', 'TimeValue')
+
+    last_id = 0
+    while True:
+        time_values = list(TimeValue.objects.filter(id__gt=last_id).order_by('id')[:1000])
+        if not time_values:
+            break
+        for time_value in time_values:
+            earliest, latest = timekeys.interval(
+                time_value.value, time_value.year, time_value.precision, time_value.before, time_value.after
+            )
+            TimeValue.objects.filter(id=time_value.id).update(earliest=earliest, latest=latest)
+        last_id = time_values[-1].id
+
+
+def do_nothing(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledgebase', '0010_coordinate_cells'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timevalue',
+            name='earliest',
+            field=models.BigIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='timevalue',
+            name='latest',
+            field=models.BigIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='timevalue',
+            name='year',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='timevalue',
+            name='precision',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'billion years'), (1, 'hundred million years'), (2, 'ten million years'), (3, 'million years'), (4, 'hundred thousand years'), (5, 'ten thousand years'), (6, 'millenium'), (7, 'century'), (8, 'decade'), (9, 'year'), (10, 'month'), (11, 'day'), (12, 'hour'), (13, 'minute'), (14, 'second')]),
+        ),
+        migrations.AlterField(
+            model_name='timevalue',
+            name='value',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(
+            fill_intervals,
+            do_nothing,
+        ),
+    ]
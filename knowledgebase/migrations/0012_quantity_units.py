@@ -0,0 +1,64 @@
+# Generated by Django 2.2.28 on 2026-10-17 13:16
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_normalized_values(apps, schema_editor):
+    QuantityValue = apps.get_model('knowledgebase', 'QuantityValue')
+
+    # Existing quantities have no unit, so normalization does not change them
+    QuantityValue.objects.update(
+        normalized_value=F('value'),
+        normalized_lower_bound=Coalesce('lower_bound', 'value'),
+        normalized_upper_bound=Coalesce('upper_bound', 'value'),
+    )
+
+
+def do_nothing(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledgebase', '0011_time_interval_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quantityvalue',
+            name='normalized_lower_bound',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='quantityvalue',
+            name='normalized_unit',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='knowledgebase.Concept'),
+        ),
+        migrations.AddField(
+            model_name='quantityvalue',
+            name='normalized_upper_bound',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='quantityvalue',
+            name='normalized_value',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='quantityvalue',
+            name='unit',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='quantities', to='knowledgebase.Concept'),
+        ),
+        migrations.AlterIndexTogether(
+            name='quantityvalue',
+            index_together={('normalized_unit', 'normalized_lower_bound', 'normalized_upper_bound'), ('normalized_unit', 'normalized_value')},
+        ),
+        migrations.RunPython(
+            fill_normalized_values,
+            do_nothing,
+        ),
+    ]
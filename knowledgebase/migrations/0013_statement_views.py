@@ -0,0 +1,43 @@
+# Generated by Django 2.2.28 on 2026-10-17 13:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledgebase', '0012_quantity_units'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatementView',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lang', models.CharField(max_length=15)),
+                ('value_kind', models.CharField(choices=[('none', 'no value'), ('concept', 'concept'), ('string', 'string'), ('quantity', 'quantity'), ('time', 'time'), ('coordinate', 'coordinate')], max_length=10)),
+                ('string_value', models.TextField(null=True)),
+                ('quantity_value', models.DecimalField(decimal_places=12, max_digits=30, null=True)),
+                ('quantity_normalized_value', models.FloatField(null=True)),
+                ('time_earliest', models.BigIntegerField(null=True)),
+                ('time_latest', models.BigIntegerField(null=True)),
+                ('latitude', models.FloatField(null=True)),
+                ('longitude', models.FloatField(null=True)),
+                ('concept_label', models.TextField(null=True)),
+                ('pred_label', models.TextField(null=True)),
+                ('value_label', models.TextField()),
+                ('concept', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='knowledgebase.Concept')),
+                ('globe', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='knowledgebase.Concept')),
+                ('parent', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='knowledgebase.Statement')),
+                ('pred', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='knowledgebase.Concept')),
+                ('quantity_unit', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='knowledgebase.Concept')),
+                ('statement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='views', to='knowledgebase.Statement')),
+                ('value', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='knowledgebase.Concept')),
+            ],
+            options={
+                'unique_together': {('statement', 'lang')},
+                'index_together': {('concept', 'lang'), ('value', 'lang'), ('pred', 'lang')},
+            },
+        ),
+    ]
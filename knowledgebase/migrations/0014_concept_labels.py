@@ -0,0 +1,62 @@
+# Generated by Django 2.2.28 on 2026-10-17 13:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from knowledgebase import labels
+
+
+def fill_labels(apps, schema_editor):
+    Concept = apps.get_model('knowledgebase', 'Concept')
+    Translation = apps.get_model('knowledgebase', 'Translation')
+    ConceptLabel = apps.get_model('knowledgebase', 'ConceptLabel')
+
+    langs = labels.get_label_languages()
+    last_id = 0
+    while True:
+        concept_ids = list(Concept.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:1000])
+        if not concept_ids:
+            break
+        translations = {concept_id: [] for concept_id in concept_ids}
+        rows = Translation.objects.filter(concept_id__in=concept_ids).order_by('id').values_list('concept_id', 'lang', 'case', 'translation')
+        for concept_id, lang, case, translation in rows:
+            translations[concept_id].append((lang, case, translation))
+        concept_labels = []
+        for concept_id, concept_translations in translations.items():
+            for lang in langs:
+                label = labels._resolve(concept_translations, lang, None, False)
+                if label:
+                    concept_labels.append(ConceptLabel(concept_id=concept_id, lang=lang, label=label))
+        ConceptLabel.objects.bulk_create(concept_labels)
+        last_id = concept_ids[-1]
+
+
+def do_nothing(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledgebase', '0013_statement_views'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConceptLabel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lang', models.CharField(max_length=15)),
+                ('label', models.CharField(max_length=250)),
+                ('concept', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='concept_labels', to='knowledgebase.Concept')),
+            ],
+            options={
+                'unique_together': {('concept', 'lang')},
+                'index_together': {('lang', 'label')},
+            },
+        ),
+        migrations.RunPython(
+            fill_labels,
+            do_nothing,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-17 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledgebase', '0014_concept_labels'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reference',
+            name='description',
+            field=models.CharField(blank=True, db_index=True, max_length=250, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-17 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledgebase', '0015_reference_description_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='coordinatevalue',
+            name='cell',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+    ]
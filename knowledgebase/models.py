@@ -1,47 +1,127 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import datetime
+
 from dateutil.relativedelta import relativedelta
 
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, FilteredRelation, Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 
+from knowledgebase import aio, closure, concepts, documents, geo, instrumentation, labels, readmodel, references, search, timekeys, units
+
+
+class ConceptQuerySet(models.QuerySet):
+
+    def search(self, q, lang=None, limit=10, include_descriptions=False):
+        """ Ranked prefix search by label among Concepts of this queryset.
+        See knowledgebase.search.search().
+        """
+        return search.search(q, lang=lang, limit=limit, include_descriptions=include_descriptions, queryset=self)
+
+    def with_labels(self, *langs):
+        """ Loads precomputed labels in given languages (LANGUAGE_CODE by
+        default) with one join per language, so that get_translation() and
+        __str__ need no queries. Labels are also available for filtering and
+        ordering as annotations named by labels.get_label_annotation().
+        """
+        result = self
+        for lang in langs or [settings.LANGUAGE_CODE]:
+            annotation = labels.get_label_annotation(lang)
+            relation = '{}_row'.format(annotation)
+            result = result.annotate(**{
+                relation: FilteredRelation('concept_labels', condition=Q(concept_labels__lang=lang)),
+            }).annotate(**{annotation: F('{}__label'.format(relation))})
+        return result
+
+    def order_by_label(self, lang=settings.LANGUAGE_CODE):
+        """ Orders Concepts by precomputed label. Concepts without
+        label in the language come last.
+        """
+        annotation = labels.get_label_annotation(lang)
+        return self.with_labels(lang).order_by(F(annotation).asc(nulls_last=True), 'id')
+
+    def bulk_delete(self, batch_size=1000):
+        """ Deletes Concepts and everything referring to them with set-based
+        queries. See knowledgebase.concepts.bulk_delete_concepts().
+        """
+        return concepts.bulk_delete_concepts(list(self.values_list('id', flat=True)), batch_size=batch_size)
+
 
 @python_2_unicode_compatible
 class Concept(models.Model):
     description = models.TextField(null=True, blank=True, default=None)
 
+    objects = ConceptQuerySet.as_manager()
+
+    @instrumentation.instrumented('Concept.get_translation')
     def get_translation(self, lang=settings.LANGUAGE_CODE, case=None, strict_case=False):
         """ Tries to get proper translation and case, but may return
         some other translation or case, if requested one is not available.
 
         If "strict_case" is set to true, then None is returned if case was not found
+
+        Translations are cached in process memory. Use
+        knowledgebase.labels.get_translations() to fetch many at once.
         """
 
-        # Try requested language and case
-        translation = self.translations.filter(lang=lang, case=case).first()
-        if translation:
-            return translation.translation
-        if strict_case:
-            return None
+        if self.id is None:
+            return ''
+        if case is None and not strict_case:
+            label = self.__dict__.get(labels.get_label_annotation(lang))
+            if label is not None:
+                return label
+        return labels.get_translations([self.id], lang, case, strict_case)[self.id]
 
-        # Try requested language
-        translation = self.translations.filter(lang=lang).first()
-        if translation:
-            return translation.translation
+    async def aget_translation(self, lang=settings.LANGUAGE_CODE, case=None, strict_case=False):
+        """ Async version of get_translation().
+        """
+        if self.id is None:
+            return ''
+        return (await labels.aget_translations([self.id], lang, case, strict_case))[self.id]
 
-        # Try any language
-        translation = self.translations.first()
-        if translation:
-            return translation.translation
+    def get_ancestors(self, pred, max_depth=None):
+        """ Returns Concepts reachable from this one through Statements
+        with transitive predicate "pred", nearest first.
+        """
+        return Concept.objects.filter(**_closure_filter('closure_descendants', 'descendant', self, pred, max_depth)).order_by('closure_descendants__depth')
 
-        return ''
+    def get_descendants(self, pred, max_depth=None):
+        """ Returns Concepts from which this one is reachable through
+        Statements with transitive predicate "pred", nearest first.
+        """
+        return Concept.objects.filter(**_closure_filter('closure_ancestors', 'ancestor', self, pred, max_depth)).order_by('closure_ancestors__depth')
+
+    def has_ancestor(self, ancestor, pred):
+        return ConceptClosure.objects.filter(pred=pred, descendant=self, ancestor=ancestor).exists()
+
+    def get_label(self, lang=settings.LANGUAGE_CODE):
+        return self.get_translation(lang) or self.description
 
+    @instrumentation.instrumented('Concept.__str__')
     def __str__(self):
-        return self.get_translation() or self.description
+        return self.get_label()
+
+
+def _closure_filter(relation, field, concept, pred, max_depth):
+    pred_id = getattr(pred, 'id', pred)
+    if not closure.is_transitive(pred_id):
+        raise ValueError('Predicate {} is not in KNOWLEDGEBASE_TRANSITIVE_PREDICATES'.format(pred_id))
+    result = {
+        '{}__pred_id'.format(relation): pred_id,
+        '{}__{}'.format(relation, field): concept,
+    }
+    if max_depth is not None:
+        result['{}__depth__lte'.format(relation)] = max_depth
+    return result
 
 
 @python_2_unicode_compatible
@@ -52,15 +132,103 @@ class Translation(models.Model):
     case = models.CharField(max_length=40, null=True, blank=True, default=None)
 
     class Meta:
-        unique_together = ['lang', 'case']
+        unique_together = ['concept', 'lang', 'case']
         index_together = ['lang', 'case']
 
+    @instrumentation.instrumented('Translation.__str__')
     def __str__(self):
         if self.case:
             return '{} ({}:{})'.format(self.translation, self.lang, self.case)
         return '{} ({})'.format(self.translation, self.lang)
 
 
+class ConceptLabel(models.Model):
+    """ Best Translation of a Concept in a language, using the fallback
+    rules of Concept.get_translation(). Maintained by knowledgebase.labels.
+    """
+    concept = models.ForeignKey(Concept, related_name='concept_labels', on_delete=models.CASCADE)
+    lang = models.CharField(max_length=15)
+    label = models.CharField(max_length=250)
+
+    class Meta:
+        unique_together = ['concept', 'lang']
+        index_together = ['lang', 'label']
+
+
+class StatementQuerySet(models.QuerySet):
+
+    VALUE_RELATIONS = ['string_value', 'quantity_value', 'time_value', 'coordinate_value']
+
+    def __init__(self, *args, **kwargs):
+        super(StatementQuerySet, self).__init__(*args, **kwargs)
+        self._prefetch_labels = False
+
+    def with_values(self):
+        """ Loads typed values, related Concepts and their labels in a fixed
+        number of queries, so that rendering Statements needs no more queries.
+        """
+        clone = self._select_values()
+        clone._prefetch_labels = True
+        return clone
+
+    async def awith_values(self):
+        """ Async version of with_values(). Returns a list of Statements.
+        Labels are loaded with concurrent queries after the Statements.
+        """
+        statements = await aio.run(list, self._select_values())
+        await labels.aget_translations(_get_label_concept_ids(statements))
+        return statements
+
+    def _select_values(self):
+        # Qualifiers are rendered with their parent Statements
+        relations = ['concept', 'pred', 'value', 'coordinate_value__globe', 'quantity_value__unit'] + self.VALUE_RELATIONS
+        return self.select_related(*(relations + ['statement__' + relation for relation in relations]))
+
+    def match(self, subject=None, pred=None, value=None):
+        """ Filters Statements by triple pattern. Each part can be a
+        Concept, an ID or a list of them, or None to match anything.
+        Every combination is covered by one of the composite indexes.
+        """
+        for field, part in [('concept', subject), ('pred', pred), ('value', value)]:
+            if part is None:
+                continue
+            if isinstance(part, (list, tuple, set, frozenset, models.QuerySet)):
+                self = self.filter(**{'{}__in'.format(field): part})
+            else:
+                self = self.filter(**{field: part})
+        return self
+
+    def _clone(self):
+        clone = super(StatementQuerySet, self)._clone()
+        clone._prefetch_labels = self._prefetch_labels
+        return clone
+
+    def _fetch_all(self):
+        prefetch_labels = self._prefetch_labels and self._result_cache is None
+        super(StatementQuerySet, self)._fetch_all()
+        if prefetch_labels:
+            labels.prefetch(_get_label_concept_ids(
+                statement for statement in self._result_cache if isinstance(statement, Statement)
+            ))
+
+
+def _get_label_concept_ids(statements):
+    """ Returns IDs of Concepts whose labels are needed to render Statements.
+    """
+    concept_ids = set()
+    for statement in statements:
+        concept_ids.update((statement.concept_id, statement.pred_id, statement.value_id))
+        value = statement.get_value()
+        if isinstance(value, CoordinateValue):
+            concept_ids.add(value.globe_id)
+        elif isinstance(value, QuantityValue):
+            concept_ids.add(value.unit_id)
+        if statement.statement_id is not None and Statement.statement.is_cached(statement):
+            concept_ids.update(_get_label_concept_ids([statement.statement]))
+    concept_ids.discard(None)
+    return concept_ids
+
+
 @python_2_unicode_compatible
 class Statement(models.Model):
     concept = models.ForeignKey(Concept, related_name='statements', on_delete=models.CASCADE, null=True, blank=True)
@@ -70,19 +238,40 @@ class Statement(models.Model):
 
     updated_at = models.DateTimeField(auto_now=True)
 
-    def get_value_as_string(self):
-        if self.value:
-            return '{:s}'.format(str(self.value))
-        if hasattr(self, 'string_value'):
-            return '{:s}'.format(str(self.string_value))
-        if hasattr(self, 'quantity_value'):
-            return '{}'.format(str(self.quantity_value))
-        if hasattr(self, 'time_value'):
-            return '{}'.format(str(self.time_value))
-        if hasattr(self, 'coordinate_value'):
-            return '{}'.format(str(self.coordinate_value))
-        return '*NO VALUE*'
+    objects = StatementQuerySet.as_manager()
 
+    class Meta:
+        # Subject-predicate-value, predicate-value-subject and value-subject-predicate
+        index_together = [
+            ['concept', 'pred', 'value'],
+            ['pred', 'value', 'concept'],
+            ['value', 'concept', 'pred'],
+        ]
+
+    def get_value(self):
+        """ Returns value Concept or one of typed value objects, or None if
+        Statement has no value. Use Statement.objects.with_values() to avoid
+        a query per value type.
+        """
+        if self.value_id is not None:
+            return self.value
+        for relation in StatementQuerySet.VALUE_RELATIONS:
+            if hasattr(self, relation):
+                return getattr(self, relation)
+        return None
+
+    @instrumentation.instrumented('Statement.get_value_as_string')
+    def get_value_as_string(self, lang=settings.LANGUAGE_CODE):
+        value = self.get_value()
+        if value is None:
+            return '*NO VALUE*'
+        if isinstance(value, Concept):
+            return '{}'.format(value.get_label(lang))
+        if isinstance(value, (QuantityValue, CoordinateValue)):
+            return value.to_string(lang)
+        return '{}'.format(str(value))
+
+    @instrumentation.instrumented('Statement.__str__')
     def __str__(self):
         if self.concept:
             return '{}, {}, {}'.format(str(self.concept), str(self.pred), self.get_value_as_string())
@@ -95,27 +284,111 @@ class StringValue(models.Model):
     statement = models.OneToOneField(Statement, related_name='string_value', on_delete=models.CASCADE)
     value = models.TextField()
 
+    @instrumentation.instrumented('StringValue.__str__')
     def __str__(self):
         return '"{}"'.format(self.value)
 
 
+class QuantityValueQuerySet(models.QuerySet):
+    """ Range queries on values normalized to canonical units. Limits are
+    given in "unit" and only quantities with the same canonical unit match.
+    """
+
+    def in_range(self, low=None, high=None, unit=None):
+        """ QuantityValues whose value is between "low" and "high", inclusive.
+        """
+        canonical_id, low = units.normalize(low, unit)
+        high = units.normalize(high, unit)[1]
+        result = self.filter(normalized_unit_id=canonical_id)
+        if low is not None:
+            result = result.filter(normalized_value__gte=low)
+        if high is not None:
+            result = result.filter(normalized_value__lte=high)
+        return result
+
+    def overlaps(self, low, high, unit=None):
+        """ QuantityValues whose bounds overlap range from "low" to "high".
+        """
+        canonical_id, low = units.normalize(low, unit)
+        high = units.normalize(high, unit)[1]
+        return self.filter(normalized_unit_id=canonical_id, normalized_lower_bound__lte=high, normalized_upper_bound__gte=low)
+
+
 @python_2_unicode_compatible
 class QuantityValue(models.Model):
     statement = models.OneToOneField(Statement, related_name='quantity_value', on_delete=models.CASCADE)
-    value = models.DecimalField(max_digits=30, decimal_places=12)
+    value = models.DecimalField(max_digits=30, decimal_places=12, db_index=True)
     lower_bound = models.DecimalField(max_digits=30, decimal_places=12, null=True, blank=True)
     upper_bound = models.DecimalField(max_digits=30, decimal_places=12, null=True, blank=True)
+    unit = models.ForeignKey(Concept, related_name='quantities', on_delete=models.PROTECT, null=True, blank=True)
 
-    def __str__(self):
+    # Values converted to canonical unit by knowledgebase.units. Bounds are same as value if not given.
+    normalized_unit = models.ForeignKey(Concept, related_name='+', on_delete=models.PROTECT, null=True, editable=False)
+    normalized_value = models.FloatField(null=True, editable=False)
+    normalized_lower_bound = models.FloatField(null=True, editable=False)
+    normalized_upper_bound = models.FloatField(null=True, editable=False)
+
+    objects = QuantityValueQuerySet.as_manager()
+
+    class Meta:
+        index_together = [
+            ['normalized_unit', 'normalized_value'],
+            ['normalized_unit', 'normalized_lower_bound', 'normalized_upper_bound'],
+        ]
+
+    def save(self, *args, **kwargs):
+        units.normalize_quantity(self)
+        super(QuantityValue, self).save(*args, **kwargs)
+
+    def to_string(self, lang=settings.LANGUAGE_CODE):
         if self.lower_bound is not None and self.upper_bound is not None:
-            return '{} - {}'.format(self.lower_bound, self.upper_bound)
-        return '{}'.format(self.value)
+            result = '{} - {}'.format(self.lower_bound, self.upper_bound)
+        else:
+            result = '{}'.format(self.value)
+        if self.unit_id is not None:
+            result += ' {}'.format(self.unit.get_label(lang))
+        return result
+
+    @instrumentation.instrumented('QuantityValue.__str__')
+    def __str__(self):
+        return self.to_string()
+
+
+class TimeValueQuerySet(models.QuerySet):
+    """ Range queries on precomputed interval keys. Times can be given as
+    years (int), dates or datetimes. A year or date covers all of it.
+    """
+
+    def overlaps(self, start, end=None):
+        """ TimeValues whose interval overlaps given time or time range.
+        """
+        earliest = timekeys.interval_of(start)[0]
+        latest = timekeys.interval_of(start if end is None else end)[1]
+        return self.filter(earliest__lte=latest, latest__gte=earliest)
+
+    def within(self, start, end=None):
+        """ TimeValues whose interval is completely inside given time or time range.
+        """
+        earliest = timekeys.interval_of(start)[0]
+        latest = timekeys.interval_of(start if end is None else end)[1]
+        return self.filter(earliest__gte=earliest, latest__lte=latest)
+
+    def before(self, time):
+        return self.filter(latest__lt=timekeys.interval_of(time)[0])
+
+    def after(self, time):
+        return self.filter(earliest__gt=timekeys.interval_of(time)[1])
 
 
-# TODO: Support negative years and also billions of years
 @python_2_unicode_compatible
 class TimeValue(models.Model):
     PRECISION_CHOICES = [
+        (0, _('billion years')),
+        (1, _('hundred million years')),
+        (2, _('ten million years')),
+        (3, _('million years')),
+        (4, _('hundred thousand years')),
+        (5, _('ten thousand years')),
         (6, _('millenium')),
         (7, _('century')),
         (8, _('decade')),
@@ -128,7 +401,11 @@ class TimeValue(models.Model):
     ]
 
     statement = models.OneToOneField(Statement, related_name='time_value', on_delete=models.CASCADE)
-    value = models.DateTimeField()
+    value = models.DateTimeField(db_index=True, null=True, blank=True)
+
+    # Year in astronomical numbering, for times that do not fit to "value".
+    # Used only if "value" is not set, with precision of year or less.
+    year = models.BigIntegerField(null=True, blank=True)
 
     precision = models.PositiveSmallIntegerField(choices=PRECISION_CHOICES)
 
@@ -136,47 +413,51 @@ class TimeValue(models.Model):
     before = models.PositiveIntegerField(null=True, blank=True)
     after = models.PositiveIntegerField(null=True, blank=True)
 
+    # Inclusive interval covered by this time, as keys from knowledgebase.timekeys
+    earliest = models.BigIntegerField(null=True, db_index=True, editable=False)
+    latest = models.BigIntegerField(null=True, db_index=True, editable=False)
+
+    objects = TimeValueQuerySet.as_manager()
+
+    def clean(self):
+        if self.value is None and self.year is None:
+            raise ValidationError(_('Either value or year is required.'))
+
+    def save(self, *args, **kwargs):
+        self.earliest, self.latest = timekeys.interval(self.value, self.year, self.precision, self.before, self.after)
+        super(TimeValue, self).save(*args, **kwargs)
+
+    @instrumentation.instrumented('TimeValue.__str__')
     def __str__(self):
-        if self.precision == 6:
-            year = int(round(self.value.year / 1000.0)) * 1000
-            year_unit = 1000
-        elif self.precision == 7:
-            year = int(round(self.value.year / 100.0)) * 100
-            yar_unit = 100
-        elif self.precision == 8:
-            year = int(round(self.value.year / 1.0)) * 10
-            year_unit = 10
-        elif self.precision >= 9:
-            year = self.value.year
-            year_unit = 1
-
-        # Only years
-        if self.precision <= 9:
+        # Years are floored to precision unit like in knowledgebase.timekeys.
+        # Values with only year are shown as years at any precision.
+        if self.precision <= 9 or self.value is None:
+            value_year = self.value.year if self.value is not None else self.year
+            year_unit = timekeys.year_unit(self.precision)
+            year = timekeys.floor_year(value_year, self.precision)
             if self.before is not None and self.after is not None:
                 if self.before > 0 or self.after > 0:
                     return '{} – {}'.format(year - year_unit * self.before, year + year_unit * self.after)
             return str(year)
 
         if self.before is not None and self.after is not None and (self.before > 0 or self.after > 0):
-            if self.precision == 10:
-                date_before = self.value - relativedelta(months=self.before)
-                date_after = self.value + relativedelta(months=self.after)
-            elif self.precision == 11:
-                date_before = self.value - relativedelta(days=self.before)
-                date_after = self.value + relativedelta(days=self.after)
-            elif self.precision == 12:
-                date_before = self.value - relativedelta(hours=self.before)
-                date_after = self.value + relativedelta(hours=self.after)
-            elif self.precision == 13:
-                date_before = self.value - relativedelta(minutes=self.before)
-                date_after = self.value + relativedelta(minutes=self.after)
-            elif self.precision == 14:
-                date_before = self.value - relativedelta(seconds=self.before)
-                date_after = self.value + relativedelta(seconds=self.after)
-            return '{} – {}'.format(self._to_precision_date(date_before), self._to_precision_date(date_after))
+            return '{} – {}'.format(
+                self._to_precision_date(self._shift(-self.before)),
+                self._to_precision_date(self._shift(self.after)),
+            )
 
         return self._to_precision_date(self.value)
 
+    def _shift(self, amount):
+        """ Returns value moved by "amount" precision units, limited to the range of datetime.
+        """
+        unit = {10: 'months', 11: 'days', 12: 'hours', 13: 'minutes'}.get(self.precision, 'seconds')
+        try:
+            return self.value + relativedelta(**{unit: amount})
+        except (OverflowError, ValueError):
+            limit = datetime.datetime.max if amount > 0 else datetime.datetime.min
+            return limit.replace(tzinfo=self.value.tzinfo)
+
     def _to_precision_date(self, value):
         result = '{:04d}.{:02d}'.format(value.year, value.month)
         if self.precision >= 11:
@@ -190,6 +471,19 @@ class TimeValue(models.Model):
         return result
 
 
+class CoordinateValueQuerySet(models.QuerySet):
+
+    def near(self, latitude, longitude, radius_m, globe=None):
+        """ See knowledgebase.geo.near().
+        """
+        return geo.near(self, latitude, longitude, radius_m, globe=globe)
+
+    def within_bbox(self, south, west, north, east, globe=None):
+        """ See knowledgebase.geo.within_bbox().
+        """
+        return geo.within_bbox(self, south, west, north, east, globe=globe)
+
+
 @python_2_unicode_compatible
 class CoordinateValue(models.Model):
     statement = models.OneToOneField(Statement, related_name='coordinate_value', on_delete=models.CASCADE)
@@ -199,25 +493,309 @@ class CoordinateValue(models.Model):
     height_m = models.FloatField(null=True, blank=True, default=None)
     globe = models.ForeignKey(Concept, related_name='coordinates', on_delete=models.PROTECT)
 
-    def __str__(self):
+    # Geohash of the position, for spatial queries
+    # Lookups without globe use the index of "cell" instead of (globe, cell)
+    cell = models.CharField(max_length=geo.CELL_LENGTH, blank=True, editable=False, db_index=True)
+
+    objects = CoordinateValueQuerySet.as_manager()
+
+    class Meta:
+        index_together = ['globe', 'cell']
+
+    def save(self, *args, **kwargs):
+        self.cell = geo.encode(self.latitude, self.longitude)
+        super(CoordinateValue, self).save(*args, **kwargs)
+
+    def to_string(self, lang=settings.LANGUAGE_CODE):
         if self.height_m is None:
             return '{} lat, {} lon with {} m precision on {}'.format(
-                self.latitude, self.longitude, self.precision_m, str(self.globe)
+                self.latitude, self.longitude, self.precision_m, self.globe.get_label(lang)
             )
         return '{} lat, {} lon at {} m height with {} m precision on {}'.format(
-            self.latitude, self.longitude, self.height_m, self.precision_m, str(self.globe)
+            self.latitude, self.longitude, self.height_m, self.precision_m, self.globe.get_label(lang)
         )
 
+    @instrumentation.instrumented('CoordinateValue.__str__')
+    def __str__(self):
+        return self.to_string()
+
+
+class ReferenceQuerySet(models.QuerySet):
+
+    def attach(self, pairs, batch_size=1000):
+        """ Links References to Statements in bulk. See knowledgebase.references.attach().
+        """
+        return references.attach(pairs, batch_size=batch_size)
+
 
 @python_2_unicode_compatible
 class Reference(models.Model):
     statements = models.ManyToManyField(Statement, related_name='references')
     url = models.URLField(unique=True, max_length=250, null=True, blank=True)
-    description = models.CharField(max_length=250, null=True, blank=True)
+    description = models.CharField(max_length=250, null=True, blank=True, db_index=True)
+
+    objects = ReferenceQuerySet.as_manager()
 
+    def save(self, *args, **kwargs):
+        self.url = references.normalize_url(self.url)
+        super(Reference, self).save(*args, **kwargs)
+
+    @instrumentation.instrumented('Reference.__str__')
     def __str__(self):
         if self.url:
             return self.url
         if self.description:
             return self.description
         return ''
+
+
+class ConceptClosure(models.Model):
+    """ Pair of Concepts connected through Statements with transitive
+    predicate. Maintained by knowledgebase.closure.
+    """
+    pred = models.ForeignKey(Concept, related_name='+', on_delete=models.CASCADE)
+    descendant = models.ForeignKey(Concept, related_name='closure_ancestors', on_delete=models.CASCADE)
+    ancestor = models.ForeignKey(Concept, related_name='closure_descendants', on_delete=models.CASCADE)
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ['pred', 'descendant', 'ancestor']
+        index_together = ['pred', 'ancestor', 'depth']
+
+
+class SearchToken(models.Model):
+    """ Normalized word of a Translation or Concept description.
+    Maintained by knowledgebase.search.
+    """
+    SOURCE_CHOICES = [
+        (search.SOURCE_TRANSLATION, _('translation')),
+        (search.SOURCE_DESCRIPTION, _('description')),
+    ]
+
+    concept = models.ForeignKey(Concept, related_name='search_tokens', on_delete=models.CASCADE)
+    translation = models.ForeignKey(Translation, related_name='search_tokens', on_delete=models.CASCADE, null=True, blank=True)
+    source = models.CharField(max_length=1, choices=SOURCE_CHOICES)
+    lang = models.CharField(max_length=15, null=True, blank=True)
+    token = models.CharField(max_length=250, db_index=True)
+    text = models.CharField(max_length=250)
+    length = models.PositiveSmallIntegerField()
+
+
+class StatementView(models.Model):
+    """ Flattened Statement with labels in one language.
+    Maintained by knowledgebase.readmodel.
+    """
+    KIND_NONE = 'none'
+    KIND_CONCEPT = 'concept'
+    KIND_STRING = 'string'
+    KIND_QUANTITY = 'quantity'
+    KIND_TIME = 'time'
+    KIND_COORDINATE = 'coordinate'
+    KIND_CHOICES = [
+        (KIND_NONE, _('no value')),
+        (KIND_CONCEPT, _('concept')),
+        (KIND_STRING, _('string')),
+        (KIND_QUANTITY, _('quantity')),
+        (KIND_TIME, _('time')),
+        (KIND_COORDINATE, _('coordinate')),
+    ]
+
+    statement = models.ForeignKey(Statement, related_name='views', on_delete=models.CASCADE)
+    lang = models.CharField(max_length=15)
+
+    concept = models.ForeignKey(Concept, related_name='+', on_delete=models.CASCADE, null=True)
+    parent = models.ForeignKey(Statement, related_name='+', on_delete=models.CASCADE, null=True)
+    pred = models.ForeignKey(Concept, related_name='+', on_delete=models.CASCADE)
+    value_kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    value = models.ForeignKey(Concept, related_name='+', on_delete=models.CASCADE, null=True)
+    string_value = models.TextField(null=True)
+    quantity_value = models.DecimalField(max_digits=30, decimal_places=12, null=True)
+    quantity_unit = models.ForeignKey(Concept, related_name='+', on_delete=models.CASCADE, null=True)
+    quantity_normalized_value = models.FloatField(null=True)
+    time_earliest = models.BigIntegerField(null=True)
+    time_latest = models.BigIntegerField(null=True)
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+    globe = models.ForeignKey(Concept, related_name='+', on_delete=models.CASCADE, null=True)
+
+    concept_label = models.TextField(null=True)
+    pred_label = models.TextField(null=True)
+    value_label = models.TextField()
+
+    class Meta:
+        unique_together = ['statement', 'lang']
+        index_together = [
+            ['concept', 'lang'],
+            ['pred', 'lang'],
+            ['value', 'lang'],
+        ]
+
+
+@receiver(post_save, sender=Translation)
+@receiver(post_delete, sender=Translation)
+def invalidate_translation_cache(sender, instance, **kwargs):
+    labels.invalidate([instance.concept_id])
+
+
+@receiver(post_save, sender=Translation)
+@receiver(post_delete, sender=Translation)
+def update_concept_label(sender, instance, raw=False, **kwargs):
+    # Delayed, so that Concepts being deleted are gone by then
+    if not raw:
+        concept_id = instance.concept_id
+        transaction.on_commit(lambda: labels.update_concept_labels([concept_id]))
+
+
+@receiver(post_save, sender=Translation)
+def update_translation_search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_translation(instance)
+
+
+@receiver(post_save, sender=Concept)
+def update_description_search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_description(instance)
+
+
+@receiver(post_delete, sender=Concept)
+def invalidate_concept_translation_cache(sender, instance, **kwargs):
+    labels.invalidate([instance.id])
+
+
+@receiver(pre_save, sender=Statement)
+def remember_closure_edge(sender, instance, **kwargs):
+    instance._old_closure_edge = None
+    if instance.pk is not None and closure.get_transitive_predicates():
+        old = Statement.objects.filter(pk=instance.pk).first()
+        if old is not None:
+            instance._old_closure_edge = closure.get_edge(old)
+
+
+@receiver(post_save, sender=Statement)
+def update_closure_on_save(sender, instance, **kwargs):
+    old_edge = getattr(instance, '_old_closure_edge', None)
+    new_edge = closure.get_edge(instance)
+    if old_edge == new_edge:
+        return
+    if old_edge:
+        closure.remove_edge(*old_edge)
+    if new_edge:
+        closure.add_edge(*new_edge)
+
+
+@receiver(post_delete, sender=Statement)
+def update_closure_on_delete(sender, instance, **kwargs):
+    edge = closure.get_edge(instance)
+    if edge:
+        closure.remove_edge(*edge)
+
+
+@receiver(post_save, sender=Statement)
+def refresh_statement_view(sender, instance, raw=False, **kwargs):
+    if not raw and readmodel.is_enabled():
+        statement_id = instance.id
+        transaction.on_commit(lambda: readmodel.refresh([statement_id]))
+
+
+@receiver(post_save, sender=StringValue)
+@receiver(post_save, sender=QuantityValue)
+@receiver(post_save, sender=TimeValue)
+@receiver(post_save, sender=CoordinateValue)
+@receiver(post_delete, sender=StringValue)
+@receiver(post_delete, sender=QuantityValue)
+@receiver(post_delete, sender=TimeValue)
+@receiver(post_delete, sender=CoordinateValue)
+def touch_value_statement(sender, instance, raw=False, **kwargs):
+    # Value changes count as Statement changes for exports and ETags
+    if not raw:
+        Statement.objects.filter(id=instance.statement_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=StringValue)
+@receiver(post_save, sender=QuantityValue)
+@receiver(post_save, sender=TimeValue)
+@receiver(post_save, sender=CoordinateValue)
+@receiver(post_delete, sender=StringValue)
+@receiver(post_delete, sender=QuantityValue)
+@receiver(post_delete, sender=TimeValue)
+@receiver(post_delete, sender=CoordinateValue)
+def refresh_value_statement_view(sender, instance, raw=False, **kwargs):
+    # Refreshing is delayed, so that Statements being deleted are gone by then
+    if not raw and readmodel.is_enabled():
+        statement_id = instance.statement_id
+        transaction.on_commit(lambda: readmodel.refresh([statement_id]))
+
+
+@receiver(post_save, sender=Translation)
+@receiver(post_delete, sender=Translation)
+def update_statement_view_labels(sender, instance, raw=False, **kwargs):
+    if not raw and readmodel.is_enabled():
+        concept_id = instance.concept_id
+        transaction.on_commit(lambda: readmodel.update_labels(concept_id))
+
+
+@receiver(post_save, sender=Concept)
+def update_statement_view_description_labels(sender, instance, raw=False, created=False, **kwargs):
+    if not raw and not created and readmodel.is_enabled():
+        concept_id = instance.id
+        transaction.on_commit(lambda: readmodel.update_labels(concept_id))
+
+
+def _get_root_concept_ids(statement_ids):
+    """ Returns IDs of Concepts that own given Statements or their parents.
+    """
+    rows = Statement.objects.filter(id__in=statement_ids).values_list('concept_id', 'statement__concept_id')
+    return set(concept_id or parent_concept_id for concept_id, parent_concept_id in rows)
+
+
+@receiver(post_save, sender=Concept)
+@receiver(post_delete, sender=Concept)
+def invalidate_concept_document(sender, instance, **kwargs):
+    documents.invalidate_on_commit([instance.id])
+
+
+@receiver(post_save, sender=Translation)
+@receiver(post_delete, sender=Translation)
+def invalidate_translation_document(sender, instance, **kwargs):
+    documents.invalidate_on_commit([instance.concept_id])
+
+
+@receiver(post_save, sender=Statement)
+@receiver(post_delete, sender=Statement)
+def invalidate_statement_document(sender, instance, **kwargs):
+    if instance.concept_id is not None:
+        documents.invalidate_on_commit([instance.concept_id])
+    else:
+        documents.invalidate_on_commit(_get_root_concept_ids([instance.statement_id]))
+
+
+@receiver(post_save, sender=StringValue)
+@receiver(post_save, sender=QuantityValue)
+@receiver(post_save, sender=TimeValue)
+@receiver(post_save, sender=CoordinateValue)
+@receiver(post_delete, sender=StringValue)
+@receiver(post_delete, sender=QuantityValue)
+@receiver(post_delete, sender=TimeValue)
+@receiver(post_delete, sender=CoordinateValue)
+def invalidate_value_document(sender, instance, **kwargs):
+    documents.invalidate_on_commit(_get_root_concept_ids([instance.statement_id]))
+
+
+@receiver(post_save, sender=Reference)
+@receiver(pre_delete, sender=Reference)
+def invalidate_reference_document(sender, instance, **kwargs):
+    documents.invalidate_on_commit(_get_root_concept_ids(instance.statements.values_list('id', flat=True)))
+
+
+@receiver(m2m_changed, sender=Reference.statements.through)
+def invalidate_reference_link_document(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if isinstance(instance, Statement):
+        statement_ids = [instance.id]
+    elif action == 'pre_clear':
+        statement_ids = list(instance.statements.values_list('id', flat=True))
+    else:
+        statement_ids = pk_set or []
+    documents.invalidate_on_commit(_get_root_concept_ids(statement_ids))
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+""" Paginator for tables that are too large to count.
+
+COUNT(*) of a whole table reads every row on most databases. For
+unfiltered querysets the row count estimate kept by the database is used
+instead, if it is at least KNOWLEDGEBASE_ESTIMATED_COUNT_THRESHOLD rows.
+Estimates come from PostgreSQL and MySQL statistics and from sqlite_stat1
+after ANALYZE. Last pages may be empty or missing when the estimate is off.
+"""
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+def get_threshold():
+    return getattr(settings, 'KNOWLEDGEBASE_ESTIMATED_COUNT_THRESHOLD', 100000)
+
+
+def estimate_count(model, using='default'):
+    """ Returns estimated number of rows in the table of "model",
+    or None if the database has no estimate.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [connection.ops.quote_name(table)])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    # PostgreSQL uses -1 for tables that have not been analyzed
+    estimate = int(float(str(row[0]).split()[0]))
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """ Counts unfiltered querysets of large tables with estimate_count()
+    and everything else exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where and queryset.query.can_filter():
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= get_threshold():
+                return estimate
+        return super(EstimatedCountPaginator, self).count
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+""" Pytest fixtures. Enable with pytest_plugins = ['knowledgebase.pytest_plugin']
+in conftest.py.
+"""
+from __future__ import unicode_literals
+
+import pytest
+
+from knowledgebase import testing
+
+
+@pytest.fixture
+def query_budget():
+    """ Returns knowledgebase.testing.query_budget:
+
+        def test_render(query_budget):
+            with query_budget(4):
+                admin.show_statements(concept)
+    """
+    return testing.query_budget
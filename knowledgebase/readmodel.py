@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+""" Flattened read model of Statements.
+
+When KNOWLEDGEBASE_STATEMENT_VIEW_LANGUAGES setting lists languages,
+every Statement has one StatementView row per language, holding its
+Concepts, typed value columns and rendered labels. Rows are refreshed
+when Statements, values or Translations change. Bulk operations that
+bypass signals must be followed by rebuild().
+"""
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import transaction
+
+from knowledgebase import labels
+
+
+def get_languages():
+    return list(getattr(settings, 'KNOWLEDGEBASE_STATEMENT_VIEW_LANGUAGES', []))
+
+
+def is_enabled():
+    return bool(get_languages())
+
+
+def _create_views(statement, langs):
+    from knowledgebase.models import (
+        StatementView, Concept, StringValue, QuantityValue, TimeValue, CoordinateValue,
+    )
+
+    fields = {
+        'statement_id': statement.id,
+        'concept_id': statement.concept_id,
+        'parent_id': statement.statement_id,
+        'pred_id': statement.pred_id,
+        'value_id': statement.value_id,
+    }
+    value = statement.get_value()
+    if value is None:
+        fields['value_kind'] = StatementView.KIND_NONE
+    elif isinstance(value, Concept):
+        fields['value_kind'] = StatementView.KIND_CONCEPT
+    elif isinstance(value, StringValue):
+        fields['value_kind'] = StatementView.KIND_STRING
+        fields['string_value'] = value.value
+    elif isinstance(value, QuantityValue):
+        fields['value_kind'] = StatementView.KIND_QUANTITY
+        fields['quantity_value'] = value.value
+        fields['quantity_unit_id'] = value.unit_id
+        fields['quantity_normalized_value'] = value.normalized_value
+    elif isinstance(value, TimeValue):
+        fields['value_kind'] = StatementView.KIND_TIME
+        fields['time_earliest'] = value.earliest
+        fields['time_latest'] = value.latest
+    elif isinstance(value, CoordinateValue):
+        fields['value_kind'] = StatementView.KIND_COORDINATE
+        fields['latitude'] = value.latitude
+        fields['longitude'] = value.longitude
+        fields['globe_id'] = value.globe_id
+
+    views = []
+    for lang in langs:
+        views.append(StatementView(
+            lang=lang,
+            concept_label=statement.concept.get_label(lang) if statement.concept_id else None,
+            pred_label=statement.pred.get_label(lang),
+            value_label=statement.get_value_as_string(lang),
+            **fields
+        ))
+    return views
+
+
+def refresh(statement_ids):
+    """ Recreates view rows of given Statements.
+    """
+    from knowledgebase.models import Statement, StatementView, _get_label_concept_ids
+
+    langs = get_languages()
+    if not langs:
+        return
+    statement_ids = list(statement_ids)
+    with transaction.atomic():
+        StatementView.objects.filter(statement_id__in=statement_ids).delete()
+        statements = list(Statement.objects.filter(id__in=statement_ids)._select_values())
+
+        # Label cache is per process, so labels are reloaded to
+        # avoid storing labels that other processes have changed.
+        concept_ids = _get_label_concept_ids(statements)
+        labels.invalidate(concept_ids)
+        labels.prefetch(concept_ids)
+        views = []
+        for statement in statements:
+            views += _create_views(statement, langs)
+        StatementView.objects.bulk_create(views)
+
+
+def update_labels(concept_id):
+    """ Updates labels of view rows that show given Concept.
+    """
+    from knowledgebase.models import Concept, StatementView
+
+    langs = get_languages()
+    if not langs:
+        return
+    labels.invalidate([concept_id])
+    with transaction.atomic():
+        for lang in langs:
+            label = labels.get_translations([concept_id], lang)[concept_id]
+            if not label:
+                label = Concept.objects.filter(id=concept_id).values_list('description', flat=True).first()
+            views = StatementView.objects.filter(lang=lang)
+            views.filter(concept_id=concept_id).update(concept_label=label)
+            views.filter(pred_id=concept_id).update(pred_label=label)
+            views.filter(value_id=concept_id).update(value_label=label)
+
+        # Units and globes are part of longer value labels
+        statement_ids = set(StatementView.objects.filter(quantity_unit_id=concept_id).values_list('statement_id', flat=True))
+        statement_ids.update(StatementView.objects.filter(globe_id=concept_id).values_list('statement_id', flat=True))
+        statement_ids = sorted(statement_ids)
+        for start in range(0, len(statement_ids), 1000):
+            refresh(statement_ids[start:start + 1000])
+
+
+def rebuild(chunk_size=1000):
+    """ Recreates all view rows.
+    """
+    from knowledgebase.models import Statement, StatementView
+
+    StatementView.objects.all().delete()
+    if not is_enabled():
+        return
+    last_id = 0
+    while True:
+        statement_ids = list(Statement.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not statement_ids:
+            return
+        refresh(statement_ids)
+        last_id = statement_ids[-1]
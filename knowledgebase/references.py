@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+""" Bulk linking and deduplication of References.
+
+References are identified by normalized URL, or by description if they
+have no URL. Links are written with bulk inserts that ignore existing
+rows, so m2m_changed signals are not sent. Documents of affected
+Concepts are invalidated explicitly instead.
+"""
+from __future__ import unicode_literals
+
+from urllib.parse import urlsplit, urlunsplit
+
+from django.db import transaction
+from django.db.models import Count, Min
+
+from knowledgebase import documents
+
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """ Lowercases scheme and host, drops default port and fragment,
+    and uses "/" as empty path. Returns None for empty URL.
+    """
+    if url is None:
+        return None
+    url = url.strip()
+    if not url:
+        return None
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc
+    if parts.hostname:
+        host = parts.hostname
+        if ':' in host:
+            host = '[{}]'.format(host)
+        try:
+            port = parts.port
+        except ValueError:
+            port = None
+        if port is not None and port != DEFAULT_PORTS.get(scheme):
+            host = '{}:{}'.format(host, port)
+        userinfo = netloc.rpartition('@')[0]
+        netloc = '{}@{}'.format(userinfo, host) if userinfo else host
+    path = parts.path
+    if not path and netloc:
+        path = '/'
+    return urlunsplit((scheme, netloc, path, parts.query, ''))
+
+
+def _parse_reference(reference):
+    """ Returns (normalized URL, description) of a URL string or a dict.
+    """
+    if isinstance(reference, dict):
+        return normalize_url(reference.get('url')), reference.get('description') or None
+    return normalize_url(reference), None
+
+
+def _invalidate_documents(statement_ids):
+    from knowledgebase.models import _get_root_concept_ids
+
+    statement_ids = list(statement_ids)
+    for start in range(0, len(statement_ids), 1000):
+        documents.invalidate_on_commit(_get_root_concept_ids(statement_ids[start:start + 1000]))
+
+
+def attach(pairs, batch_size=1000):
+    """ Links (Statement or ID, reference) pairs, where reference is a URL
+    or a dict with "url" and "description". Missing References are created
+    and existing links are kept. "batch_size" limits lookups by URL.
+    Returns number of distinct links given.
+    """
+    from knowledgebase.models import Reference
+
+    links = set()
+    for statement, reference in pairs:
+        url, description = _parse_reference(reference)
+        if url or description:
+            links.add((getattr(statement, 'id', statement), url, description))
+    if not links:
+        return 0
+
+    # Any given description of a URL is used for new References
+    new_by_url = {}
+    descriptions = set()
+    for statement_id, url, description in links:
+        if url:
+            if new_by_url.get(url) is None:
+                new_by_url[url] = description
+        else:
+            descriptions.add(description)
+
+    urls = sorted(new_by_url)
+    Reference.objects.bulk_create(
+        [Reference(url=url, description=new_by_url[url]) for url in urls],
+        ignore_conflicts=True,
+    )
+    by_url = {}
+    for start in range(0, len(urls), batch_size):
+        by_url.update(Reference.objects.filter(url__in=urls[start:start + batch_size]).values_list('url', 'id'))
+
+    by_description = {}
+    if descriptions:
+        existing = Reference.objects.filter(url=None, description__in=descriptions).order_by('-id')
+        by_description.update(existing.values_list('description', 'id'))
+        missing = sorted(descriptions - set(by_description))
+        if missing:
+            Reference.objects.bulk_create([Reference(description=description) for description in missing])
+            existing = Reference.objects.filter(url=None, description__in=missing).order_by('-id')
+            by_description.update(existing.values_list('description', 'id'))
+
+    Through = Reference.statements.through
+    rows = set()
+    for statement_id, url, description in links:
+        rows.add((by_url[url] if url else by_description[description], statement_id))
+    Through.objects.bulk_create(
+        [Through(reference_id=reference_id, statement_id=statement_id) for reference_id, statement_id in sorted(rows)],
+        ignore_conflicts=True,
+    )
+    _invalidate_documents(set(statement_id for reference_id, statement_id in rows))
+    return len(rows)
+
+
+def merge(reference_ids, target_id, batch_size=1000):
+    """ Moves links of References to the target Reference and deletes them.
+    Returns number of links moved.
+    """
+    from knowledgebase.models import Reference
+
+    Through = Reference.statements.through
+    reference_ids = [reference_id for reference_id in reference_ids if reference_id != target_id]
+    moved = 0
+    last_id = 0
+    while True:
+        rows = list(Through.objects.filter(
+            reference_id__in=reference_ids, id__gt=last_id,
+        ).order_by('id').values_list('id', 'statement_id')[:batch_size])
+        if not rows:
+            break
+        Through.objects.bulk_create(
+            [Through(reference_id=target_id, statement_id=statement_id) for row_id, statement_id in rows],
+            ignore_conflicts=True,
+        )
+        moved += len(rows)
+        last_id = rows[-1][0]
+    Through.objects.filter(reference_id__in=reference_ids).delete()
+    Reference.objects.filter(id__in=reference_ids).delete()
+    return moved
+
+
+def deduplicate(chunk_size=1000, dry_run=False):
+    """ Normalizes URLs of all References and merges References with the
+    same URL, or with the same description and no URL. Each chunk is
+    committed separately. Returns dict of "normalized", "merged" and
+    "links" counts.
+    """
+    from knowledgebase.models import Reference
+
+    Through = Reference.statements.through
+    result = {'normalized': 0, 'merged': 0, 'links': 0}
+
+    last_id = 0
+    while True:
+        chunk = list(Reference.objects.filter(id__gt=last_id).exclude(url=None).order_by('id').values_list('id', 'url')[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        changed = [(reference_id, url, normalize_url(url)) for reference_id, url in chunk]
+        changed = [(reference_id, url, normalized) for reference_id, url, normalized in changed if normalized != url]
+        if not changed:
+            continue
+        with transaction.atomic():
+            changed_ids = [reference_id for reference_id, url, normalized in changed]
+            statement_ids = set(Through.objects.filter(reference_id__in=changed_ids).values_list('statement_id', flat=True))
+            existing = dict(Reference.objects.filter(url__in=[normalized for reference_id, url, normalized in changed]).values_list('url', 'id'))
+            for reference_id, url, normalized in changed:
+                target_id = existing.get(normalized)
+                if target_id is None:
+                    result['normalized'] += 1
+                    if not dry_run:
+                        Reference.objects.filter(id=reference_id).update(url=normalized)
+                    existing[normalized] = reference_id
+                else:
+                    result['merged'] += 1
+                    if dry_run:
+                        result['links'] += Through.objects.filter(reference_id=reference_id).count()
+                    else:
+                        result['links'] += merge([reference_id], target_id, chunk_size)
+            if not dry_run:
+                _invalidate_documents(statement_ids)
+
+    duplicates = Reference.objects.filter(url=None).exclude(description=None).values('description').annotate(
+        count=Count('id'), target_id=Min('id'),
+    ).filter(count__gt=1).order_by('description')
+    last_description = None
+    while True:
+        groups = duplicates
+        if last_description is not None:
+            groups = groups.filter(description__gt=last_description)
+        groups = list(groups[:chunk_size])
+        if not groups:
+            break
+        last_description = groups[-1]['description']
+        with transaction.atomic():
+            statement_ids = set()
+            for group in groups:
+                reference_ids = list(Reference.objects.filter(
+                    url=None, description=group['description'],
+                ).exclude(id=group['target_id']).values_list('id', flat=True))
+                result['merged'] += len(reference_ids)
+                if dry_run:
+                    result['links'] += Through.objects.filter(reference_id__in=reference_ids).count()
+                else:
+                    statement_ids.update(Through.objects.filter(reference_id__in=reference_ids).values_list('statement_id', flat=True))
+                    result['links'] += merge(reference_ids, group['target_id'], chunk_size)
+            if not dry_run:
+                _invalidate_documents(statement_ids)
+    return result
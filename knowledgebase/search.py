@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+""" Prefix search over Translations and Concept descriptions.
+
+Every word of an indexed text is stored normalized (lower case, without
+accents) as a SearchToken row. Searching scans the index range of the
+longest query word and ranks the candidates in Python, so it works the same
+way on every database backend. Index is maintained when Translations and
+Concepts are saved. Bulk operations that bypass signals must be followed
+by rebuild().
+"""
+from __future__ import unicode_literals
+
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+SOURCE_TRANSLATION = 't'
+SOURCE_DESCRIPTION = 'd'
+
+# How many candidates are fetched per requested result
+CANDIDATES_PER_RESULT = 20
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def prefix_end(prefix):
+    """ Returns the smallest string that sorts after every string starting
+    with "prefix" by code points, or None if there is no such string.
+    Incrementing the last character does not depend on collation the
+    way a sentinel character such as U+FFFF does.
+    """
+    while prefix:
+        code = ord(prefix[-1]) + 1
+        if 0xD800 <= code <= 0xDFFF:
+            # Surrogates can not be stored
+            code = 0xE000
+        if code <= 0x10FFFF:
+            return prefix[:-1] + chr(code)
+        prefix = prefix[:-1]
+    return None
+
+
+def prefix_range(field, prefix):
+    """ Returns Q object that matches values of "field" starting with
+    "prefix" as a range, so that an index of the field can be used.
+    """
+    condition = Q(**{'{}__gte'.format(field): prefix})
+    end = prefix_end(prefix)
+    if end is not None:
+        condition &= Q(**{'{}__lt'.format(field): end})
+    return condition
+
+
+def _create_tokens(concept_id, text, lang, source, translation_id=None):
+    from knowledgebase.models import SearchToken
+
+    text = text[:250]
+    return [
+        SearchToken(
+            concept_id=concept_id, translation_id=translation_id, lang=lang,
+            source=source, token=token[:250], text=text, length=len(text),
+        )
+        for token in set(tokenize(text))
+    ]
+
+
+def index_translation(translation):
+    from knowledgebase.models import SearchToken
+
+    with transaction.atomic():
+        SearchToken.objects.filter(translation=translation).delete()
+        SearchToken.objects.bulk_create(_create_tokens(
+            translation.concept_id, translation.translation, translation.lang,
+            SOURCE_TRANSLATION, translation.id,
+        ))
+
+
+def index_description(concept):
+    from knowledgebase.models import SearchToken
+
+    with transaction.atomic():
+        SearchToken.objects.filter(concept=concept, source=SOURCE_DESCRIPTION).delete()
+        if concept.description:
+            SearchToken.objects.bulk_create(_create_tokens(concept.id, concept.description, None, SOURCE_DESCRIPTION))
+
+
+def rebuild(chunk_size=1000):
+    """ Recreates the whole search index.
+    """
+    from knowledgebase.models import Concept, SearchToken, Translation
+
+    SearchToken.objects.all().delete()
+    last_id = 0
+    while True:
+        translations = list(Translation.objects.filter(id__gt=last_id).order_by('id')[:chunk_size])
+        if not translations:
+            break
+        tokens = []
+        for translation in translations:
+            tokens += _create_tokens(
+                translation.concept_id, translation.translation, translation.lang,
+                SOURCE_TRANSLATION, translation.id,
+            )
+        SearchToken.objects.bulk_create(tokens)
+        last_id = translations[-1].id
+    last_id = 0
+    while True:
+        concepts = list(Concept.objects.filter(id__gt=last_id, description__isnull=False).order_by('id')[:chunk_size])
+        if not concepts:
+            break
+        tokens = []
+        for concept in concepts:
+            if concept.description:
+                tokens += _create_tokens(concept.id, concept.description, None, SOURCE_DESCRIPTION)
+        SearchToken.objects.bulk_create(tokens)
+        last_id = concepts[-1].id
+
+
+def prefix_filter(q, field, token_field='concept_id', include_descriptions=True):
+    """ Returns Q object that matches rows whose "field" is in "token_field"
+    of SearchTokens starting with every word of "q", or None if "q" has no
+    words. Each word is one index range subquery, so the filter stays fast
+    on large tables. Unlike search(), words may match different texts.
+    """
+    from knowledgebase.models import SearchToken
+
+    terms = tokenize(q)
+    if not terms:
+        return None
+    result = Q()
+    for term in sorted(set(terms)):
+        tokens = SearchToken.objects.filter(prefix_range('token', term))
+        if not include_descriptions:
+            tokens = tokens.filter(source=SOURCE_TRANSLATION)
+        result &= Q(**{'{}__in'.format(field): tokens.values(token_field)})
+    return result
+
+
+def search(q, lang=None, limit=10, include_descriptions=False, queryset=None):
+    """ Returns list of Concepts matching all words of "q" as prefixes,
+    best matches first. Each Concept gets "search_label" attribute with the
+    text that matched. Whole label matches are ranked before prefix matches,
+    and matches in "lang" before other languages. If Concept "queryset" is
+    given, then only Concepts in it are returned.
+    """
+    from knowledgebase.models import Concept, SearchToken
+
+    if queryset is None:
+        queryset = Concept.objects.all()
+    terms = tokenize(q)
+    if not terms:
+        return []
+    normalized_q = ' '.join(terms)
+    longest = max(terms, key=len)
+
+    candidates = SearchToken.objects.filter(prefix_range('token', longest))
+    if not include_descriptions:
+        candidates = candidates.filter(source=SOURCE_TRANSLATION)
+    if queryset.query.where:
+        candidates = candidates.filter(concept_id__in=queryset.values('id'))
+    candidates = candidates.annotate(
+        token_miss=Case(When(token=longest, then=Value(0)), default=Value(1), output_field=IntegerField()),
+        lang_miss=Case(When(lang=lang, then=Value(0)), default=Value(1), output_field=IntegerField()),
+    ).order_by('token_miss', 'lang_miss', 'length')
+    candidates = candidates.values_list('concept_id', 'text', 'lang', 'source')[:limit * CANDIDATES_PER_RESULT]
+
+    best = {}
+    for concept_id, text, text_lang, source in candidates:
+        text_tokens = tokenize(text)
+        if not all(any(token.startswith(term) for token in text_tokens) for term in terms):
+            continue
+        normalized_text = ' '.join(text_tokens)
+        if normalized_text == normalized_q:
+            match = 0
+        elif normalized_text.startswith(normalized_q):
+            match = 1
+        else:
+            match = 2
+        rank = (match, text_lang != lang, source != SOURCE_TRANSLATION, len(text))
+        if concept_id not in best or rank < best[concept_id][0]:
+            best[concept_id] = (rank, text)
+
+    ranked = sorted(best.items(), key=lambda item: item[1][0])[:limit]
+    concepts = queryset.in_bulk([concept_id for concept_id, match in ranked])
+    result = []
+    for concept_id, (rank, text) in ranked:
+        concept = concepts.get(concept_id)
+        if concept is not None:
+            concept.search_label = text
+            result.append(concept)
+    return result
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+""" Helpers for tests of projects using knowledgebase.
+"""
+from __future__ import unicode_literals
+
+import contextlib
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+from knowledgebase import instrumentation
+
+
+@contextlib.contextmanager
+def query_budget(max_queries, using=DEFAULT_DB_ALIAS):
+    """ Fails with AssertionError if the block runs more than
+    "max_queries" queries. Instrumentation is enabled inside the block,
+    and the call sites that ran queries are listed in the message.
+    """
+    before = instrumentation.get_stats()
+    with instrumentation.collecting(), CaptureQueriesContext(connections[using]) as context:
+        yield context
+    if len(context) <= max_queries:
+        return
+
+    lines = ['{} queries executed, budget was {}'.format(len(context), max_queries)]
+    after = instrumentation.get_stats()
+    for name, stats in sorted(after.items()):
+        queries = stats['queries'] - before.get(name, {}).get('queries', 0)
+        if queries:
+            lines.append('  {}: {} queries'.format(name, queries))
+    for index, query in enumerate(context.captured_queries, start=1):
+        lines.append('{}. {}'.format(index, query['sql']))
+    raise AssertionError('\n'.join(lines))
@@ -0,0 +1,713 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import asyncio
+import datetime
+import importlib
+import io
+import itertools
+import json
+import sqlite3
+from unittest import mock, skipIf
+
+from django.apps import apps
+from django.contrib import admin
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import connection, connections, transaction
+from django.db.models import ProtectedError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from knowledgebase import aio, closure, concepts, documents, exporter, importer, labels, readmodel, references, search, timekeys
+from knowledgebase.models import Concept, ConceptLabel, Translation, SearchToken, Statement, StatementView, StringValue, QuantityValue, TimeValue, CoordinateValue, Reference
+from knowledgebase.testing import query_budget
+
+try:
+    from benchmarks import generator
+except ImportError:
+    # Benchmarks are not installed with the app
+    generator = None
+
+
+def create_graph():
+    """ Creates a Concept with a Statement of every value type, a qualifier
+    for each and a Reference. Returns the Concept.
+    """
+    def concept(en, fi=None):
+        result = Concept.objects.create()
+        Translation.objects.create(concept=result, lang='en', translation=en)
+        if fi:
+            Translation.objects.create(concept=result, lang='fi', translation=fi)
+        return result
+
+    helsinki = concept('Helsinki', 'Helsinki')
+    country = concept('country', 'maa')
+    finland = concept('Finland', 'Suomi')
+    name = concept('name')
+    area = concept('area')
+    founded = concept('founded')
+    location = concept('location')
+    source = concept('source')
+    square_km = concept('km²')
+    earth = concept('Earth', 'Maa')
+
+    statements = [Statement.objects.create(concept=helsinki, pred=country, value=finland)]
+    statement = Statement.objects.create(concept=helsinki, pred=name)
+    StringValue.objects.create(statement=statement, value='Helsingfors')
+    statements.append(statement)
+    statement = Statement.objects.create(concept=helsinki, pred=area)
+    QuantityValue.objects.create(statement=statement, value=715, unit=square_km)
+    statements.append(statement)
+    statement = Statement.objects.create(concept=helsinki, pred=founded)
+    TimeValue.objects.create(statement=statement, value=datetime.datetime(1550, 6, 12, tzinfo=timezone.utc), precision=11)
+    statements.append(statement)
+    statement = Statement.objects.create(concept=helsinki, pred=location)
+    CoordinateValue.objects.create(statement=statement, latitude=60.17, longitude=24.94, globe=earth)
+    statements.append(statement)
+
+    for statement in statements:
+        qualifier = Statement.objects.create(statement=statement, pred=source, value=finland)
+        QuantityValue.objects.create(statement=Statement.objects.create(statement=statement, pred=area), value=1, unit=square_km)
+        Reference.objects.create(url='https://example.com/{}'.format(statement.id)).statements.add(statement, qualifier)
+    return helsinki
+
+
+def limit_sql_variables():
+    """ Lowers the bound variable limit of SQLite to the default of its
+    older versions, which large "__in" lists exceed.
+    """
+    if connection.vendor == 'sqlite':
+        connection.ensure_connection()
+        connection.connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+
+
+class LabelsTestCase(TestCase):
+
+    def test_many_concepts(self):
+        pred = Concept.objects.create()
+        Translation.objects.create(concept=pred, lang='en', translation='pred')
+        Concept.objects.bulk_create([Concept() for i in range(1200)])
+        concept_ids = list(Concept.objects.exclude(id=pred.id).values_list('id', flat=True))
+        Translation.objects.bulk_create([
+            Translation(concept_id=concept_id, lang='en', translation='c{}'.format(concept_id)) for concept_id in concept_ids
+        ])
+        Statement.objects.bulk_create([Statement(concept_id=concept_id, pred=pred) for concept_id in concept_ids])
+        labels.invalidate()
+        limit_sql_variables()
+        self.assertEqual(len(labels.get_translations(concept_ids)), 1200)
+        labels.invalidate()
+        with query_budget(1 + 3):
+            rendered = [str(statement) for statement in Statement.objects.with_values()]
+        self.assertEqual(len(rendered), 1200)
+        self.assertIn('c{}, pred, *NO VALUE*'.format(concept_ids[0]), rendered)
+
+
+@override_settings(KNOWLEDGEBASE_LABEL_LANGUAGES=['en', 'fi'])
+class ConceptLabelTestCase(TestCase):
+
+    def setUp(self):
+        self.finnish = Concept.objects.create()
+        Translation.objects.create(concept=self.finnish, lang='fi', case='genitive', translation='Helsingin')
+        Translation.objects.create(concept=self.finnish, lang='fi', translation='Helsinki')
+        self.english = Concept.objects.create()
+        Translation.objects.create(concept=self.english, lang='en', translation='Espoo')
+        self.unnamed = Concept.objects.create(description='No translations')
+        Translation.objects.create(concept=self.unnamed, lang='en', translation='')
+        # TestCase never commits, so signal handlers' on_commit callbacks don't run
+        labels.update_concept_labels([self.finnish.id, self.english.id, self.unnamed.id])
+
+    def labels(self, lang):
+        return dict(ConceptLabel.objects.filter(lang=lang).values_list('concept_id', 'label'))
+
+    def test_fallback(self):
+        # Nominative in the language, then the first translation
+        self.assertEqual(self.labels('fi'), {self.finnish.id: 'Helsinki', self.english.id: 'Espoo'})
+        self.assertEqual(self.labels('en'), {self.finnish.id: 'Helsingin', self.english.id: 'Espoo'})
+        Translation.objects.create(concept=self.finnish, lang='en', translation='Helsinki')
+        labels.update_concept_labels([self.finnish.id])
+        self.assertEqual(self.labels('en')[self.finnish.id], 'Helsinki')
+        Translation.objects.filter(concept=self.english).delete()
+        labels.update_concept_labels([self.english.id])
+        self.assertNotIn(self.english.id, self.labels('en'))
+
+    def test_with_labels(self):
+        labels.invalidate()
+        with self.assertNumQueries(1):
+            concepts = list(Concept.objects.order_by_label('fi'))
+            # Concepts without label fall back to Translations
+            rendered = [concept.get_translation('fi') for concept in concepts[:2]]
+        self.assertEqual(concepts, [self.english, self.finnish, self.unnamed])
+        self.assertEqual(rendered, ['Espoo', 'Helsinki'])
+        concept = Concept.objects.with_labels('fi').get(id=self.finnish.id)
+        self.assertEqual(concept.get_translation('fi', 'genitive'), 'Helsingin')
+        self.assertIsNone(concept.get_translation('fi', 'partitive', strict_case=True))
+        self.assertEqual(str(Concept.objects.with_labels().get(id=self.unnamed.id)), 'No translations')
+
+
+class ConceptAdminTestCase(TestCase):
+
+    def setUp(self):
+        self.concept = create_graph()
+        labels.invalidate()
+
+    def test_show_statements_queries(self):
+        concept_admin = admin.site._registry[Concept]
+        # Statements, qualifiers and labels of qualifiers with their parents
+        with self.assertNumQueries(3):
+            html = concept_admin.show_statements(self.concept)
+        self.assertIn('Helsingfors', html)
+        self.assertIn('715.000000000000 km²', html)
+
+    def test_statement_rendering_budget(self):
+        with query_budget(2):
+            rendered = [str(statement) for statement in Statement.objects.filter(concept=self.concept).with_values()]
+        self.assertIn('Helsinki, country, Finland', rendered)
+
+    def test_query_budget_failure(self):
+        with self.assertRaises(AssertionError) as context:
+            with query_budget(1):
+                for statement in Statement.objects.filter(concept=self.concept):
+                    str(statement)
+        self.assertIn('budget was 1', str(context.exception))
+        self.assertIn('Statement.__str__', str(context.exception))
+
+
+class StatementQuerySetTestCase(TestCase):
+
+    def setUp(self):
+        self.concept = create_graph()
+        labels.invalidate()
+
+    def test_with_values_queries(self):
+        # Statements with values and related Concepts, and labels of them
+        with self.assertNumQueries(2):
+            statements = list(Statement.objects.with_values().order_by('id'))
+            values = [statement.get_value() for statement in statements]
+            rendered = [str(statement) for statement in statements]
+        self.assertEqual(len(statements), 15)
+        self.assertEqual(
+            [type(value) for value in values[:5]],
+            [Concept, StringValue, QuantityValue, TimeValue, CoordinateValue],
+        )
+        labels.invalidate()
+        self.assertEqual(rendered, [str(statement) for statement in Statement.objects.order_by('id')])
+
+    def test_match(self):
+        country = Translation.objects.get(translation='country').concept
+        finland = Translation.objects.get(translation='Finland').concept
+        source = Translation.objects.get(translation='source').concept
+        self.assertEqual(list(Statement.objects.match(self.concept, country, finland)), list(Statement.objects.filter(
+            concept=self.concept, pred=country, value=finland,
+        )))
+        self.assertEqual(Statement.objects.match(subject=self.concept).count(), 5)
+        self.assertEqual(Statement.objects.match(value=finland.id).count(), 6)
+        self.assertEqual(Statement.objects.match(pred=[country, source]).count(), 6)
+        self.assertEqual(Statement.objects.match(subject=self.concept, value=Concept.objects.filter(id=finland.id)).count(), 1)
+        self.assertEqual(Statement.objects.match().count(), 15)
+
+    def test_match_uses_indexes(self):
+        if connection.vendor != 'sqlite':
+            return
+        for subject, pred, value in itertools.product([None, 1], repeat=3):
+            if subject is pred is value is None:
+                continue
+            sql, params = Statement.objects.match(subject, pred, value).query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = ' '.join(str(row) for row in cursor.fetchall())
+            self.assertIn('USING', plan, (subject, pred, value))
+            self.assertNotIn('SCAN', plan, (subject, pred, value))
+
+    def test_values_list_is_not_prefetched(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(len(Statement.objects.with_values().values_list('id', flat=True)), 15)
+
+
+class ReferenceAdminTestCase(TestCase):
+
+    def test_search(self):
+        http = Reference.objects.create(url='http://example.com/a')
+        https = Reference.objects.create(url='HTTPS://Example.com/b')
+        described = Reference.objects.create(description='Statistics Finland 2020')
+        reference_admin = admin.site._registry[Reference]
+
+        def search(text):
+            queryset, distinct = reference_admin.get_search_results(None, Reference.objects.all(), text)
+            return set(queryset)
+
+        self.assertEqual(search('example.com'), {http, https})
+        self.assertEqual(search('Example.com/b'), {https})
+        self.assertEqual(search('http://example.com'), {http})
+        self.assertEqual(search('Statistics Finland'), {described})
+        self.assertEqual(search('example.org'), set())
+        self.assertEqual(search('[foo'), set())
+        emoji = Reference.objects.create(description='Statistics\U0001f600')
+        self.assertEqual(search('Statistics'), {described, emoji})
+        self.assertEqual(search('http://[bad'), set())
+
+
+class ClosureTestCase(TestCase):
+
+    def test_remove_edge_with_many_descendants(self):
+        pred = Concept.objects.create()
+        root, middle = Concept.objects.create(), Concept.objects.create()
+        Concept.objects.bulk_create([Concept() for i in range(1200)])
+        children = Concept.objects.filter(id__gt=middle.id).values_list('id', flat=True)
+        Statement.objects.bulk_create([Statement(concept_id=child_id, pred=pred, value=middle) for child_id in children])
+        with override_settings(KNOWLEDGEBASE_TRANSITIVE_PREDICATES=[pred.id]):
+            closure.rebuild(pred.id)
+            edge = Statement.objects.create(concept=middle, pred=pred, value=root)
+            self.assertEqual(root.get_descendants(pred).count(), 1201)
+            limit_sql_variables()
+            edge.delete()
+            self.assertEqual(root.get_descendants(pred).count(), 0)
+            self.assertEqual(middle.get_descendants(pred).count(), 1200)
+
+
+class ImporterTestCase(TestCase):
+
+    def import_lines(self, records, **kwargs):
+        lines = io.StringIO('\n'.join(json.dumps(record) for record in records))
+        return importer.import_statements(importer.read_json_lines(lines), create_missing=True, **kwargs)
+
+    def test_invalid_records_are_skipped(self):
+        valid = {'concept': 'Helsinki', 'pred': 'population', 'value': {'type': 'quantity', 'value': '650000'}}
+        invalid = [
+            {'concept': 'Helsinki', 'pred': 'area', 'value': {'type': 'quantity', 'value': None}},
+            {'concept': 'Helsinki', 'pred': 'area', 'value': {'type': 'quantity', 'value': '1e40'}},
+            {'concept': 'Helsinki', 'pred': 'area', 'value': {'type': 'quantity', 'value': 'many'}},
+            {'concept': 'Helsinki', 'pred': 'founded', 'value': {'type': 'time', 'value': 1550}},
+            {'concept': 'Helsinki', 'pred': 'founded', 'value': {'type': 'time', 'year': '1550', 'precision': 20}},
+            {'concept': 'Helsinki', 'pred': 'name', 'value': {'type': 'string', 'value': ['Helsingfors']}},
+            {'concept': 'Helsinki', 'pred': 'location', 'value': {'type': 'coordinate', 'latitude': 91, 'longitude': 0, 'globe': 'Earth'}},
+            {'concept': 'Helsinki', 'pred': 'source', 'value': 'Finland', 'references': 'http://a.com'},
+            {'concept': 'Helsinki', 'pred': 'source', 'value': 'Finland', 'references': ['http://[bad']},
+            {'concept': {'id': 1}, 'pred': 'source', 'value': 'Finland'},
+            {'concept': 'Helsinki', 'pred': 'area', 'value': {'type': 'quantity', 'value': '1'},
+             'qualifiers': [{'pred': 'area', 'value': {'type': 'quantity', 'value': '1e40'}}]},
+        ]
+        result = self.import_lines([valid] + invalid + [valid], chunk_size=5)
+        self.assertEqual(result.statements, 2)
+        self.assertEqual(result.skipped, len(invalid))
+        self.assertEqual(sorted(line_number for line_number, reason in result.errors), list(range(2, len(invalid) + 2)))
+        self.assertEqual(Statement.objects.count(), 2)
+        self.assertFalse(Reference.objects.exists())
+
+    def test_references(self):
+        result = self.import_lines([{
+            'concept': 'Helsinki', 'pred': 'country', 'value': 'Finland',
+            'references': ['HTTP://Example.com', {'description': 'Statistics Finland'}],
+        }])
+        self.assertEqual(result.references, 2)
+        self.assertEqual(
+            set(Reference.objects.values_list('url', 'description')),
+            {('http://example.com/', None), (None, 'Statistics Finland')},
+        )
+
+
+@override_settings(KNOWLEDGEBASE_STATEMENT_VIEW_LANGUAGES=['en'])
+class ReadModelTestCase(TestCase):
+
+    def test_refresh_reloads_labels(self):
+        concept = create_graph()
+        statement = Statement.objects.get(concept=concept, pred__translations__translation='country')
+        labels.get_translations([statement.pred_id])
+        # Changed in another process, so the label cache of this one is not cleared
+        Translation.objects.filter(concept_id=statement.pred_id).update(translation='nation')
+        readmodel.refresh([statement.id])
+        self.assertEqual(StatementView.objects.get(statement=statement).pred_label, 'nation')
+
+
+class SearchTestCase(TestCase):
+
+    def setUp(self):
+        self.helsinki = create_graph()
+        self.hel = Concept.objects.create(description='Helsinki-Vantaa airport code')
+        Translation.objects.create(concept=self.hel, lang='en', translation='HEL')
+
+    def test_tokenize(self):
+        self.assertEqual(search.tokenize('Ääne-Äänekoski, Kärsämäki'), ['aane', 'aanekoski', 'karsamaki'])
+        self.assertEqual(search.tokenize(' - '), [])
+
+    def test_prefix_search(self):
+        self.assertEqual(Concept.objects.search('hel')[:2], [self.hel, self.helsinki])
+        self.assertEqual(Concept.objects.search('HELSINGFORS'), [])
+        self.assertEqual(Concept.objects.search('helsinki'), [self.helsinki])
+        self.assertEqual(Concept.objects.search('vantaa', include_descriptions=True), [self.hel])
+        self.assertEqual(Concept.objects.search(''), [])
+
+    def test_search_queryset(self):
+        self.assertEqual(Concept.objects.filter(id=-1).search('helsinki'), [])
+        self.assertEqual(Concept.objects.exclude(id=self.hel.id).search('hel'), [self.helsinki])
+
+    def test_prefix_end(self):
+        self.assertEqual(search.prefix_end('hel'), 'hem')
+        self.assertEqual(search.prefix_end('a\U0010ffff'), 'b')
+        self.assertEqual(search.prefix_end('\ud7ff'), '\ue000')
+        self.assertIsNone(search.prefix_end('\U0010ffff'))
+        self.assertIsNone(search.prefix_end(''))
+
+    def test_prefix_filter(self):
+        concepts = Concept.objects.filter(search.prefix_filter('hel air', 'id'))
+        self.assertEqual(list(concepts), [self.hel])
+
+    def test_migration_fills_tokens(self):
+        expected = set(SearchToken.objects.values_list('concept_id', 'translation_id', 'lang', 'source', 'token', 'text'))
+        SearchToken.objects.all().delete()
+        importlib.import_module('knowledgebase.migrations.0009_search_tokens').fill_tokens(apps, None)
+        self.assertEqual(
+            set(SearchToken.objects.values_list('concept_id', 'translation_id', 'lang', 'source', 'token', 'text')),
+            expected,
+        )
+
+
+class TimeKeysTestCase(TestCase):
+
+    def test_year_key(self):
+        self.assertEqual(timekeys.year_key(1970), 0)
+        self.assertEqual(timekeys.year_key(1), timekeys.datetime_key(datetime.datetime(1, 1, 1)))
+        # Year 0 (1 BC) is a leap year
+        self.assertEqual(timekeys.year_key(1) - timekeys.year_key(0), 366 * timekeys.SECONDS_IN_DAY)
+
+    def test_interval(self):
+        def key(*args):
+            return timekeys.datetime_key(datetime.datetime(*args, tzinfo=timezone.utc))
+
+        value = datetime.datetime(2020, 2, 29, 12, 30, tzinfo=timezone.utc)
+        self.assertEqual(timekeys.interval(value, None, 11), (key(2020, 2, 29), key(2020, 3, 1) - 1))
+        self.assertEqual(timekeys.interval(value, None, 13), (key(2020, 2, 29, 12, 30), key(2020, 2, 29, 12, 31) - 1))
+        self.assertEqual(timekeys.interval(value, None, 10, 2, 1), (key(2019, 12, 1), key(2020, 4, 1) - 1))
+        self.assertEqual(timekeys.interval(value, None, 9), (timekeys.year_key(2020), timekeys.year_key(2021) - 1))
+        self.assertEqual(timekeys.interval(value, None, 7), (timekeys.year_key(2000), timekeys.year_key(2100) - 1))
+
+    def test_interval_of_years(self):
+        self.assertEqual(timekeys.interval(None, -44, 9), (timekeys.year_key(-44), timekeys.year_key(-43) - 1))
+        self.assertEqual(timekeys.interval(None, -44, 9, 1, 1), (timekeys.year_key(-45), timekeys.year_key(-42) - 1))
+        # Years before the unit are floored, not truncated towards zero
+        self.assertEqual(timekeys.interval(None, -44, 7), (timekeys.year_key(-100), timekeys.year_key(0) - 1))
+        self.assertEqual(
+            timekeys.interval(None, -65500000, 3),
+            (timekeys.year_key(-66000000), timekeys.year_key(-65000000) - 1),
+        )
+        # Year is used at any precision when there is no value
+        self.assertEqual(timekeys.interval(None, 1550, 11), (timekeys.year_key(1550), timekeys.year_key(1551) - 1))
+        with self.assertRaises(ValueError):
+            timekeys.interval(None, None, 9)
+
+    def test_clean(self):
+        with self.assertRaises(ValidationError):
+            TimeValue(precision=9).clean()
+        TimeValue(precision=9, year=-44).clean()
+
+
+class ConceptsTestCase(TestCase):
+
+    def setUp(self):
+        self.helsinki = create_graph()
+        self.earth = Translation.objects.get(lang='en', translation='Earth').concept
+        self.finland = Translation.objects.get(lang='en', translation='Finland').concept
+        self.part_of = Concept.objects.create()
+
+    def test_merge(self):
+        other = Concept.objects.create(description='Third planet')
+        Translation.objects.create(concept=other, lang='en', translation='Planet Earth')
+        Translation.objects.create(concept=other, lang='sv', translation='Jorden')
+        coordinate_statement = Statement.objects.create(concept=self.helsinki, pred=self.part_of)
+        CoordinateValue.objects.create(statement=coordinate_statement, latitude=60, longitude=25, globe=other)
+        quantity_statement = Statement.objects.create(concept=self.helsinki, pred=self.part_of)
+        QuantityValue.objects.create(statement=quantity_statement, value=1, unit=other)
+        Statement.objects.create(concept=self.helsinki, pred=self.part_of, value=other)
+        Statement.objects.create(concept=other, pred=self.part_of, value=self.finland)
+        updated_at = timezone.now() - datetime.timedelta(days=1)
+        Statement.objects.update(updated_at=updated_at)
+
+        with override_settings(KNOWLEDGEBASE_TRANSITIVE_PREDICATES=[self.part_of.id]):
+            closure.rebuild(self.part_of.id)
+            report = concepts.merge_concepts(other, self.earth)
+            self.assertEqual(list(self.finland.get_descendants(self.part_of)), [self.earth, self.helsinki])
+
+        self.assertFalse(Concept.objects.filter(id=other.id).exists())
+        self.assertEqual(report['translations_moved'], 1)
+        self.assertEqual(report['translations_deleted'], 1)
+        self.assertEqual(report['statements_concept'], 1)
+        self.assertEqual(report['statements_value'], 1)
+        self.assertEqual(report['quantity_units'], 1)
+        self.assertEqual(report['coordinate_globes'], 1)
+        self.earth.refresh_from_db()
+        self.assertEqual(self.earth.description, 'Third planet')
+        self.assertEqual(
+            set(self.earth.translations.values_list('lang', 'translation')),
+            {('en', 'Earth'), ('fi', 'Maa'), ('sv', 'Jorden')},
+        )
+        self.assertEqual(CoordinateValue.objects.get(statement=coordinate_statement).globe, self.earth)
+        self.assertEqual(QuantityValue.objects.get(statement=quantity_statement).unit, self.earth)
+        for statement in (coordinate_statement, quantity_statement):
+            statement.refresh_from_db()
+            self.assertGreater(statement.updated_at, updated_at)
+
+    def test_bulk_delete_protected(self):
+        square_km = Translation.objects.get(translation='km²').concept
+        with self.assertRaises(ProtectedError):
+            concepts.bulk_delete_concepts([square_km])
+        self.assertTrue(Concept.objects.filter(id=square_km.id).exists())
+        # Values of deleted Concepts do not protect
+        report = Concept.objects.filter(id__in=[self.helsinki.id, square_km.id]).bulk_delete()
+        self.assertEqual(report['concepts'], 2)
+        self.assertFalse(Statement.objects.filter(concept=self.helsinki).exists())
+
+
+class UnitsTestCase(TestCase):
+
+    def setUp(self):
+        self.helsinki = create_graph()
+        self.metre, self.kilometre, self.celsius, self.kelvin = [Concept.objects.create() for i in range(4)]
+        self.pred = Concept.objects.create()
+        conversions = {self.kilometre.id: (self.metre.id, 1000), self.celsius.id: (self.kelvin.id, 1, 273.15)}
+        self.settings = override_settings(KNOWLEDGEBASE_UNIT_CONVERSIONS=conversions)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def quantity(self, value, unit, lower_bound=None, upper_bound=None):
+        return QuantityValue.objects.create(
+            statement=Statement.objects.create(concept=self.helsinki, pred=self.pred),
+            value=value, unit=unit, lower_bound=lower_bound, upper_bound=upper_bound,
+        )
+
+    def test_normalized_on_save(self):
+        quantity = self.quantity(1.5, self.kilometre, lower_bound=1, upper_bound=2)
+        self.assertEqual(quantity.normalized_unit, self.metre)
+        self.assertEqual(
+            (quantity.normalized_value, quantity.normalized_lower_bound, quantity.normalized_upper_bound),
+            (1500.0, 1000.0, 2000.0),
+        )
+        quantity = self.quantity(20, self.celsius)
+        self.assertEqual(quantity.normalized_unit, self.kelvin)
+        self.assertAlmostEqual(quantity.normalized_value, 293.15)
+        self.assertEqual(quantity.normalized_lower_bound, quantity.normalized_value)
+        quantity = self.quantity(3, None)
+        self.assertEqual((quantity.normalized_unit, quantity.normalized_value), (None, 3.0))
+
+    def test_range_queries(self):
+        kilometres = self.quantity(1.5, self.kilometre)
+        metres = self.quantity(1200, self.metre, lower_bound=900, upper_bound=1300)
+        self.quantity(1200, self.kelvin)
+        in_range = QuantityValue.objects.in_range(1, 2, unit=self.kilometre)
+        self.assertEqual(set(in_range), {kilometres, metres})
+        self.assertEqual(set(QuantityValue.objects.in_range(low=1400, unit=self.metre)), {kilometres})
+        self.assertEqual(set(QuantityValue.objects.overlaps(0.5, 0.95, unit=self.kilometre)), {metres})
+        self.assertEqual(set(QuantityValue.objects.in_range(1100, 1300, unit=self.celsius)), set())
+
+
+class GeoTestCase(TestCase):
+
+    def setUp(self):
+        self.helsinki = create_graph()
+        self.earth = Translation.objects.get(lang='en', translation='Earth').concept
+        self.location = Translation.objects.get(lang='en', translation='location').concept
+
+    def coordinate(self, latitude, longitude, precision_m=0):
+        statement = Statement.objects.create(concept=self.helsinki, pred=self.location)
+        return CoordinateValue.objects.create(
+            statement=statement, latitude=latitude, longitude=longitude, precision_m=precision_m, globe=self.earth,
+        )
+
+    def test_near(self):
+        espoo = self.coordinate(60.205, 24.655)
+        self.coordinate(61.5, 23.76)
+        result = CoordinateValue.objects.near(60.17, 24.94, 20000, globe=self.earth)
+        self.assertEqual([coordinate.latitude for coordinate in result], [60.17, espoo.latitude])
+        self.assertLess(result[0].distance_m, 1)
+
+    def test_precision_is_capped(self):
+        # About 1.1 km away, precision reaches the point only without the cap
+        imprecise = self.coordinate(60.18, 24.94, precision_m=5000)
+        self.assertNotIn(imprecise, CoordinateValue.objects.near(60.17, 24.94, 0, globe=self.earth))
+        with override_settings(KNOWLEDGEBASE_MAX_PRECISION_M=10000):
+            self.assertIn(imprecise, CoordinateValue.objects.near(60.17, 24.94, 0, globe=self.earth))
+
+    def test_migration_fills_cells(self):
+        self.coordinate(-17.8, 179.9)
+        expected = dict(CoordinateValue.objects.values_list('id', 'cell'))
+        CoordinateValue.objects.update(cell='')
+        importlib.import_module('knowledgebase.migrations.0010_coordinate_cells').fill_cells(apps, None)
+        self.assertEqual(dict(CoordinateValue.objects.values_list('id', 'cell')), expected)
+
+    def test_within_bbox_across_antimeridian(self):
+        east = self.coordinate(-17.8, 179.9)
+        west = self.coordinate(-17.8, -179.9)
+        self.coordinate(-17.8, 170)
+        result = CoordinateValue.objects.within_bbox(-18, 179, -17, -179)
+        self.assertEqual(set(result), {east, west})
+
+
+@override_settings(
+    ROOT_URLCONF='knowledgebase.urls',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class APITestCase(TestCase):
+
+    def setUp(self):
+        self.concept = create_graph()
+        labels.invalidate()
+        caches['default'].clear()
+
+    def test_statement_pagination(self):
+        statement_ids = []
+        url = '/statements/?subject={}&limit=2'.format(self.concept.id)
+        while True:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            page = json.loads(b''.join(response.streaming_content).decode('utf-8'))
+            statement_ids += [statement['id'] for statement in page['results']]
+            if page['next'] is None:
+                break
+            self.assertEqual(len(page['results']), 2)
+            url = '/statements/?subject={}&limit=2&cursor={}'.format(self.concept.id, page['next'])
+        self.assertEqual(statement_ids, list(Statement.objects.filter(concept=self.concept).order_by('id').values_list('id', flat=True)))
+        self.assertEqual(page['results'][-1]['pred']['label'], 'location')
+        self.assertEqual(self.client.get('/statements/?limit=x').status_code, 400)
+
+    def test_statement_etag(self):
+        url = '/statements/?subject={}'.format(self.concept.id)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.client.get(url + '&limit=2')['ETag'], etag)
+        # Changes of typed values touch their Statements
+        string_value = StringValue.objects.get(statement__concept=self.concept)
+        string_value.value = 'Helsingfors stad'
+        string_value.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_concept_detail(self):
+        url = '/concepts/{}/'.format(self.concept.id)
+        response = self.client.get(url, {'lang': 'fi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['label'], 'Helsinki')
+        self.assertEqual(len(response.json()['statements']), 5)
+        self.assertEqual(self.client.get(url, {'lang': 'fi'}, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/concepts/0/').status_code, 404)
+        self.assertEqual(self.client.post(url).status_code, 405)
+
+    def test_concept_links(self):
+        finland = Translation.objects.get(translation='Finland').concept
+        response = self.client.get('/concepts/{}/links/'.format(finland.id))
+        page = json.loads(b''.join(response.streaming_content).decode('utf-8'))
+        self.assertEqual(len(page['results']), 6)
+        self.assertTrue(all(statement['value']['value'] == finland.id for statement in page['results']))
+
+
+class ExporterTestCase(TestCase):
+
+    def test_ntriples_reference_iri(self):
+        statement = Statement.objects.filter(concept=create_graph()).first()
+        Reference.objects.create(url='https://example.com/a b>c').statements.add(statement)
+        out = io.StringIO()
+        exporter.export_ntriples(out, 'https://kb.example.com/')
+        self.assertIn('<https://example.com/a%20b%3Ec> .', out.getvalue())
+        self.assertNotIn('a b>c', out.getvalue())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DocumentsTestCase(TransactionTestCase):
+    """ Versions are replaced on commit, so data must be committed.
+    """
+
+    def setUp(self):
+        self.concept = create_graph()
+        labels.invalidate()
+        caches['default'].clear()
+
+    def test_rebuild_after_evicted_version(self):
+        self.assertIn('country', str(documents.get_concept_document(self.concept.id)))
+        translation = Translation.objects.get(translation='country')
+        translation.translation = 'nation'
+        translation.save()
+        caches['default'].delete(documents._version_key(translation.concept_id))
+        document = documents.get_concept_document(self.concept.id)
+        self.assertIn('nation', str(document))
+        self.assertNotIn('country', str(document))
+
+    def test_deduplicate_references_by_description(self):
+        statement = Statement.objects.filter(concept=self.concept).first()
+        for i in range(2):
+            Reference.objects.create(description='Statistics Finland').statements.add(statement)
+        self.assertEqual(str(documents.get_concept_document(self.concept.id)).count('Statistics Finland'), 2)
+        result = references.deduplicate()
+        self.assertEqual(result['merged'], 1)
+        self.assertEqual(str(documents.get_concept_document(self.concept.id)).count('Statistics Finland'), 1)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AsyncTestCase(TransactionTestCase):
+    """ Async loaders run queries in other threads, so data must be committed.
+    Django uses a shared in-memory database for SQLite tests.
+    """
+
+    def setUp(self):
+        self.concept = create_graph()
+        labels.invalidate()
+        caches['default'].clear()
+
+    def test_aget_translation_fallback(self):
+        concept = Concept.objects.create()
+        Translation.objects.create(concept=concept, lang='fi', translation='Helsinki')
+        Translation.objects.create(concept=concept, lang='fi', case='genitive', translation='Helsingin')
+        for lang, case in [('fi', None), ('fi', 'genitive'), ('fi', 'partitive'), ('en', None), ('en', 'genitive')]:
+            labels.invalidate()
+            expected = concept.get_translation(lang, case)
+            labels.invalidate()
+            self.assertEqual(asyncio.run(concept.aget_translation(lang, case)), expected)
+        self.assertIsNone(asyncio.run(concept.aget_translation('fi', 'partitive', strict_case=True)))
+        self.assertEqual(asyncio.run(Concept().aget_translation()), '')
+
+    def test_run_keeps_connection(self):
+        with mock.patch.object(type(connections['default']), 'close') as close:
+            for i in range(2):
+                self.assertEqual(asyncio.run(aio.run(Concept.objects.count)), 10)
+        close.assert_not_called()
+
+    def test_awith_values(self):
+        statements = asyncio.run(Statement.objects.filter(concept=self.concept).order_by('id').awith_values())
+        self.assertEqual(len(statements), 5)
+        with self.assertNumQueries(0):
+            rendered = [str(statement) for statement in statements]
+        labels.invalidate()
+        self.assertEqual(rendered, [str(statement) for statement in Statement.objects.filter(concept=self.concept).order_by('id')])
+
+    def test_aget_concept_document(self):
+        document = asyncio.run(documents.aget_concept_document(self.concept.id, 'fi'))
+        caches['default'].clear()
+        labels.invalidate()
+        self.assertEqual(document, documents.get_concept_document(self.concept.id, 'fi'))
+        self.assertEqual(len(document['statements']), 5)
+        self.assertIsNone(asyncio.run(documents.aget_concept_document(0)))
+
+
+@skipIf(generator is None, 'benchmarks package is not available')
+class GeneratorTestCase(TestCase):
+
+    def generate(self, seed):
+        with transaction.atomic():
+            generator.generate(100, seed=seed)
+            result = (
+                list(Statement.objects.order_by('id').values_list('concept_id', 'statement_id', 'pred_id', 'value_id')),
+                list(Translation.objects.order_by('id').values_list('concept_id', 'lang', 'case', 'translation')),
+                list(QuantityValue.objects.order_by('id').values_list('statement_id', 'value', 'normalized_value')),
+                list(Reference.statements.through.objects.order_by('id').values_list('statement_id', 'reference_id')),
+            )
+            transaction.set_rollback(True)
+        return result
+
+    def test_generate_is_reproducible(self):
+        graph = self.generate(seed=3)
+        self.assertEqual(len(graph[0]), 125)
+        self.assertEqual(graph, self.generate(seed=3))
+        self.assertNotEqual(graph, self.generate(seed=4))
+
+    def test_generated_records_import(self):
+        generator.generate(100)
+        result = importer.import_statements(generator.generate_records(20, 100))
+        self.assertEqual((result.statements, result.skipped), (20, 0))
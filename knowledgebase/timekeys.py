@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+""" Integer keys for TimeValues.
+
+Key is the number of seconds since 1970-01-01 00:00 UTC in proleptic
+Gregorian calendar. Years use astronomical numbering, so year 0 is 1 BC
+and year -1 is 2 BC. 64 bit integer is enough for several hundred billion
+years to both directions.
+"""
+from __future__ import unicode_literals
+
+import datetime
+
+from django.utils import timezone
+
+
+SECONDS_IN_DAY = 86400
+
+# Length of precision units shorter than a month
+PRECISION_SECONDS = {
+    11: SECONDS_IN_DAY,
+    12: 3600,
+    13: 60,
+    14: 1,
+}
+
+
+def days_from_civil(year, month, day):
+    """ Returns days since 1970-01-01 for any year.
+    """
+    year -= month <= 2
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def year_key(year):
+    """ Returns key of the first second of a year.
+    """
+    return days_from_civil(year, 1, 1) * SECONDS_IN_DAY
+
+
+def datetime_key(value):
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = value.astimezone(timezone.utc)
+        return (
+            days_from_civil(value.year, value.month, value.day) * SECONDS_IN_DAY +
+            value.hour * 3600 + value.minute * 60 + value.second
+        )
+    return days_from_civil(value.year, value.month, value.day) * SECONDS_IN_DAY
+
+
+def _truncate(value, precision):
+    value = value.replace(microsecond=0)
+    if precision < 14:
+        value = value.replace(second=0)
+    if precision < 13:
+        value = value.replace(minute=0)
+    if precision < 12:
+        value = value.replace(hour=0)
+    if precision < 11:
+        value = value.replace(day=1)
+    return value
+
+
+def year_unit(precision):
+    """ Returns length of a precision unit in years, for precisions of a year or less.
+    """
+    return 10 ** (9 - min(precision, 9))
+
+
+def floor_year(year, precision):
+    """ Returns the first year of the precision unit that contains "year",
+    for example 1900 for 1987 with century precision.
+    """
+    unit = year_unit(precision)
+    return (year // unit) * unit
+
+
+def _shift_key(start, precision, amount):
+    """ Returns key of truncated datetime "start" moved by "amount" precision
+    units. Computed from keys, so results past datetime range are valid.
+    """
+    if precision == 10:
+        months = start.year * 12 + start.month - 1 + amount
+        return days_from_civil(months // 12, months % 12 + 1, 1) * SECONDS_IN_DAY
+    return datetime_key(start) + amount * PRECISION_SECONDS[precision]
+
+
+def interval(value, year, precision, before=None, after=None):
+    """ Returns (earliest, latest) keys covered by a TimeValue. Both are
+    inclusive. Uncertainty "before" and "after" is measured in precision units.
+    """
+    before = before or 0
+    after = after or 0
+    if value is not None and timezone.is_aware(value):
+        value = value.astimezone(timezone.utc)
+
+    if precision >= 10 and value is not None:
+        precision = min(precision, 14)
+        start = _truncate(value, precision)
+        return _shift_key(start, precision, -before), _shift_key(start, precision, after + 1) - 1
+
+    if value is not None:
+        year = value.year
+    if year is None:
+        raise ValueError('TimeValue needs either value or year')
+    unit = year_unit(precision)
+    start = floor_year(year, precision)
+    return year_key(start - before * unit), year_key(start + (after + 1) * unit) - 1
+
+
+def interval_of(value):
+    """ Returns (earliest, latest) keys of a year (int), date or datetime.
+    """
+    if isinstance(value, int):
+        return year_key(value), year_key(value + 1) - 1
+    if isinstance(value, datetime.datetime):
+        key = datetime_key(value)
+        return key, key
+    key = datetime_key(value)
+    return key, key + SECONDS_IN_DAY - 1
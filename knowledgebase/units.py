@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+""" Unit normalization of QuantityValues.
+
+KNOWLEDGEBASE_UNIT_CONVERSIONS setting maps unit Concept IDs to tuples
+of (canonical unit Concept ID, factor) or (canonical unit Concept ID,
+factor, offset), so that value in canonical unit is value * factor + offset.
+Units that are not listed are their own canonical units.
+"""
+from __future__ import unicode_literals
+
+from django.conf import settings
+
+
+def get_conversion(unit_id):
+    """ Returns (canonical unit ID, factor, offset) of a unit.
+    """
+    conversion = getattr(settings, 'KNOWLEDGEBASE_UNIT_CONVERSIONS', {}).get(unit_id)
+    if conversion is None:
+        return unit_id, 1.0, 0.0
+    canonical_id, factor = conversion[:2]
+    offset = conversion[2] if len(conversion) > 2 else 0
+    return canonical_id, float(factor), float(offset)
+
+
+def normalize(value, unit):
+    """ Returns (canonical unit ID, value in canonical unit). Unit can be
+    a Concept, its ID or None for unitless values.
+    """
+    canonical_id, factor, offset = get_conversion(getattr(unit, 'id', unit))
+    if value is None:
+        return canonical_id, None
+    return canonical_id, float(value) * factor + offset
+
+
+def normalize_quantity(quantity):
+    """ Sets normalized fields of a QuantityValue. Without bounds
+    the interval is just the value.
+    """
+    quantity.normalized_unit_id, quantity.normalized_value = normalize(quantity.value, quantity.unit_id)
+    lower_bound = quantity.value if quantity.lower_bound is None else quantity.lower_bound
+    upper_bound = quantity.value if quantity.upper_bound is None else quantity.upper_bound
+    quantity.normalized_lower_bound = normalize(lower_bound, quantity.unit_id)[1]
+    quantity.normalized_upper_bound = normalize(upper_bound, quantity.unit_id)[1]
@@ -0,0 +1,12 @@
+from django.urls import path
+
+from knowledgebase import views
+
+
+app_name = 'knowledgebase'
+
+urlpatterns = [
+    path('concepts/<int:concept_id>/', views.concept_detail, name='concept_detail'),
+    path('concepts/<int:concept_id>/links/', views.concept_links, name='concept_links'),
+    path('statements/', views.statement_list, name='statement_list'),
+]
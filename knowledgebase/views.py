@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+""" Read-only JSON API.
+
+Statement listings use cursor pagination on primary key: "next" of a
+response is passed as "cursor" parameter to get the following page.
+Responses have ETags, so clients can use If-None-Match. ETags of
+Statement listings cover the label versions kept by knowledgebase.documents.
+"""
+from __future__ import unicode_literals
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_safe
+
+from knowledgebase import documents
+from knowledgebase.exporter import value_to_dict
+from knowledgebase.models import Statement
+
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10000
+
+# Statements are read from database in chunks of this size while streaming
+CHUNK_SIZE = 500
+
+
+def _get_lang(request):
+    return request.GET.get('lang', settings.LANGUAGE_CODE)
+
+
+def _get_int(request, name, default=None):
+    value = request.GET.get(name)
+    if value in (None, ''):
+        return default
+    return int(value)
+
+
+def _etag(*parts):
+    return hashlib.md5(json.dumps(parts, default=str, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _concept_etag(request, concept_id):
+    document = documents.get_concept_document(int(concept_id), _get_lang(request))
+    if document is None:
+        return None
+    return _etag(document)
+
+
+@require_safe
+@condition(etag_func=_concept_etag)
+def concept_detail(request, concept_id):
+    document = documents.get_concept_document(int(concept_id), _get_lang(request))
+    if document is None:
+        raise Http404('Concept does not exist')
+    return JsonResponse(document)
+
+
+def _statement_dict(statement, lang):
+    value = value_to_dict(statement)
+    if value is not None:
+        value['label'] = statement.get_value_as_string(lang)
+    concept = None
+    if statement.concept_id is not None:
+        concept = {'id': statement.concept_id, 'label': statement.concept.get_label(lang)}
+    return {
+        'id': statement.id,
+        'concept': concept,
+        'statement': statement.statement_id,
+        'pred': {'id': statement.pred_id, 'label': statement.pred.get_label(lang)},
+        'value': value,
+        'updated_at': statement.updated_at.isoformat(),
+    }
+
+
+def _get_statements(request, **pattern):
+    """ Returns (queryset after cursor, limit) from request parameters.
+    """
+    for name in ('subject', 'pred', 'value'):
+        if pattern.get(name) is None:
+            pattern[name] = _get_int(request, name)
+    statements = Statement.objects.match(**pattern)
+    cursor = _get_int(request, 'cursor')
+    if cursor is not None:
+        statements = statements.filter(id__gt=cursor)
+    limit = max(1, min(_get_int(request, 'limit', DEFAULT_LIMIT), MAX_LIMIT))
+    return statements.order_by('id'), limit
+
+
+def _statements_etag(request, **pattern):
+    """ Covers Statements of the page, whether there is a next page, and
+    versions of the Concepts whose labels are shown. Typed value changes
+    touch Statement.updated_at and Translation changes replace versions.
+    """
+    try:
+        statements, limit = _get_statements(request, **pattern)
+    except ValueError:
+        return None
+    rows = list(statements.values_list(
+        'id', 'updated_at', 'concept_id', 'pred_id', 'value_id', 'quantity_value__unit_id', 'coordinate_value__globe_id',
+    )[:limit])
+    if not rows:
+        return _etag(sorted(request.GET.items()), pattern, 0)
+    label_ids = set()
+    for row in rows:
+        label_ids.update(row[2:])
+    label_ids.discard(None)
+    has_next = len(rows) == limit and statements.filter(id__gt=rows[-1][0]).exists()
+    return _etag(
+        sorted(request.GET.items()), pattern, len(rows), rows[0][0], rows[-1][0], has_next,
+        max(row[1] for row in rows), sorted(documents.get_versions(label_ids).items()),
+    )
+
+
+def _stream_statements(statements, limit, lang):
+    yield '{"results": ['
+    last_id = None
+    sent = 0
+    while sent < limit:
+        chunk = statements
+        if last_id is not None:
+            chunk = chunk.filter(id__gt=last_id)
+        chunk = list(chunk.with_values()[:min(CHUNK_SIZE, limit - sent)])
+        if not chunk:
+            break
+        for statement in chunk:
+            yield (', ' if sent else '') + json.dumps(_statement_dict(statement, lang))
+            sent += 1
+        last_id = chunk[-1].id
+    next_cursor = None
+    if sent == limit and last_id is not None and statements.filter(id__gt=last_id).exists():
+        next_cursor = str(last_id)
+    yield '], "next": {}}}'.format(json.dumps(next_cursor))
+
+
+def _statement_list_response(request, **pattern):
+    try:
+        statements, limit = _get_statements(request, **pattern)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid parameters')
+    return StreamingHttpResponse(
+        _stream_statements(statements, limit, _get_lang(request)),
+        content_type='application/json',
+    )
+
+
+@require_safe
+@condition(etag_func=_statements_etag)
+def statement_list(request):
+    """ Statements filtered by "subject", "pred" and "value" Concept IDs.
+    """
+    return _statement_list_response(request)
+
+
+def _links_etag(request, concept_id):
+    return _statements_etag(request, value=int(concept_id))
+
+
+@require_safe
+@condition(etag_func=_links_etag)
+def concept_links(request, concept_id):
+    """ Statements that have the Concept as their value.
+    """
+    return _statement_list_response(request, value=int(concept_id))